@@ -1,12 +1,27 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse, RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse, PlainTextResponse
 
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import ResponseValidationError
 
 from app.backend.middlewares.exception import setup_error_middleware
 from app.backend.openapi_schema import custom_openapi
-from app.backend.middlewares import install_db_middleware
+from app.backend.middlewares import install_db_middleware, install_metrics_middleware
+from app.db import async_session_maker
+from app.services.ride_index import ride_index
+from app.services.wave_scheduler import wave_scheduler
+from app.services.dispatch_journal import dispatch_journal
+from app.services.order_dispatcher import order_dispatcher
+from app.services.metrics import metrics
+from app.services.moderation_dictionary import moderation_dictionary
+from app.services.chat_writer import chat_writer
+from app.services.pdf_render_pool import pdf_render_pool
+from app.services.document_export import document_exporter
+from app.services.websocket_manager import manager
+from app.services.driver_tracker import driver_tracker
 from app.backend.routers import user_router
 from app.backend.routers.ride import ride_router
 from app.backend.routers.role import role_router
@@ -21,10 +36,35 @@ from app.backend.routers.websocket import websocket_router
 from app.backend.routers.documents import documents_router
 from app.backend.routers.matching import matching_router
 from app.backend.routers.chat import chat_router
+from app.backend.routers.profiler import profiler_router
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    order_dispatcher.restore_from_journal()
+    await moderation_dictionary.reload()
+    background_tasks = [
+        asyncio.create_task(ride_index.run_reconciliation(async_session_maker)),
+        asyncio.create_task(dispatch_journal.run_flusher()),
+        asyncio.create_task(metrics.run_loop_lag_monitor()),
+        asyncio.create_task(moderation_dictionary.run_reloader()),
+    ]
+    try:
+        yield
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        await wave_scheduler.stop()
+        await chat_writer.stop()
+        await document_exporter.stop()
+        await asyncio.get_running_loop().run_in_executor(None, pdf_render_pool.shutdown)
+        await asyncio.gather(*background_tasks, return_exceptions=True)
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 app.openapi = lambda: custom_openapi(app)
 install_db_middleware(app)
+install_metrics_middleware(app)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -50,6 +90,7 @@ app.include_router(websocket_router, tags=['WebSocket'], prefix=API_PREFIX)
 app.include_router(documents_router, tags=['Documents'], prefix=API_PREFIX)
 app.include_router(matching_router, tags=['Matching'], prefix=API_PREFIX)
 app.include_router(chat_router, tags=['Chat'], prefix=API_PREFIX)
+app.include_router(profiler_router, tags=['Admin'], prefix=API_PREFIX)
 
 
 @app.exception_handler(ResponseValidationError)
@@ -71,3 +112,17 @@ async def redirect_to_docs():
 @app.get(f"{API_PREFIX}/health", tags=["General"]) 
 async def health():
     return {"status": "ok"}
+
+
+metrics.register_gauge("websocket_connections", manager.get_connection_count, "Open WebSocket connections")
+metrics.register_gauge("tracker_online_drivers", driver_tracker.get_online_count, "Drivers online in tracker")
+metrics.register_gauge(
+    "active_dispatches",
+    lambda: len(order_dispatcher.get_active_dispatches()),
+    "Rides currently being offered to drivers"
+)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -1,2 +1,2 @@
 from .db import install_db_middleware
-
+from .metrics import install_metrics_middleware
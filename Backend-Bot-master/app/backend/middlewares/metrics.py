@@ -0,0 +1,25 @@
+import time
+
+from fastapi import Request, FastAPI
+from app.services.metrics import metrics
+
+
+def install_metrics_middleware(app: FastAPI) -> None:
+    @app.middleware("http")
+    async def _metrics_middleware(request: Request, call_next):
+        started = time.perf_counter()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+            return response
+        finally:
+            # Шаблон маршрута, а не сырой путь: /rides/{ride_id} вместо тысяч /rides/123
+            route = request.scope.get("route")
+            metrics.observe(
+                "http_request_duration_seconds",
+                time.perf_counter() - started,
+                method=request.method,
+                route=getattr(route, "path", "unmatched"),
+                status=str(status_code)
+            )
@@ -14,8 +14,11 @@ import logging
 import json
 
 from app.services.chat_service import chat_service, MessageType, ModerationResult
+from app.services.chat_writer import chat_writer
+from app.services.chat_history_cache import chat_history_cache
 from app.services.websocket_manager import manager
 from app.crud.chat_message import chat_message_crud
+from app.db import async_session_maker
 
 logger = logging.getLogger(__name__)
 
@@ -61,12 +64,27 @@ class ChatMessageOut(BaseModel):
         from_attributes = True
 
 
+def serialize_message(m) -> Dict[str, Any]:
+    return {
+        "id": m.id,
+        "sender_id": m.sender_id,
+        "text": m.text,
+        "message_type": m.message_type,
+        "is_moderated": m.is_moderated,
+        "created_at": m.created_at.isoformat() if m.created_at else None,
+        "edited_at": m.edited_at.isoformat() if m.edited_at else None,
+        "deleted": m.deleted_at is not None,
+    }
+
+
 @router.websocket("/chat/ws/{ride_id}")
 async def chat_websocket(
     websocket: WebSocket,
     ride_id: int,
     user_id: int = Query(..., description="ID пользователя"),
     token: Optional[str] = Query(None, description="Auth token"),
+    since_id: Optional[int] = Query(None, description="Последний полученный id — сразу прислать дельту"),
+    since: Optional[datetime] = Query(None, description="server_time из последнего watermark"),
 ):
     await websocket.accept()
     
@@ -86,6 +104,8 @@ async def chat_websocket(
         "user_id": user_id,
         "message": "Connected to chat"
     })
+    if since_id is not None:
+        await send_sync(websocket, ride_id, since_id, since)
     
     try:
         while True:
@@ -124,6 +144,20 @@ async def handle_chat_message(
         await websocket.send_json({"type": "pong"})
         return
     
+    if msg_type == "sync":
+        try:
+            since_id = int(data.get("since_id") or 0)
+            since = datetime.fromisoformat(data["since"]) if data.get("since") else None
+        except (TypeError, ValueError):
+            await websocket.send_json({
+                "type": "error",
+                "code": "invalid_sync",
+                "message": "since_id must be an integer and since an ISO timestamp"
+            })
+            return
+        await send_sync(websocket, ride_id, since_id, since)
+        return
+    
     if msg_type == "typing":
         await manager.send_to_ride(ride_id, {
             "type": "user_typing",
@@ -144,7 +178,15 @@ async def handle_chat_message(
             })
             return
         
-        allowed, error = chat_service.check_rate_limit(user_id)
+        if not chat_service.is_valid_message_type(message_type):
+            await websocket.send_json({
+                "type": "error",
+                "code": "invalid_message_type",
+                "message": "Unknown message_type"
+            })
+            return
+        
+        allowed, error = chat_service.check_rate_limit(user_id, message_type, endpoint="ws")
         if not allowed:
             await websocket.send_json({
                 "type": "error",
@@ -163,32 +205,81 @@ async def handle_chat_message(
             })
             return
         
-        # TODO: 
+        try:
+            saved = await chat_writer.write(
+                ride_id=ride_id,
+                sender_id=user_id,
+                text=moderation.filtered,
+                message_type=message_type,
+                receiver_id=data.get("receiver_id"),
+                attachments=data.get("attachments"),
+                is_moderated=True,
+            )
+        except Exception as e:
+            logger.error(f"Failed to save chat message in ride {ride_id}: {e}")
+            await websocket.send_json({
+                "type": "error",
+                "code": "save_failed",
+                "message": "Message was not saved"
+            })
+            return
+        
         message_data = {
             "type": "new_message",
             "message": {
-                "id": None, 
+                "id": saved["id"],
                 "ride_id": ride_id,
                 "sender_id": user_id,
-                "text": moderation.filtered,
+                "text": saved["text"],
                 "message_type": message_type,
                 "is_moderated": True,
-                "created_at": datetime.utcnow().isoformat(),
+                "created_at": saved["created_at"].isoformat(),
                 "censored": moderation.original != moderation.filtered,
             }
         }
+        if data.get("client_message_id") is not None:
+            # Отправитель сопоставляет своё сообщение с присвоенным id
+            message_data["message"]["client_message_id"] = data["client_message_id"]
         
         await manager.send_to_ride(ride_id, message_data)
         
         logger.info(f"Chat message in ride {ride_id} from user {user_id}")
 
 
+async def send_sync(websocket: WebSocket, ride_id: int, since_id: int, since: Optional[datetime]) -> None:
+    # Сессия на время одного sync: WebSocket не проходит через DB middleware
+    try:
+        async with async_session_maker() as session:
+            changes = await chat_service.get_chat_changes(session, ride_id, since_id, since)
+    except Exception as e:
+        logger.error(f"Chat sync failed for ride {ride_id}: {e}")
+        await websocket.send_json({
+            "type": "error",
+            "code": "sync_failed",
+            "message": "Sync failed, retry later"
+        })
+        return
+    
+    await websocket.send_json({
+        "type": "sync",
+        "ride_id": ride_id,
+        "messages": [serialize_message(m) for m in changes["messages"]],
+        "updates": [serialize_message(m) for m in changes["updates"]],
+        "has_more": changes["has_more"],
+        "watermark": {
+            "last_id": changes["watermark"]["last_id"],
+            "server_time": changes["watermark"]["server_time"].isoformat(),
+        },
+    })
+
+
 @router.get("/chat/{ride_id}/history", response_model=ChatHistoryResponse)
 async def get_chat_history(
     request: Request,
     ride_id: int,
     limit: int = Query(50, ge=1, le=100),
     before_id: Optional[int] = Query(None, description="Для пагинации - ID сообщения"),
+    after_id: Optional[int] = Query(None, description="Только сообщения новее этого ID (догрузка после переподключения)"),
 ):
 
     session = request.state.session
@@ -198,27 +289,17 @@ async def get_chat_history(
         ride_id=ride_id,
         limit=limit + 1,  
         before_id=before_id,
+        after_id=after_id,
     )
     
     has_more = len(messages) > limit
     if has_more:
-        messages = messages[1:]  
+        # При after_id лишнее сообщение — самое новое, иначе — самое старое
+        messages = messages[:-1] if after_id is not None else messages[1:]
     
     return ChatHistoryResponse(
         ride_id=ride_id,
-        messages=[
-            {
-                "id": m.id,
-                "sender_id": m.sender_id,
-                "text": m.text,
-                "message_type": m.message_type,
-                "is_moderated": m.is_moderated,
-                "created_at": m.created_at.isoformat() if m.created_at else None,
-                "edited_at": m.edited_at.isoformat() if m.edited_at else None,
-                "deleted": m.deleted_at is not None,
-            }
-            for m in messages
-        ],
+        messages=[serialize_message(m) for m in messages],
         count=len(messages),
         has_more=has_more,
     )
@@ -231,8 +312,9 @@ async def send_message(
     body: SendMessageRequest,
     sender_id: int = Query(..., description="ID отправителя"),
 ):
-    session = request.state.session
-    allowed, error = chat_service.check_rate_limit(sender_id)
+    if not chat_service.is_valid_message_type(body.message_type):
+        raise HTTPException(status_code=400, detail="Unknown message_type")
+    allowed, error = chat_service.check_rate_limit(sender_id, body.message_type, endpoint="http")
     if not allowed:
         raise HTTPException(status_code=429, detail=error)
     moderation = chat_service.moderate_message(body.text)
@@ -240,8 +322,7 @@ async def send_message(
     if not moderation.passed:
         raise HTTPException(status_code=400, detail=moderation.reason)
     
-    message = await chat_service.save_message(
-        session=session,
+    saved = await chat_writer.write(
         ride_id=ride_id,
         sender_id=sender_id,
         text=moderation.filtered,
@@ -251,27 +332,26 @@ async def send_message(
         is_moderated=True,
     )
     
-    await session.commit()
     await manager.send_to_ride(ride_id, {
         "type": "new_message",
         "message": {
-            "id": message.id,
+            "id": saved["id"],
             "ride_id": ride_id,
             "sender_id": sender_id,
-            "text": message.text,
-            "message_type": message.message_type,
-            "created_at": message.created_at.isoformat() if message.created_at else None,
+            "text": saved["text"],
+            "message_type": saved["message_type"],
+            "created_at": saved["created_at"].isoformat(),
         }
     })
     
     return SendMessageResponse(
-        id=message.id,
+        id=saved["id"],
         ride_id=ride_id,
         sender_id=sender_id,
-        text=message.text,
-        message_type=message.message_type,
-        is_moderated=message.is_moderated,
-        created_at=message.created_at,
+        text=saved["text"],
+        message_type=saved["message_type"],
+        is_moderated=saved["is_moderated"],
+        created_at=saved["created_at"],
         moderation_note="Censored" if moderation.original != moderation.filtered else None,
     )
 
@@ -298,6 +378,7 @@ async def delete_message(
         )
     
     await session.commit()
+    chat_history_cache.update(deleted)
     
     await manager.send_to_ride(ride_id, {
         "type": "message_deleted",
@@ -332,6 +413,7 @@ async def edit_message(
         )
     
     await session.commit()
+    chat_history_cache.update(message)
     
     await manager.send_to_ride(ride_id, {
         "type": "message_edited",
@@ -354,7 +436,10 @@ async def edit_message(
 
 @router.get("/chat/stats")
 async def get_chat_stats():
-    return chat_service.get_stats()
+    return {
+        **chat_service.get_stats(),
+        "writer": chat_writer.get_stats(),
+    }
 
 
 chat_router = router
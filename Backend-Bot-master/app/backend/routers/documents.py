@@ -3,50 +3,75 @@ Documents Router
 API для генерации и скачивания PDF документов
 """
 
-from fastapi import APIRouter, HTTPException, Request, Query
-from fastapi.responses import Response
-from typing import Optional
+from fastapi import APIRouter, HTTPException, Request, Query, Header
+from fastapi.responses import Response, FileResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Optional, List
 from datetime import datetime, timedelta
 import logging
 
 from app.services.pdf_generator import pdf_generator
+from app.services.pdf_cache import pdf_cache, etag_matches, pdf_etag
+from app.services.pdf_render_pool import pdf_render_pool, PDFRenderBusyError, PDFRenderTimeoutError
+from app.services.document_export import document_exporter, ExportStatus
+from app.services.report_aggregation import report_aggregator
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
+class DriverReportsExportRequest(BaseModel):
+    driver_ids: List[int] = Field(..., min_length=1, max_length=10000)
+    period_days: int = Field(30, ge=1, le=365)
+    period_end: Optional[datetime] = None
+
+
 @router.get("/documents/ride/{ride_id}/receipt")
 async def get_ride_receipt(
     request: Request,
     ride_id: int,
-    download: bool = Query(False, description="Скачать файл вместо отображения")
+    download: bool = Query(False, description="Скачать файл вместо отображения"),
+    if_none_match: Optional[str] = Header(None)
 ):
     # TODO:
+    receipt_data = dict(
+        ride_id=ride_id,
+        client_name="Иван Иванов",  # TODO: 
+        driver_name="Пётр Петров",  # TODO: 
+        pickup_address="Москва, ул. Ленина 1",  # TODO: 
+        dropoff_address="Москва, ул. Пушкина 10",  # TODO: 
+        fare=500.00,  # TODO: 
+        distance_km=12.5,
+        duration_min=25,
+        payment_method="Наличные"
+    )
+    # Квитанция однозначно задаётся данными и версией шаблона — ключ известен до рендеринга
+    key = pdf_cache.make_key("ride_receipt", pdf_generator.template_version, receipt_data)
+
+    headers = {"ETag": pdf_etag(key), "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
     try:
-        pdf_bytes = await pdf_generator.generate_ride_receipt(
-            ride_id=ride_id,
-            client_name="Иван Иванов",  # TODO: 
-            driver_name="Пётр Петров",  # TODO: 
-            pickup_address="Москва, ул. Ленина 1",  # TODO: 
-            dropoff_address="Москва, ул. Пушкина 10",  # TODO: 
-            fare=500.00,  # TODO: 
-            distance_km=12.5,
-            duration_min=25,
-            payment_method="Наличные"
-        )
+        cached = await pdf_cache.get_or_render(key, lambda: pdf_generator.generate_ride_receipt(**receipt_data))
+    except PDFRenderBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except PDFRenderTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to generate receipt PDF: {e}")
         raise HTTPException(status_code=500, detail=f"PDF generation failed: {str(e)}")
     
-    headers = {}
     if download:
         headers["Content-Disposition"] = f"attachment; filename=receipt_{ride_id}.pdf"
     else:
         headers["Content-Disposition"] = f"inline; filename=receipt_{ride_id}.pdf"
-    
+
+    if cached.content is None:
+        return FileResponse(cached.path, media_type="application/pdf", headers=headers, stat_result=cached.stat)
     return Response(
-        content=pdf_bytes,
+        content=cached.content,
         media_type="application/pdf",
         headers=headers
     )
@@ -63,21 +88,17 @@ async def get_driver_report(
     period_end = datetime.utcnow()
     period_start = period_end - timedelta(days=period_days)
     
-    test_rides = [
-        {"id": 101, "date": "15.12.2025", "route": "Ленина → Пушкина", "fare": 350.00},
-        {"id": 102, "date": "16.12.2025", "route": "Гагарина → Мира", "fare": 520.00},
-        {"id": 103, "date": "17.12.2025", "route": "Центр → Аэропорт", "fare": 1200.00},
-    ]
-    
     try:
-        pdf_bytes = await pdf_generator.generate_driver_report(
-            driver_name="Пётр Петров",  # TODO: из БД
-            period_start=period_start,
-            period_end=period_end,
-            rides=test_rides,
-            total_earnings=2070.00,
-            total_commission=310.50
-        )
+        report = await report_aggregator.driver_report(driver_id, period_start, period_end)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    try:
+        pdf_bytes = await pdf_generator.generate_driver_report(**report)
+    except PDFRenderBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except PDFRenderTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to generate driver report PDF: {e}")
         raise HTTPException(status_code=500, detail=f"PDF generation failed: {str(e)}")
@@ -100,22 +121,24 @@ async def get_driver_report(
 async def get_balance_statement(
     request: Request,
     user_id: int,
+    period_days: int = Query(30, ge=1, le=365, description="Период выписки в днях"),
     download: bool = Query(False)
 ):
 
-    test_transactions = [
-        {"id": 1, "date": "10.12.2025", "is_withdraw": False, "amount": 1000.00},
-        {"id": 2, "date": "12.12.2025", "is_withdraw": True, "amount": 350.00},
-        {"id": 3, "date": "15.12.2025", "is_withdraw": False, "amount": 500.00},
-        {"id": 4, "date": "17.12.2025", "is_withdraw": True, "amount": 520.00},
-    ]
-    
+    period_end = datetime.utcnow()
+    period_start = period_end - timedelta(days=period_days)
+
     try:
-        pdf_bytes = await pdf_generator.generate_balance_statement(
-            user_name="Иван Иванов", 
-            current_balance=630.00, 
-            transactions=test_transactions
-        )
+        statement = await report_aggregator.balance_statement(user_id, period_start, period_end)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    try:
+        pdf_bytes = await pdf_generator.generate_balance_statement(**statement)
+    except PDFRenderBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except PDFRenderTimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         logger.error(f"Failed to generate balance statement PDF: {e}")
         raise HTTPException(status_code=500, detail=f"PDF generation failed: {str(e)}")
@@ -134,12 +157,71 @@ async def get_balance_statement(
     )
 
 
+@router.post("/documents/exports/driver-reports", status_code=202)
+async def start_driver_reports_export(body: DriverReportsExportRequest):
+    # Архив собирается в фоне; прогресс — GET /documents/exports/{job_id}
+    period_end = body.period_end or datetime.utcnow()
+    period_start = period_end - timedelta(days=body.period_days)
+    job = document_exporter.create_job(body.driver_ids, period_start, period_end, mode="file")
+    document_exporter.start(job, report_aggregator.driver_report)
+    return job.to_dict()
+
+
+@router.post("/documents/exports/driver-reports/stream")
+async def stream_driver_reports_export(body: DriverReportsExportRequest):
+    # Архив отдаётся по мере готовности отчётов; прогресс по X-Export-Job-Id доступен во время загрузки
+    period_end = body.period_end or datetime.utcnow()
+    period_start = period_end - timedelta(days=body.period_days)
+    job = document_exporter.create_job(body.driver_ids, period_start, period_end, mode="stream")
+    return StreamingResponse(
+        document_exporter.stream(job, report_aggregator.driver_report),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": f"attachment; filename={job.archive_filename()}",
+            "X-Export-Job-Id": job.id
+        }
+    )
+
+
+@router.get("/documents/exports/{job_id}")
+async def get_export_status(job_id: str):
+    job = document_exporter.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job.to_dict()
+
+
+@router.get("/documents/exports/{job_id}/download")
+async def download_export(job_id: str):
+    job = document_exporter.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    if job.status != ExportStatus.COMPLETED or job.path is None:
+        raise HTTPException(status_code=409, detail=f"Export job is {job.status}")
+    return FileResponse(
+        job.path,
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={job.archive_filename()}"}
+    )
+
+
+@router.delete("/documents/exports/{job_id}")
+async def cancel_export(job_id: str):
+    if document_exporter.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return {"canceled": document_exporter.cancel(job_id)}
+
+
 @router.get("/documents/health")
 async def documents_health():
     return {
         "status": "ok",
         "weasyprint_available": pdf_generator.weasyprint_available,
-        "reportlab_available": pdf_generator.reportlab_available
+        "reportlab_available": pdf_generator.reportlab_available,
+        "generator": pdf_generator.get_stats(),
+        "render_pool": pdf_render_pool.get_stats(),
+        "cache": pdf_cache.get_stats(),
+        "exports": document_exporter.get_stats()
     }
 
 
@@ -7,6 +7,11 @@ from app.crud.driver_profile import driver_profile_crud
 from app.services.driver_tracker import driver_tracker, DriverStatus
 from app.services.matching_engine import matching_engine, RideRequest, DriverMatch
 from app.services.websocket_manager import manager
+from app.services.ride_index import ride_index
+from app.services.order_dispatcher import order_dispatcher
+from app.services.wave_scheduler import wave_scheduler
+from app.services.offer_cache import offer_cache
+from app.services.dispatch_journal import dispatch_journal
 
 router = APIRouter()
 
@@ -94,26 +99,8 @@ async def get_ride_feed(
             status_code=400,
             detail="Driver location not set. Send location_update via WebSocket"
         )
-    pending_rides = await ride_crud.get_pending_rides(request.state.session, limit=limit * 2)
-    rides_dict = [
-        {
-            "id": r.id,
-            "client_id": r.client_id,
-            "status": r.status,
-            "pickup_address": r.pickup_address,
-            "pickup_lat": r.pickup_lat,
-            "pickup_lng": r.pickup_lng,
-            "dropoff_address": r.dropoff_address,
-            "dropoff_lat": r.dropoff_lat,
-            "dropoff_lng": r.dropoff_lng,
-            "expected_fare": r.expected_fare,
-            "ride_class": "economy",  # TODO: добавить поле в модель
-            "created_at": r.created_at.isoformat() if r.created_at else None
-        }
-        for r in pending_rides
-        if r.pickup_lat and r.pickup_lng
-    ]
-    feed = matching_engine.get_driver_feed(driver_profile_id, rides_dict, limit)
+    nearby_rides = ride_index.nearby(driver.latitude, driver.longitude)
+    feed = matching_engine.get_driver_feed(driver_profile_id, nearby_rides, limit)
     
     return {
         "driver_profile_id": driver_profile_id,
@@ -133,7 +120,8 @@ async def accept_ride(
         session=request.state.session,
         ride_id=ride_id,
         driver_profile_id=data.driver_profile_id,
-        actor_id=data.user_id
+        actor_id=data.user_id,
+        meta=order_dispatcher.get_offer_meta(ride_id, data.driver_profile_id)
     )
     
     success = status in ("accepted", "already_yours")
@@ -148,6 +136,7 @@ async def accept_ride(
     
     if success:
         driver_tracker.assign_ride(data.driver_profile_id, ride_id)
+        await order_dispatcher.complete_dispatch(ride_id, data.driver_profile_id)
         if ride:
             await manager.send_personal_message(ride.client_id, {
                 "type": "ride_accepted",
@@ -195,7 +184,14 @@ async def find_drivers_for_ride(
 
 @router.get("/matching/stats")
 async def get_matching_stats():
-    return matching_engine.get_stats()
+    return {
+        **matching_engine.get_stats(),
+        "ride_index": ride_index.get_stats(),
+        "batch_dispatch": order_dispatcher.get_batch_stats(),
+        "wave_scheduler": wave_scheduler.get_stats(),
+        "offer_cache": offer_cache.get_stats(),
+        "dispatch_journal": dispatch_journal.get_stats()
+    }
 
 
 matching_router = router
@@ -0,0 +1,65 @@
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import Response
+from typing import Optional
+import hmac
+import threading
+import time
+
+from app import config
+from app.services.sampling_profiler import sampling_profiler, ProfilerBusyError
+
+router = APIRouter()
+
+
+def _check_admin_token(token: Optional[str]) -> None:
+    # Без PROFILER_TOKEN эндпоинта как будто нет
+    if not config.PROFILER_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not token or not hmac.compare_digest(token, config.PROFILER_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+@router.get("/admin/profile", include_in_schema=False)
+async def profile_worker(
+    seconds: float = Query(10.0, gt=0, le=60),
+    interval_ms: float = Query(5.0, ge=1, le=1000),
+    format: str = Query("speedscope", pattern="^(collapsed|speedscope)$"),
+    all_threads: bool = Query(False, description="По умолчанию — только поток event loop"),
+    x_admin_token: Optional[str] = Header(None)
+):
+    _check_admin_token(x_admin_token)
+
+    # Обработчик исполняется в потоке event loop — его и профилируем
+    thread_id = None if all_threads else threading.get_ident()
+    try:
+        result = await sampling_profiler.profile(seconds, interval_ms / 1000, thread_id)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    if format == "collapsed":
+        body = result.to_collapsed()
+        media_type = "text/plain"
+        filename = f"profile-{stamp}.collapsed.txt"
+    else:
+        body = result.to_speedscope(name=f"worker {stamp}")
+        media_type = "application/json"
+        filename = f"profile-{stamp}.speedscope.json"
+
+    return Response(
+        content=body,
+        media_type=media_type,
+        headers={
+            "Content-Disposition": f'attachment; filename="{filename}"',
+            "X-Profile-Samples": str(result.samples)
+        }
+    )
+
+
+@router.get("/admin/profile/stats", include_in_schema=False)
+async def profiler_stats(x_admin_token: Optional[str] = Header(None)):
+    _check_admin_token(x_admin_token)
+    return sampling_profiler.get_stats()
+
+
+profiler_router = router
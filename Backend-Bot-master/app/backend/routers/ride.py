@@ -3,6 +3,8 @@ from fastapi import Request, Query, HTTPException
 from pydantic import TypeAdapter
 from app.backend.routers.base import BaseRouter
 from app.crud.ride import ride_crud
+from app.services.order_dispatcher import order_dispatcher
+from app.services.ride_index import OPEN_STATUSES
 from app.schemas.ride import RideSchema, RideCreate, RideUpdate, RideStatusChangeRequest
 
 
@@ -41,6 +43,10 @@ class RideRouter(BaseRouter):
             raise HTTPException(status_code=422, detail="Ride not found or status transition not allowed")
         if result is None:
             raise HTTPException(status_code=404, detail="Ride not found or status transition not allowed")
+        if result.status == "canceled":
+            await order_dispatcher.cancel_dispatch(ride_id)
+        elif result.status not in OPEN_STATUSES:
+            await order_dispatcher.complete_dispatch(ride_id, result.driver_profile_id)
         return result
 
 
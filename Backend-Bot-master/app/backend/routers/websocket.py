@@ -4,16 +4,35 @@ WebSocket Router
 """
 
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Query, HTTPException
-from typing import Optional
+from typing import Optional, Tuple
 from pydantic import BaseModel
 import json
 import logging
+import math
 
 from app.services.websocket_manager import manager
 from app.services.driver_tracker import driver_tracker, DriverStatus
+from app.services.feed_publisher import feed_publisher
+from app.services.order_dispatcher import order_dispatcher
 
 logger = logging.getLogger(__name__)
 
+FEED_MAX_RADIUS_KM = 50.0
+FEED_MAX_LIMIT = 100
+
+
+def _parse_feed_params(data: dict) -> Optional[Tuple[float, int]]:
+    # Параметры ленты приходят от клиента: нечисловые значения — None, большие — зажимаем
+    try:
+        radius_km = float(data.get("radius_km", 15.0))
+        limit = int(data.get("limit", 20))
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if not math.isfinite(radius_km) or radius_km <= 0:
+        return None
+    return min(radius_km, FEED_MAX_RADIUS_KM), min(max(limit, 1), FEED_MAX_LIMIT)
+
+
 class LocationUpdate(BaseModel):
     latitude: float
     longitude: float
@@ -44,6 +63,7 @@ async def websocket_endpoint(
             "user_id": user_id,
             "message": "WebSocket connection established"
         })
+        await order_dispatcher.resend_pending_offers(user_id)
         
         while True:
             data = await websocket.receive_json()
@@ -56,6 +76,9 @@ async def websocket_endpoint(
     except Exception as e:
         logger.error(f"WebSocket error for user {user_id}: {e}")
         manager.disconnect(websocket, user_id)
+    finally:
+        if not manager.is_connected(user_id):
+            feed_publisher.unsubscribe(user_id)
 
 
 async def handle_message(websocket: WebSocket, user_id: int, data: dict) -> None:
@@ -115,6 +138,7 @@ async def handle_message(websocket: WebSocket, user_id: int, data: dict) -> None
                     "type": "location_ack",
                     "status": state.status.value
                 })
+                await feed_publisher.on_driver_moved(user_id)
             
             if ride_id:
                 await manager.send_to_ride(ride_id, {
@@ -127,6 +151,38 @@ async def handle_message(websocket: WebSocket, user_id: int, data: dict) -> None
                     "speed": speed
                 }, exclude_user_id=user_id)
     
+    elif message_type == "subscribe_feed":
+        params = _parse_feed_params(data)
+        if params is None:
+            await websocket.send_json({
+                "type": "error",
+                "message": f"radius_km must be a number in (0, {FEED_MAX_RADIUS_KM:g}], limit an integer"
+            })
+            return
+        radius_km, limit = params
+        snapshot = feed_publisher.subscribe(user_id, radius_km=radius_km, limit=limit)
+        if snapshot:
+            await websocket.send_json(snapshot)
+        else:
+            await websocket.send_json({
+                "type": "error",
+                "message": "Driver not registered in tracker or location not set"
+            })
+    
+    elif message_type == "unsubscribe_feed":
+        feed_publisher.unsubscribe(user_id)
+        await websocket.send_json({"type": "feed_unsubscribed"})
+    
+    elif message_type == "decline_ride":
+        ride_id = data.get("ride_id")
+        driver = driver_tracker.get_driver_by_user(user_id)
+        if ride_id and driver:
+            driver_tracker.release_offer_lock(driver.driver_profile_id, ride_id)
+            await websocket.send_json({
+                "type": "ride_declined",
+                "ride_id": ride_id
+            })
+    
     elif message_type == "go_online":
         state = driver_tracker.set_status_by_user(user_id, DriverStatus.ONLINE)
         if state:
@@ -164,10 +220,13 @@ async def handle_message(websocket: WebSocket, user_id: int, data: dict) -> None
 
 @router.get("/ws/stats")
 async def get_websocket_stats():
+    # Поездки — только счётчиками: список ключей при 100k поездок делал ответ и сериализацию дорогими
     return {
         "online_users": manager.get_online_users(),
+        "online_users_count": manager.get_online_count(),
         "total_connections": manager.get_connection_count(),
-        "active_rides": list(manager.ride_participants.keys())
+        "active_rides": manager.rides.ride_count(),
+        "ride_memberships": manager.rides.membership_count()
     }
 
 
@@ -209,6 +268,8 @@ async def update_driver_location(user_id: int, location: LocationUpdate):
     if not state:
         raise HTTPException(status_code=404, detail="Driver not registered in tracker")
     
+    await feed_publisher.on_driver_moved(user_id)
+    
     return {
         "status": "updated",
         "driver_status": state.status.value,
@@ -269,7 +330,8 @@ async def get_driver_state(user_id: int):
 async def get_drivers_stats():
     return {
         **driver_tracker.get_stats(),
-        "ws_connections": manager.get_connection_count()
+        "ws_connections": manager.get_connection_count(),
+        "feed": feed_publisher.get_stats()
     }
 
 
@@ -18,6 +18,26 @@ DB_NAME = os.environ.get('DB_NAME') or os.getenv('DB_NAME')
 DB_USER = os.environ.get('DB_USER') or os.getenv('DB_USER')
 DB_PASS = os.environ.get('DB_PASS') or os.getenv('DB_PASS')
 
-API_IGNORE = ['/docs', '/openapi.json', '']
+API_IGNORE = ['/docs', '/openapi.json', '', '/metrics']
+
+DISPATCH_JOURNAL_PATH = os.environ.get('DISPATCH_JOURNAL_PATH') or str(ROOT_DIR / 'var' / 'dispatch_journal.jsonl')
+ETA_GRID_PATH = os.environ.get('ETA_GRID_PATH') or str(ROOT_DIR / 'var' / 'eta_speed_grid.bin')
+SCORING_WEIGHTS_PATH = os.environ.get('SCORING_WEIGHTS_PATH') or str(ROOT_DIR / 'var' / 'scoring_weights.json')
+MODERATION_DICT_DIR = os.environ.get('MODERATION_DICT_DIR') or str(ROOT_DIR / 'var' / 'moderation')
+# Через запятую, например "ru,en"; пусто — все словари каталога
+MODERATION_LANGUAGES = [lang.strip() for lang in (os.environ.get('MODERATION_LANGUAGES') or '').split(',') if lang.strip()]
+
+# Пустой токен — эндпоинт профилировщика выключен
+PROFILER_TOKEN = os.environ.get('PROFILER_TOKEN') or None
+
+# Пул процессов для рендеринга PDF
+PDF_RENDER_WORKERS = int(os.environ.get('PDF_RENDER_WORKERS') or min(4, os.cpu_count() or 1))
+PDF_RENDER_QUEUE_LIMIT = int(os.environ.get('PDF_RENDER_QUEUE_LIMIT') or 32)
+PDF_RENDER_TIMEOUT_SECONDS = float(os.environ.get('PDF_RENDER_TIMEOUT_SECONDS') or 30)
+PDF_RENDER_MAX_TASKS_PER_CHILD = int(os.environ.get('PDF_RENDER_MAX_TASKS_PER_CHILD') or 100)
+PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR') or str(ROOT_DIR / 'var' / 'pdf_cache')
+PDF_CACHE_MEMORY_BYTES = int(os.environ.get('PDF_CACHE_MEMORY_BYTES') or 32 * 1024 * 1024)
+PDF_CACHE_DISK_BYTES = int(os.environ.get('PDF_CACHE_DISK_BYTES') or 1024 * 1024 * 1024)
+DOCUMENT_EXPORT_DIR = os.environ.get('DOCUMENT_EXPORT_DIR') or str(ROOT_DIR / 'var' / 'exports')
 
 DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
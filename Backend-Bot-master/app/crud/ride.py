@@ -8,6 +8,9 @@ from app.crud.base import CrudBase
 from app.models.ride import Ride
 from app.models.ride_status_history import RideStatusHistory
 from app.schemas.ride import RideSchema, RideCreate, RideUpdate, RideStatusChangeRequest
+from app.services.ride_index import ride_index, OPEN_STATUSES
+from app.services.metrics import metrics
+from app.services.chat_history_cache import chat_history_cache
 
 
 def _convert_decimals(d: dict) -> dict:
@@ -82,7 +85,9 @@ class RideCrud(CrudBase[Ride, RideSchema]):
             created_at=datetime.utcnow(),
         )
         await session.execute(hist)
-        return RideSchema.model_validate(ride)
+        result = RideSchema.model_validate(ride)
+        ride_index.upsert(result, session)
+        return result
 
     async def update(self, session: AsyncSession, id: int, update_obj: RideUpdate) -> RideSchema | None:
         stmt = update(Ride).where(Ride.id == id).values(update_obj.model_dump(exclude_none=True)).returning(Ride)
@@ -90,6 +95,7 @@ class RideCrud(CrudBase[Ride, RideSchema]):
         ride = res.scalar_one_or_none()
         return RideSchema.model_validate(ride) if ride else None
 
+    @metrics.timed("change_status")
     async def change_status(
         self,
         session: AsyncSession,
@@ -179,14 +185,19 @@ class RideCrud(CrudBase[Ride, RideSchema]):
         ]
         ride_dict = {k: v for k, v in zip(col_names, row)}
         ride_dict = _convert_decimals(ride_dict)
-        return RideSchema.model_validate(ride_dict)
+        result = RideSchema.model_validate(ride_dict)
+        ride_index.upsert(result, session)
+        chat_history_cache.on_ride_status(ride_id, result.status)
+        return result
 
+    @metrics.timed("accept_ride_idempotent")
     async def accept_ride_idempotent(
         self,
         session: AsyncSession,
         ride_id: int,
         driver_profile_id: int,
         actor_id: int,
+        meta: dict | None = None,
     ) -> tuple[RideSchema | None, str]:
         sql = text(
             """
@@ -218,7 +229,7 @@ class RideCrud(CrudBase[Ride, RideSchema]):
                        :actor_id,
                        'driver',
                        'Driver accepted ride',
-                       '{}',
+                       CAST(:meta AS JSONB),
                        NOW()
                 WHERE EXISTS (SELECT 1 FROM upd)
                 RETURNING 1
@@ -236,6 +247,7 @@ class RideCrud(CrudBase[Ride, RideSchema]):
             "ride_id": ride_id,
             "driver_profile_id": driver_profile_id,
             "actor_id": actor_id,
+            "meta": json.dumps(meta if meta is not None else {}),
         }
 
         try:
@@ -275,6 +287,7 @@ class RideCrud(CrudBase[Ride, RideSchema]):
         ]
         ride_dict = {k: v for k, v in zip(col_names, row[:-2])}
         ride_dict = _convert_decimals(ride_dict)
+        ride_index.remove(ride_id, session)
         return RideSchema.model_validate(ride_dict), "accepted"
 
     async def get_pending_rides(
@@ -291,5 +304,10 @@ class RideCrud(CrudBase[Ride, RideSchema]):
         rides = res.scalars().all()
         return [RideSchema.model_validate(r) for r in rides]
 
+    async def get_open_rides(self, session: AsyncSession) -> list[RideSchema]:
+        query = select(Ride).where(Ride.status.in_(OPEN_STATUSES))
+        res = await session.execute(query)
+        return [RideSchema.model_validate(r) for r in res.scalars().all()]
+
 
 ride_crud = RideCrud()
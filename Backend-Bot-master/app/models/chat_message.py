@@ -1,4 +1,4 @@
-from sqlalchemy import Integer, String, TIMESTAMP, func, Text, ForeignKey, Boolean
+from sqlalchemy import Integer, String, TIMESTAMP, func, Text, ForeignKey, Boolean, Index
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db import Base
@@ -6,6 +6,7 @@ from app.db import Base
 
 class ChatMessage(Base):
     __tablename__ = 'chat_messages'
+    __table_args__ = (Index('ix_chat_messages_ride_id_id', 'ride_id', 'id'),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     ride_id: Mapped[int | None] = mapped_column(Integer, ForeignKey('rides.id'), nullable=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Integer, String, TIMESTAMP, func, DECIMAL, Boolean, ForeignKey, Text
+from sqlalchemy import Integer, String, TIMESTAMP, func, DECIMAL, Boolean, ForeignKey, Text, Index
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db import Base
@@ -6,6 +6,7 @@ from app.db import Base
 
 class Ride(Base):
     __tablename__ = 'rides'
+    __table_args__ = (Index('ix_rides_driver_profile_id_completed_at', 'driver_profile_id', 'completed_at'),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     client_id: Mapped[int] = mapped_column(Integer, ForeignKey('users.id'), nullable=False)
@@ -1,4 +1,4 @@
-from sqlalchemy import Integer, Float, ForeignKey, DateTime, func, Boolean
+from sqlalchemy import Integer, Float, ForeignKey, DateTime, func, Boolean, Index
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from datetime import datetime
 from app.db import Base, metadata
@@ -6,6 +6,7 @@ from app.db import Base, metadata
 # NOTE можноу удалить
 class Transaction(Base):
     __tablename__ = "transactions"
+    __table_args__ = (Index("ix_transactions_user_id_created_at", "user_id", "created_at"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
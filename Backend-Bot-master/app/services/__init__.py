@@ -1,8 +1,17 @@
 from app.services.websocket_manager import ConnectionManager, manager
 from app.services.pdf_generator import PDFGenerator, pdf_generator
 from app.services.driver_tracker import DriverTracker, driver_tracker, DriverStatus, RideClass
+from app.services.eta_model import ConstantSpeedEstimator, SpeedGridEstimator
+from app.services.scoring_weights import ScoringWeights
 from app.services.matching_engine import MatchingEngine, matching_engine, RideRequest, DriverMatch
+from app.services.batch_matcher import BatchMatcher, batch_matcher
+from app.services.wave_scheduler import WaveScheduler, wave_scheduler
+from app.services.offer_cache import OfferPayloadCache, offer_cache
+from app.services.dispatch_journal import DispatchJournal, dispatch_journal
 from app.services.order_dispatcher import OrderDispatcher, order_dispatcher
+from app.services.ride_index import PendingRideIndex, ride_index
+from app.services.feed_publisher import DriverFeedPublisher, feed_publisher
+from app.services.moderation_dictionary import ModerationDictionary, moderation_dictionary
 from app.services.chat_service import ChatService, chat_service, MessageType, ModerationResult
 
 __all__ = [
@@ -14,12 +23,29 @@ __all__ = [
     "driver_tracker",
     "DriverStatus",
     "RideClass",
+    "ConstantSpeedEstimator",
+    "SpeedGridEstimator",
+    "ScoringWeights",
     "MatchingEngine",
     "matching_engine",
     "RideRequest",
     "DriverMatch",
+    "BatchMatcher",
+    "batch_matcher",
+    "WaveScheduler",
+    "wave_scheduler",
+    "OfferPayloadCache",
+    "offer_cache",
+    "DispatchJournal",
+    "dispatch_journal",
     "OrderDispatcher",
     "order_dispatcher",
+    "PendingRideIndex",
+    "ride_index",
+    "DriverFeedPublisher",
+    "feed_publisher",
+    "ModerationDictionary",
+    "moderation_dictionary",
     "ChatService",
     "chat_service",
     "MessageType",
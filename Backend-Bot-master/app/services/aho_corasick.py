@@ -0,0 +1,114 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from array import array
+from bisect import bisect_left
+from collections import deque
+
+
+class AhoCorasick:
+    # Автомат Ахо–Корасик: все слова словаря ищутся за один проход по тексту,
+    # время O(len(text) + число совпадений) и не зависит от размера словаря.
+    #
+    # Словари на десятки тысяч слов дают сотни тысяч состояний, поэтому после сборки
+    # автомат хранится в плоских массивах (CSR): переходы состояния s — отсортированные
+    # символы edge_chars[edge_start[s]:edge_start[s + 1]]. Сами слова не хранятся —
+    # совпадение восстанавливается срезом текста по длине слова.
+
+    def __init__(self, words: Iterable[str]):
+        goto: List[Dict[str, int]] = [{}]
+        terminal: List[int] = [0]
+        size = 0
+        for word in set(words):
+            if not word:
+                continue
+            state = 0
+            for ch in word:
+                next_state = goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][ch] = next_state
+                    goto.append({})
+                    terminal.append(0)
+                state = next_state
+            terminal[state] = len(word)
+            size += 1
+
+        count = len(goto)
+        fail = array("I", bytes(4 * count))
+        # Ближайшее по суффиксным ссылкам терминальное состояние (0 — нет)
+        dict_link = array("I", bytes(4 * count))
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in goto[state].items():
+                queue.append(child)
+                fallback = fail[state]
+                while fallback and ch not in goto[fallback]:
+                    fallback = fail[fallback]
+                link = goto[fallback].get(ch, 0)
+                if link == child:
+                    link = 0
+                fail[child] = link
+                dict_link[child] = link if terminal[link] else dict_link[link]
+
+        edge_start = array("I", [0])
+        edge_chars = array("I")
+        edge_targets = array("I")
+        for transitions in goto:
+            for ch in sorted(transitions):
+                edge_chars.append(ord(ch))
+                edge_targets.append(transitions[ch])
+            edge_start.append(len(edge_chars))
+
+        self._edge_start = edge_start
+        self._edge_chars = edge_chars
+        self._edge_targets = edge_targets
+        self._fail = fail
+        self._dict_link = dict_link
+        self._word_len = array("H", terminal)
+        self.size = size
+
+    @property
+    def state_count(self) -> int:
+        return len(self._fail)
+
+    @property
+    def nbytes(self) -> int:
+        arrays = (self._edge_start, self._edge_chars, self._edge_targets, self._fail, self._dict_link, self._word_len)
+        return sum(a.itemsize * len(a) for a in arrays)
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        # Пары (конец совпадения, исключительно; слово)
+        edge_start = self._edge_start
+        edge_chars = self._edge_chars
+        edge_targets = self._edge_targets
+        fail = self._fail
+        dict_link = self._dict_link
+        word_len = self._word_len
+        state = 0
+        for index, ch in enumerate(text):
+            code = ord(ch)
+            while True:
+                lo = edge_start[state]
+                hi = edge_start[state + 1]
+                if lo != hi:
+                    i = bisect_left(edge_chars, code, lo, hi)
+                    if i < hi and edge_chars[i] == code:
+                        state = edge_targets[i]
+                        break
+                if not state:
+                    break
+                state = fail[state]
+
+            found = state if word_len[state] else dict_link[state]
+            while found:
+                end = index + 1
+                yield end, text[end - word_len[found]:end]
+                found = dict_link[found]
+
+    def find_first(self, text: str) -> Optional[str]:
+        for _, word in self.iter_matches(text):
+            return word
+        return None
+
+    def __len__(self) -> int:
+        return self.size
@@ -0,0 +1,228 @@
+from typing import Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
+import time
+import logging
+
+from app.services.matching_engine import matching_engine, RideRequest, DriverMatch
+
+logger = logging.getLogger(__name__)
+
+
+NO_EDGE_COST = 1_000_000.0
+
+
+def solve_assignment(cost: List[List[float]]) -> List[int]:
+    """Венгерский алгоритм (min-cost), возвращает для каждой строки индекс столбца или -1."""
+    n = len(cost)
+    m = len(cost[0]) if n else 0
+    if n == 0 or m == 0:
+        return [-1] * n
+
+    transposed = n > m
+    if transposed:
+        cost = [list(col) for col in zip(*cost)]
+        n, m = m, n
+
+    inf = float("inf")
+    u = [0.0] * (n + 1)
+    v = [0.0] * (m + 1)
+    p = [0] * (m + 1)
+    way = [0] * (m + 1)
+
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            row = cost[i0 - 1]
+            ui0 = u[i0]
+            delta = inf
+            j1 = 0
+            for j in range(1, m + 1):
+                if used[j]:
+                    continue
+                cur = row[j - 1] - ui0 - v[j]
+                if cur < minv[j]:
+                    minv[j] = cur
+                    way[j] = j0
+                if minv[j] < delta:
+                    delta = minv[j]
+                    j1 = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[p[j]] += delta
+                    v[j] -= delta
+                else:
+                    minv[j] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while True:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+            if j0 == 0:
+                break
+
+    assignment = [-1] * n
+    for j in range(1, m + 1):
+        if p[j]:
+            assignment[p[j] - 1] = j - 1
+
+    if not transposed:
+        return assignment
+
+    result = [-1] * m
+    for row, col in enumerate(assignment):
+        if col >= 0:
+            result[col] = row
+    return result
+
+
+@dataclass
+class BatchResult:
+    assignments: Dict[int, Optional[DriverMatch]] = field(default_factory=dict)
+    candidates: Dict[int, List[DriverMatch]] = field(default_factory=dict)
+    optimal_eta_minutes: float = 0.0
+    greedy_eta_minutes: float = 0.0
+    optimal_matched: int = 0
+    greedy_matched: int = 0
+    # ride_id -> ETA водителя, которого заказу дал бы жадный подбор
+    greedy_etas: Dict[int, float] = field(default_factory=dict)
+    solve_ms: float = 0.0
+
+    @property
+    def eta_saved_minutes(self) -> float:
+        # Сравниваем только заказы, которым назначили водителя оба подбора:
+        # при разном числе назначений разница сумм ETA ничего не говорит об экономии
+        saved = 0.0
+        for ride_id, greedy_eta in self.greedy_etas.items():
+            match = self.assignments.get(ride_id)
+            if match is not None:
+                saved += greedy_eta - match.eta_minutes
+        return saved
+
+    @property
+    def compared_rides(self) -> int:
+        return sum(1 for ride_id in self.greedy_etas if self.assignments.get(ride_id) is not None)
+
+    @staticmethod
+    def _mean(total: float, count: int) -> Optional[float]:
+        return round(total / count, 1) if count else None
+
+    def to_dict(self) -> dict:
+        return {
+            "rides": len(self.assignments),
+            "optimal_matched": self.optimal_matched,
+            "greedy_matched": self.greedy_matched,
+            "optimal_eta_minutes": round(self.optimal_eta_minutes, 1),
+            "greedy_eta_minutes": round(self.greedy_eta_minutes, 1),
+            "optimal_mean_eta_minutes": self._mean(self.optimal_eta_minutes, self.optimal_matched),
+            "greedy_mean_eta_minutes": self._mean(self.greedy_eta_minutes, self.greedy_matched),
+            "compared_rides": self.compared_rides,
+            "eta_saved_minutes": round(self.eta_saved_minutes, 1),
+            "solve_ms": round(self.solve_ms, 2)
+        }
+
+
+class BatchMatcher:
+    MAX_CANDIDATES_PER_RIDE = 10
+
+    def __init__(self):
+        self.engine = matching_engine
+
+    def match(
+        self,
+        requests: List[RideRequest],
+        max_radius_km: float = 15.0,
+        step_km: float = 2.0
+    ) -> BatchResult:
+        started = time.perf_counter()
+        result = BatchResult()
+
+        for request in requests:
+            matches = self.engine.expand_search(request, max_radius_km=max_radius_km, step_km=step_km)
+            result.candidates[request.ride_id] = matches[:self.MAX_CANDIDATES_PER_RIDE]
+            result.assignments[request.ride_id] = None
+
+        for ride_ids in self._split_components(requests, result.candidates):
+            self._solve_component(ride_ids, result)
+
+        result.greedy_etas = self._greedy_baseline(requests, result.candidates)
+        result.greedy_eta_minutes = sum(result.greedy_etas.values())
+        result.greedy_matched = len(result.greedy_etas)
+        result.solve_ms = (time.perf_counter() - started) * 1000
+
+        return result
+
+    def _solve_component(self, ride_ids: List[int], result: BatchResult) -> None:
+        driver_columns: Dict[int, int] = {}
+        for ride_id in ride_ids:
+            for match in result.candidates[ride_id]:
+                driver_columns.setdefault(match.driver_profile_id, len(driver_columns))
+
+        if not driver_columns:
+            return
+
+        cost = [[NO_EDGE_COST] * len(driver_columns) for _ in ride_ids]
+        by_cell: Dict[Tuple[int, int], DriverMatch] = {}
+        for row, ride_id in enumerate(ride_ids):
+            for match in result.candidates[ride_id]:
+                col = driver_columns[match.driver_profile_id]
+                cost[row][col] = match.eta_minutes
+                by_cell[(row, col)] = match
+
+        for row, col in enumerate(solve_assignment(cost)):
+            match = by_cell.get((row, col)) if col >= 0 else None
+            if match is None:
+                continue
+            result.assignments[ride_ids[row]] = match
+            result.optimal_eta_minutes += match.eta_minutes
+            result.optimal_matched += 1
+
+    @staticmethod
+    def _split_components(
+        requests: List[RideRequest],
+        candidates: Dict[int, List[DriverMatch]]
+    ) -> List[List[int]]:
+        # Заказы без общих водителей независимы — решаем их отдельными маленькими задачами
+        parent: Dict[int, int] = {r.ride_id: r.ride_id for r in requests}
+
+        def find(x: int) -> int:
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        driver_owner: Dict[int, int] = {}
+        for request in requests:
+            for match in candidates[request.ride_id]:
+                owner = driver_owner.setdefault(match.driver_profile_id, request.ride_id)
+                parent[find(request.ride_id)] = find(owner)
+
+        components: Dict[int, List[int]] = {}
+        for request in requests:
+            components.setdefault(find(request.ride_id), []).append(request.ride_id)
+        return list(components.values())
+
+    @staticmethod
+    def _greedy_baseline(
+        requests: List[RideRequest],
+        candidates: Dict[int, List[DriverMatch]]
+    ) -> Dict[int, float]:
+        taken = set()
+        etas: Dict[int, float] = {}
+        for request in requests:
+            options = sorted(candidates[request.ride_id], key=lambda m: m.eta_minutes)
+            for match in options:
+                if match.driver_profile_id not in taken:
+                    taken.add(match.driver_profile_id)
+                    etas[request.ride_id] = match.eta_minutes
+                    break
+        return etas
+
+
+batch_matcher = BatchMatcher()
@@ -0,0 +1,186 @@
+from typing import Dict, List, Optional
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from datetime import datetime
+import logging
+
+from app.schemas.chat_message import ChatMessageSchema
+
+logger = logging.getLogger(__name__)
+
+
+TERMINAL_RIDE_STATUSES = {"completed", "canceled"}
+
+
+class RideChatHistory:
+    __slots__ = ("ids", "messages", "complete", "loading")
+
+    def __init__(self):
+        self.ids: List[int] = []
+        self.messages: Dict[int, ChatMessageSchema] = {}
+        # complete — в окне лежит вся история чата, старше в БД ничего нет
+        self.complete = False
+        self.loading = True
+
+    def put(self, message: ChatMessageSchema) -> None:
+        if message.id not in self.messages:
+            insort(self.ids, message.id)
+        self.messages[message.id] = message
+
+
+class ChatHistoryCache:
+    # Последние MAX_MESSAGES_PER_RIDE сообщений каждого чата, LRU по поездкам.
+    # Запись сквозная: writer, правка и удаление обновляют кэш только после commit в БД.
+    # Окно хранится вместе с удалёнными сообщениями, чтобы отвечать и на include_deleted.
+
+    MAX_RIDES = 5000
+    MAX_MESSAGES_PER_RIDE = 200
+
+    def __init__(self, max_rides: int = MAX_RIDES, max_messages: int = MAX_MESSAGES_PER_RIDE):
+        self.max_rides = max_rides
+        self.max_messages = max_messages
+        self._rides: "OrderedDict[int, RideChatHistory]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(
+        self,
+        ride_id: int,
+        limit: int,
+        before_id: Optional[int] = None,
+        include_deleted: bool = False,
+    ) -> Optional[List[ChatMessageSchema]]:
+        entry = self._rides.get(ride_id)
+        if entry is None or entry.loading:
+            self.misses += 1
+            return None
+
+        end = bisect_left(entry.ids, before_id) if before_id else len(entry.ids)
+        result: List[ChatMessageSchema] = []
+        for index in range(end - 1, -1, -1):
+            message = entry.messages[entry.ids[index]]
+            if include_deleted or message.deleted_at is None:
+                result.append(message)
+                if len(result) == limit:
+                    break
+
+        # Недобрали limit, а окно обрезано — остаток лежит только в БД
+        if len(result) < limit and not entry.complete:
+            self.misses += 1
+            return None
+
+        self._rides.move_to_end(ride_id)
+        self.hits += 1
+        result.reverse()
+        return result
+
+    def get_after(self, ride_id: int, after_id: int, limit: int) -> Optional[List[ChatMessageSchema]]:
+        # Окно — непрерывный хвост чата, поэтому всё новее after_id в нём есть, если окно начинается не позже
+        entry = self._rides.get(ride_id)
+        if entry is None or entry.loading or not (entry.complete or (entry.ids and entry.ids[0] <= after_id)):
+            self.misses += 1
+            return None
+
+        result = []
+        for index in range(bisect_right(entry.ids, after_id), len(entry.ids)):
+            message = entry.messages[entry.ids[index]]
+            if message.deleted_at is None:
+                result.append(message)
+                if len(result) == limit:
+                    break
+        self._rides.move_to_end(ride_id)
+        self.hits += 1
+        return result
+
+    def get_updates(self, ride_id: int, up_to_id: int, since: datetime) -> Optional[List[ChatMessageSchema]]:
+        # Правки и удаления уже известных клиенту сообщений точно отвечаем только по полному чату
+        entry = self._rides.get(ride_id)
+        if entry is None or entry.loading or not entry.complete:
+            return None
+        updates = []
+        for index in range(bisect_right(entry.ids, up_to_id)):
+            message = entry.messages[entry.ids[index]]
+            if (message.edited_at and message.edited_at > since) or (message.deleted_at and message.deleted_at > since):
+                updates.append(message)
+        return updates
+
+    def begin_load(self, ride_id: int) -> bool:
+        # Заглушка на время чтения из БД: сообщения, записанные в это время, попадут в неё и не потеряются
+        if ride_id in self._rides:
+            return False
+        self._rides[ride_id] = RideChatHistory()
+        self._evict_overflow()
+        return True
+
+    def finish_load(self, ride_id: int, messages: List[ChatMessageSchema], complete: bool) -> None:
+        entry = self._rides.get(ride_id)
+        if entry is None:
+            return
+        for message in messages:
+            # Более свежие версии (правка во время загрузки) не перетираем
+            if message.id not in entry.messages:
+                entry.put(message)
+        entry.complete = complete
+        entry.loading = False
+        self._trim(entry)
+
+    def abort_load(self, ride_id: int) -> None:
+        entry = self._rides.get(ride_id)
+        if entry is not None and entry.loading:
+            del self._rides[ride_id]
+
+    def add(self, message: ChatMessageSchema) -> None:
+        entry = self._rides.get(message.ride_id)
+        if entry is None:
+            return
+        entry.put(message)
+        self._trim(entry)
+
+    def update(self, message: ChatMessageSchema) -> None:
+        entry = self._rides.get(message.ride_id)
+        if entry is None:
+            return
+        if message.id in entry.messages or entry.loading:
+            entry.put(message)
+            self._trim(entry)
+
+    def evict(self, ride_id: int) -> None:
+        if self._rides.pop(ride_id, None) is not None:
+            self.evictions += 1
+
+    def on_ride_status(self, ride_id: int, status: str) -> None:
+        if status in TERMINAL_RIDE_STATUSES:
+            self.evict(ride_id)
+
+    def _trim(self, entry: RideChatHistory) -> None:
+        overflow = len(entry.ids) - self.max_messages
+        if overflow > 0:
+            for message_id in entry.ids[:overflow]:
+                del entry.messages[message_id]
+            del entry.ids[:overflow]
+            entry.complete = False
+
+    def _evict_overflow(self) -> None:
+        while len(self._rides) > self.max_rides:
+            self._rides.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self._rides.clear()
+
+    def get_stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "rides": len(self._rides),
+            "messages": sum(len(entry.ids) for entry in self._rides.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            "evictions": self.evictions,
+            "max_rides": self.max_rides,
+            "max_messages_per_ride": self.max_messages
+        }
+
+
+chat_history_cache = ChatHistoryCache()
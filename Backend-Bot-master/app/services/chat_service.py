@@ -1,34 +1,19 @@
-import re
 import logging
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timedelta
-from collections import defaultdict
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, or_
 
 from app.models.chat_message import ChatMessage
 from app.models.ride import Ride
 from app.schemas.chat_message import ChatMessageSchema, ChatMessageCreate
+from app.services.moderation_dictionary import moderation_dictionary
+from app.services.rate_limiter import RateLimiter, RateLimitRule
+from app.services.chat_history_cache import chat_history_cache
 
 logger = logging.getLogger(__name__)
 
 
-
-BANNED_WORDS = {
-
-    "хуй", "хуя", "хуе", "хуи", "пизд", "блять", "блядь", "бля", "ебать", 
-    "ебан", "ебал", "ебу", "еби", "сука", "сучк", "мудак", "мудил",
-    "пидор", "пидар", "гандон", "залупа", "шлюх", "дрочи",
-
-    "fuck", "shit", "bitch", "asshole", "dick", "pussy", "cunt",
-}
-
-LEET_REPLACEMENTS = {
-    '0': 'о', '1': 'и', '3': 'е', '4': 'а', '5': 's', '6': 'б', '@': 'а',
-    '$': 's', '!': 'и', '*': '', '.': '', '-': '', '_': '',
-}
-
-
 class MessageType:
     TEXT = "text"
     IMAGE = "image"
@@ -37,6 +22,15 @@ class MessageType:
     VOICE = "voice"
 
 
+MESSAGE_TYPES = frozenset({
+    MessageType.TEXT,
+    MessageType.IMAGE,
+    MessageType.LOCATION,
+    MessageType.SYSTEM,
+    MessageType.VOICE,
+})
+
+
 class ModerationResult:
     def __init__(self, passed: bool, original: str, filtered: str, reason: Optional[str] = None):
         self.passed = passed
@@ -46,38 +40,66 @@ class ModerationResult:
 
 
 class ChatService:
+    SYNC_LIMIT = 200
+    # Перекрытие окна правок: edited_at ставится до коммита, часы воркеров расходятся
+    SYNC_CLOCK_OVERLAP_SECONDS = 5
+
     def __init__(self):
-        self._message_timestamps: Dict[int, List[datetime]] = defaultdict(list)
         self.rate_limit_messages = 10  
         self.rate_limit_period = 60  
+        # Скоупы: "<endpoint>:<message_type>", "<message_type>", "<endpoint>", "default"
+        self.rate_limiter = RateLimiter({
+            "default": RateLimitRule(self.rate_limit_messages, self.rate_limit_period),
+            MessageType.IMAGE: RateLimitRule(5, 60),
+            MessageType.VOICE: RateLimitRule(5, 60),
+            MessageType.LOCATION: RateLimitRule(30, 60),
+        }, message_types=MESSAGE_TYPES)
         self.max_message_length = 2000
         self.min_message_length = 1
     
     def _normalize_text(self, text: str) -> str:
-        result = text.lower()
-        for leet, normal in LEET_REPLACEMENTS.items():
-            result = result.replace(leet, normal)
-        return result
+        return text.lower().translate(moderation_dictionary.rules.normalize_table)
+    
+    def _normalize_with_positions(self, text: str) -> tuple[str, List[int]]:
+        # Нормализация удаляет символы (".", "-", "*"), поэтому для цензуры
+        # храним для каждого символа нормализованного текста индекс в исходном
+        table = moderation_dictionary.rules.normalize_table
+        chars = []
+        positions = []
+        for index, ch in enumerate(text):
+            mapped = ch.lower().translate(table)
+            chars.append(mapped)
+            positions.extend([index] * len(mapped))
+        return "".join(chars), positions
     
     def _contains_banned_words(self, text: str) -> tuple[bool, Optional[str]]:
-        normalized = self._normalize_text(text)
-        
-        for word in BANNED_WORDS:
-            if word in normalized:
-                return True, word
-        
-        return False, None
+        word = moderation_dictionary.rules.matcher.find_first(self._normalize_text(text))
+        return word is not None, word
     
     def _censor_text(self, text: str) -> str:
-        result = text
-        normalized = self._normalize_text(text)
+        normalized, positions = self._normalize_with_positions(text)
+        matches = sorted(
+            (positions[end - len(word)], positions[end - 1] + 1)
+            for end, word in moderation_dictionary.rules.matcher.iter_matches(normalized)
+        )
+        if not matches:
+            return text
         
-        for word in BANNED_WORDS:
-            if word in normalized:
-                pattern = re.compile(re.escape(word), re.IGNORECASE)
-                result = pattern.sub('*' * len(word), result)
+        spans = []
+        for start, stop in matches:
+            if spans and start <= spans[-1][1]:
+                spans[-1][1] = max(spans[-1][1], stop)
+            else:
+                spans.append([start, stop])
         
-        return result
+        result = []
+        cursor = 0
+        for start, stop in spans:
+            result.append(text[cursor:start])
+            result.append('*' * (stop - start))
+            cursor = stop
+        result.append(text[cursor:])
+        return "".join(result)
     
     def moderate_message(self, text: str) -> ModerationResult:
         if not text:
@@ -98,19 +120,22 @@ class ChatService:
         
         return ModerationResult(True, text, text, None)
     
-    def check_rate_limit(self, user_id: int) -> tuple[bool, Optional[str]]:
-        now = datetime.utcnow()
-        cutoff = now - timedelta(seconds=self.rate_limit_period)
-        
-        self._message_timestamps[user_id] = [
-            ts for ts in self._message_timestamps[user_id] 
-            if ts > cutoff
-        ]
-        
-        if len(self._message_timestamps[user_id]) >= self.rate_limit_messages:
-            return False, f"Rate limit exceeded. Max {self.rate_limit_messages} messages per {self.rate_limit_period}s"
-        
-        self._message_timestamps[user_id].append(now)
+    def is_valid_message_type(self, message_type: Any) -> bool:
+        # Значение из JSON клиента может быть любым, в том числе нехешируемым (список, объект)
+        return isinstance(message_type, str) and message_type in MESSAGE_TYPES
+    
+    def check_rate_limit(
+        self,
+        user_id: int,
+        message_type: str = MessageType.TEXT,
+        endpoint: Optional[str] = None,
+    ) -> tuple[bool, Optional[str]]:
+        allowed, retry_after, rule = self.rate_limiter.check(user_id, endpoint, message_type)
+        if not allowed:
+            return False, (
+                f"Rate limit exceeded. Max {rule.messages} messages per {rule.period_seconds}s, "
+                f"retry in {retry_after:.1f}s"
+            )
         return True, None
     
     async def validate_chat_access(
@@ -164,6 +189,7 @@ class ChatService:
         await session.flush()
         await session.refresh(message)
         
+        # В кэш истории сообщение кладёт вызывающий после commit: откат не должен оставить его в кэше
         return ChatMessageSchema.model_validate(message)
     
     async def get_chat_history(
@@ -173,7 +199,17 @@ class ChatService:
         limit: int = 50,
         before_id: Optional[int] = None,
         include_deleted: bool = False,
+        after_id: Optional[int] = None,
     ) -> List[ChatMessageSchema]:
+        if after_id is not None:
+            return await self._get_messages_after(session, ride_id, after_id, limit)
+        
+        cached = chat_history_cache.get(ride_id, limit, before_id, include_deleted)
+        if cached is None and before_id is None and await self._load_history_window(session, ride_id):
+            cached = chat_history_cache.get(ride_id, limit, before_id, include_deleted)
+        if cached is not None:
+            return cached
+        
         conditions = [ChatMessage.ride_id == ride_id]
         
         if before_id:
@@ -194,12 +230,101 @@ class ChatService:
         
         return [ChatMessageSchema.model_validate(m) for m in reversed(messages)]
     
+    async def _load_history_window(self, session: AsyncSession, ride_id: int) -> bool:
+        # Первое чтение чата: грузим окно последних сообщений (с удалёнными) и дальше отвечаем из кэша
+        if not chat_history_cache.begin_load(ride_id):
+            return False
+        window_size = chat_history_cache.max_messages
+        try:
+            result = await session.execute(
+                select(ChatMessage)
+                .where(ChatMessage.ride_id == ride_id)
+                .order_by(ChatMessage.id.desc())
+                .limit(window_size)
+            )
+            window = [ChatMessageSchema.model_validate(m) for m in result.scalars().all()]
+        except BaseException:
+            # И при отмене запроса (CancelledError): иначе заглушка loading останется навсегда
+            chat_history_cache.abort_load(ride_id)
+            raise
+        chat_history_cache.finish_load(ride_id, window, complete=len(window) < window_size)
+        return True
+    
+    async def _get_messages_after(
+        self,
+        session: AsyncSession,
+        ride_id: int,
+        after_id: int,
+        limit: int,
+    ) -> List[ChatMessageSchema]:
+        cached = chat_history_cache.get_after(ride_id, after_id, limit)
+        if cached is None and await self._load_history_window(session, ride_id):
+            cached = chat_history_cache.get_after(ride_id, after_id, limit)
+        if cached is not None:
+            return cached
+        
+        query = (
+            select(ChatMessage)
+            .where(and_(
+                ChatMessage.ride_id == ride_id,
+                ChatMessage.id > after_id,
+                ChatMessage.deleted_at.is_(None),
+            ))
+            .order_by(ChatMessage.id.asc())
+            .limit(limit)
+        )
+        result = await session.execute(query)
+        return [ChatMessageSchema.model_validate(m) for m in result.scalars().all()]
+    
+    async def get_chat_changes(
+        self,
+        session: AsyncSession,
+        ride_id: int,
+        since_id: int,
+        since: Optional[datetime] = None,
+    ) -> Dict[str, Any]:
+        # Дельта для переподключившегося клиента: новые сообщения после since_id
+        # и правки/удаления уже полученных, случившиеся после since (его водяной знак)
+        server_time = datetime.utcnow()
+        messages = await self._get_messages_after(session, ride_id, since_id, self.SYNC_LIMIT + 1)
+        has_more = len(messages) > self.SYNC_LIMIT
+        messages = messages[:self.SYNC_LIMIT]
+        
+        updates: List[ChatMessageSchema] = []
+        if since is not None:
+            threshold = since - timedelta(seconds=self.SYNC_CLOCK_OVERLAP_SECONDS)
+            cached = chat_history_cache.get_updates(ride_id, since_id, threshold)
+            if cached is not None:
+                updates = cached
+            else:
+                query = (
+                    select(ChatMessage)
+                    .where(and_(
+                        ChatMessage.ride_id == ride_id,
+                        ChatMessage.id <= since_id,
+                        or_(ChatMessage.edited_at > threshold, ChatMessage.deleted_at > threshold),
+                    ))
+                    .order_by(ChatMessage.id.asc())
+                )
+                result = await session.execute(query)
+                updates = [ChatMessageSchema.model_validate(m) for m in result.scalars().all()]
+        
+        return {
+            "messages": messages,
+            "updates": updates,
+            "has_more": has_more,
+            "watermark": {
+                "last_id": messages[-1].id if messages else since_id,
+                "server_time": server_time,
+            },
+        }
+    
     async def soft_delete_message(
         self,
         session: AsyncSession,
         message_id: int,
         user_id: int,
-    ) -> bool:
+    ) -> Optional[ChatMessageSchema]:
         query = select(ChatMessage).where(
             and_(
                 ChatMessage.id == message_id,
@@ -212,11 +337,11 @@ class ChatService:
         message = result.scalar_one_or_none()
         
         if not message:
-            return False
+            return None
         
         message.deleted_at = datetime.utcnow()
         await session.flush()
-        return True
+        return ChatMessageSchema.model_validate(message)
     
     async def edit_message(
         self,
@@ -252,12 +377,15 @@ class ChatService:
     
     def get_stats(self) -> Dict[str, Any]:
         return {
-            "active_users_with_rate_limit": len(self._message_timestamps),
+            "active_users_with_rate_limit": self.rate_limiter.tracked_count(),
             "rate_limit_config": {
                 "messages": self.rate_limit_messages,
                 "period_seconds": self.rate_limit_period,
+                **self.rate_limiter.get_stats(),
             },
             "max_message_length": self.max_message_length,
+            "moderation": moderation_dictionary.get_stats(),
+            "history_cache": chat_history_cache.get_stats(),
         }
 
 chat_service = ChatService()
@@ -0,0 +1,159 @@
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime
+import asyncio
+import logging
+import time
+
+from sqlalchemy import insert
+
+from app.models.chat_message import ChatMessage
+from app.schemas.chat_message import ChatMessageSchema
+from app.services.chat_history_cache import chat_history_cache
+
+logger = logging.getLogger(__name__)
+
+
+PendingMessage = Tuple[Dict[str, Any], asyncio.Future]
+
+
+class ChatMessageWriter:
+    # Групповая запись сообщений чата: write() кладёт сообщение в буфер и ждёт id,
+    # фоновая задача раз в FLUSH_INTERVAL_SECONDS вставляет буфер многострочным INSERT ... RETURNING
+    # в одной транзакции. На сообщение приходится доля транзакции вместо flush/refresh/commit.
+
+    FLUSH_INTERVAL_SECONDS = 0.005
+    MAX_BATCH_SIZE = 500
+
+    def __init__(self, session_maker=None):
+        # None — app.db.async_session_maker; бенчмарки подставляют хранилище в памяти
+        self.session_maker = session_maker
+        self._pending: List[PendingMessage] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.written = 0
+        self.failed = 0
+        self.max_batch = 0
+        self.last_flush_ms = 0.0
+
+    async def write(
+        self,
+        ride_id: int,
+        sender_id: int,
+        text: str,
+        message_type: str,
+        receiver_id: Optional[int] = None,
+        attachments: Optional[Dict[str, Any]] = None,
+        is_moderated: bool = True,
+    ) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        self._ensure_running(loop)
+        values = {
+            "ride_id": ride_id,
+            "sender_id": sender_id,
+            "receiver_id": receiver_id,
+            "text": text,
+            "message_type": message_type,
+            "attachments": attachments,
+            "is_moderated": is_moderated,
+            "created_at": datetime.utcnow(),
+        }
+        future = loop.create_future()
+        self._pending.append((values, future))
+        self._wakeup.set()
+        message_id = await future
+        return {"id": message_id, **values}
+
+    def _ensure_running(self, loop: asyncio.AbstractEventLoop) -> None:
+        # Задача привязана к своему loop — после рестарта lifespan (или в тестах) создаём заново
+        if self._task is not None and not self._task.done() and self._task.get_loop() is loop:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = loop.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if len(self._pending) < self.MAX_BATCH_SIZE:
+                await asyncio.sleep(self.FLUSH_INTERVAL_SECONDS)
+            await self.flush()
+
+    async def flush(self) -> None:
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            while self._pending:
+                batch = self._pending[:self.MAX_BATCH_SIZE]
+                del self._pending[:self.MAX_BATCH_SIZE]
+                await self._write_batch(batch)
+
+    async def _write_batch(self, batch: List[PendingMessage]) -> None:
+        started = time.perf_counter()
+        try:
+            ids = await self._insert([values for values, _ in batch])
+        except Exception as e:
+            if len(batch) > 1:
+                # Одно битое сообщение (например, несуществующий ride_id) не должно ронять всю пачку
+                logger.warning(f"Chat batch of {len(batch)} failed ({e}), retrying one by one")
+                for item in batch:
+                    await self._write_batch([item])
+                return
+            self.failed += 1
+            logger.error(f"Failed to save chat message: {e}")
+            _, future = batch[0]
+            if not future.done():
+                future.set_exception(e)
+            return
+
+        for (values, future), message_id in zip(batch, ids):
+            chat_history_cache.add(ChatMessageSchema(id=message_id, **values))
+            if not future.done():
+                future.set_result(message_id)
+        self.batches += 1
+        self.written += len(batch)
+        self.max_batch = max(self.max_batch, len(batch))
+        self.last_flush_ms = (time.perf_counter() - started) * 1000
+
+    async def _insert(self, rows: List[Dict[str, Any]]) -> List[int]:
+        session_maker = self.session_maker
+        if session_maker is None:
+            from app.db import async_session_maker
+            session_maker = async_session_maker
+
+        # executemany + RETURNING SQLAlchemy сворачивает в многострочные INSERT (insertmanyvalues);
+        # sort_by_parameter_order гарантирует, что id вернутся в порядке строк
+        statement = insert(ChatMessage).returning(ChatMessage.id, sort_by_parameter_order=True)
+        async with session_maker() as session:
+            result = await session.execute(statement, rows)
+            ids = [row.id for row in result]
+            await session.commit()
+        return ids
+
+    async def stop(self) -> None:
+        if self._task is not None and self._task.get_loop() is not asyncio.get_running_loop():
+            # Задача осталась от прошлого event loop, которого уже нет
+            self._task = None
+            self._flush_lock = None
+        # Сначала дописываем буфер (под тем же lock, что и фоновая задача), потом гасим задачу
+        await self.flush()
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def get_stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "written": self.written,
+            "batches": self.batches,
+            "failed": self.failed,
+            "avg_batch": round(self.written / self.batches, 2) if self.batches else 0,
+            "max_batch": self.max_batch,
+            "last_flush_ms": round(self.last_flush_ms, 2)
+        }
+
+
+chat_writer = ChatMessageWriter()
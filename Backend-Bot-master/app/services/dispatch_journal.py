@@ -0,0 +1,151 @@
+from typing import Callable, Dict, List, Optional
+from pathlib import Path
+import asyncio
+import json
+import logging
+import os
+
+from app.config import DISPATCH_JOURNAL_PATH
+
+logger = logging.getLogger(__name__)
+
+
+class DispatchJournal:
+    # Append-only журнал состояния диспатчей (JSON lines).
+    # append() только кладёт запись в буфер, на диск пишет фоновый flusher пачками.
+    # При старте журнал проигрывается и сжимается до снапшота активных диспатчей.
+
+    FLUSH_INTERVAL_SECONDS = 0.2
+    COMPACT_AFTER_RECORDS = 10_000
+
+    def __init__(self, path: str = DISPATCH_JOURNAL_PATH):
+        self.path = Path(path)
+        self._buffer: List[dict] = []
+        self._records_since_compact = 0
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._snapshot_provider: Optional[Callable[[], Dict[int, dict]]] = None
+        self._written = 0
+
+    def set_snapshot_provider(self, provider: Callable[[], Dict[int, dict]]) -> None:
+        self._snapshot_provider = provider
+
+    def append(self, record: dict) -> None:
+        self._buffer.append(record)
+
+    def replay(self) -> Dict[int, dict]:
+        dispatches: Dict[int, dict] = {}
+        if not self.path.exists():
+            return dispatches
+
+        with self.path.open("r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # Обрезанная последняя запись после падения процесса
+                    logger.warning(f"Skipping corrupted dispatch journal line {line_no}")
+                    continue
+                self._apply(dispatches, record)
+
+        logger.info(f"Replayed dispatch journal: {len(dispatches)} active dispatches")
+        return dispatches
+
+    def compact(self, dispatches: Dict[int, dict]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+
+        with tmp_path.open("w", encoding="utf-8") as f:
+            for ride_id, state in dispatches.items():
+                f.write(self._encode({"op": "snapshot", "ride_id": ride_id, **state}))
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp_path, self.path)
+        self._records_since_compact = 0
+
+    async def flush(self) -> int:
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+
+        async with self._flush_lock:
+            batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+            except Exception as e:
+                logger.error(f"Dispatch journal write failed ({len(batch)} records): {e}")
+                self._buffer = batch + self._buffer
+                return 0
+
+            self._written += len(batch)
+            self._records_since_compact += len(batch)
+
+            if self.needs_compaction() and self._snapshot_provider:
+                snapshot = self._snapshot_provider()
+                try:
+                    await asyncio.to_thread(self.compact, snapshot)
+                    logger.info(f"Compacted dispatch journal to {len(snapshot)} active dispatches")
+                except Exception as e:
+                    logger.error(f"Dispatch journal compaction failed: {e}")
+
+            return len(batch)
+
+    async def run_flusher(self, interval_seconds: float = FLUSH_INTERVAL_SECONDS) -> None:
+        try:
+            while True:
+                await asyncio.sleep(interval_seconds)
+                await self.flush()
+        finally:
+            await self.flush()
+
+    def needs_compaction(self) -> bool:
+        return self._records_since_compact >= self.COMPACT_AFTER_RECORDS
+
+    def get_stats(self) -> dict:
+        return {
+            "path": str(self.path),
+            "buffered": len(self._buffer),
+            "written": self._written,
+            "records_since_compact": self._records_since_compact
+        }
+
+    def _write_batch(self, batch: List[dict]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = "".join(self._encode(record) for record in batch)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def _encode(record: dict) -> str:
+        return json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str) + "\n"
+
+    @staticmethod
+    def _apply(dispatches: Dict[int, dict], record: dict) -> None:
+        op = record.get("op")
+        ride_id = record.get("ride_id")
+
+        if op in ("open", "snapshot"):
+            dispatches[ride_id] = {
+                "request": record["request"],
+                "ride_data": record["ride_data"],
+                "created_at": record["created_at"],
+                "waves": record.get("waves", 1),
+                "notified": record.get("notified", []),
+                "all_candidates": record.get("all_candidates", [])
+            }
+        elif op == "wave" and ride_id in dispatches:
+            state = dispatches[ride_id]
+            state["waves"] = record["wave"]
+            state["notified"].extend(record.get("notified", []))
+            state["all_candidates"] = record.get("all_candidates", state["all_candidates"])
+        elif op == "close":
+            dispatches.pop(ride_id, None)
+
+
+dispatch_journal = DispatchJournal()
@@ -0,0 +1,295 @@
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from collections import OrderedDict
+from contextlib import aclosing
+from datetime import datetime
+from pathlib import Path
+import asyncio
+import logging
+import os
+import time
+import uuid
+import zipfile
+
+from app.config import DOCUMENT_EXPORT_DIR
+from app.services.pdf_render_pool import pdf_render_pool, PDFRenderBusyError
+
+logger = logging.getLogger(__name__)
+
+
+# (driver_id, period_start, period_end) -> аргументы PDFGenerator.generate_driver_report
+ReportLoader = Callable[[int, datetime, datetime], Awaitable[Dict[str, Any]]]
+
+
+class ExportStatus:
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELED = "canceled"
+
+
+class ExportJob:
+    MAX_REPORTED_ERRORS = 20
+
+    def __init__(self, driver_ids: List[int], period_start: datetime, period_end: datetime, mode: str):
+        self.id = uuid.uuid4().hex
+        self.driver_ids = driver_ids
+        self.period_start = period_start
+        self.period_end = period_end
+        self.mode = mode
+        self.status = ExportStatus.PENDING
+        self.completed = 0
+        self.failed = 0
+        self.bytes_written = 0
+        self.errors: Dict[int, str] = {}
+        self.error: Optional[str] = None
+        self.path: Optional[Path] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def total(self) -> int:
+        return len(self.driver_ids)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (ExportStatus.COMPLETED, ExportStatus.FAILED, ExportStatus.CANCELED)
+
+    def report_filename(self, driver_id: int) -> str:
+        return f"driver_report_{driver_id}_{self.period_start.strftime('%Y%m%d')}_{self.period_end.strftime('%Y%m%d')}.pdf"
+
+    def archive_filename(self) -> str:
+        return f"driver_reports_{self.period_start.strftime('%Y%m%d')}_{self.period_end.strftime('%Y%m%d')}.zip"
+
+    def finish(self, status: str) -> None:
+        self.status = status
+        self.finished_at = time.time()
+
+    def to_dict(self) -> dict:
+        processed = self.completed + self.failed
+        return {
+            "id": self.id,
+            "mode": self.mode,
+            "status": self.status,
+            "total": self.total,
+            "completed": self.completed,
+            "failed": self.failed,
+            "progress": round(processed / self.total, 4) if self.total else 1.0,
+            "bytes_written": self.bytes_written,
+            "period_start": self.period_start,
+            "period_end": self.period_end,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "errors": dict(list(self.errors.items())[:self.MAX_REPORTED_ERRORS]),
+            "error": self.error
+        }
+
+
+class ZipStream:
+    # Приёмник без seek/tell: zipfile пишет размеры в data descriptor после каждого файла,
+    # а готовые байты забираются drain()
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class DocumentExporter:
+    # Массовая выгрузка отчётов водителей в ZIP. Отчёты рендерятся параллельно в pdf_render_pool
+    # (concurrency задач одновременно), готовые PDF сразу дописываются в архив — в памяти
+    # одновременно не больше concurrency документов, сколько бы водителей ни было в выгрузке.
+    # Архив либо пишется в файл фоновой задачей (прогресс по id задачи), либо отдаётся потоком.
+
+    MAX_JOBS = 100
+    JOB_TTL_SECONDS = 24 * 3600
+    BUSY_RETRIES = 10
+    BUSY_RETRY_SECONDS = 0.5
+
+    def __init__(
+        self,
+        path: Optional[str] = DOCUMENT_EXPORT_DIR,
+        render: Optional[Callable[..., Awaitable[bytes]]] = None,
+        concurrency: Optional[int] = None
+    ):
+        self.path = Path(path)
+        self._render_report = render
+        self.concurrency = concurrency
+        self.jobs: "OrderedDict[str, ExportJob]" = OrderedDict()
+
+    def create_job(self, driver_ids: List[int], period_start: datetime, period_end: datetime, mode: str) -> ExportJob:
+        self._prune_jobs()
+        # Порядок водителей сохраняем, повторы убираем
+        job = ExportJob(list(dict.fromkeys(driver_ids)), period_start, period_end, mode)
+        self.jobs[job.id] = job
+        return job
+
+    def get_job(self, job_id: str) -> Optional[ExportJob]:
+        return self.jobs.get(job_id)
+
+    def start(self, job: ExportJob, load_report: ReportLoader) -> ExportJob:
+        job.task = asyncio.create_task(self._run_to_file(job, load_report))
+        return job
+
+    async def _run_to_file(self, job: ExportJob, load_report: ReportLoader) -> None:
+        loop = asyncio.get_running_loop()
+        self.path.mkdir(parents=True, exist_ok=True)
+        final_path = self.path / f"{job.id}.zip"
+        tmp_path = self.path / f".{job.id}.zip.tmp"
+        job.status = ExportStatus.RUNNING
+        try:
+            with open(tmp_path, "wb") as f, zipfile.ZipFile(f, "w", zipfile.ZIP_STORED) as archive:
+                async with aclosing(self._render_all(job, load_report)) as reports:
+                    async for filename, pdf in reports:
+                        # Запись в файл — в пуле потоков; архив пишет только этот цикл, lock не нужен
+                        await loop.run_in_executor(None, self._add, archive, filename, pdf)
+                        job.bytes_written = f.tell()
+                self._add_errors(archive, job)
+            job.bytes_written = tmp_path.stat().st_size
+            os.replace(tmp_path, final_path)
+            job.path = final_path
+            job.finish(ExportStatus.COMPLETED)
+            logger.info(f"Export {job.id}: {job.completed}/{job.total} reports, {job.failed} failed")
+        except asyncio.CancelledError:
+            job.finish(ExportStatus.CANCELED)
+            raise
+        except Exception as e:
+            job.error = str(e)
+            job.finish(ExportStatus.FAILED)
+            logger.error(f"Export {job.id} failed: {e}")
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+
+    async def stream(self, job: ExportJob, load_report: ReportLoader) -> AsyncIterator[bytes]:
+        sink = ZipStream()
+        job.status = ExportStatus.RUNNING
+        try:
+            with zipfile.ZipFile(sink, "w", zipfile.ZIP_STORED) as archive:
+                # aclosing: при обрыве загрузки закрываем и генератор рендеринга, иначе его воркеры доработают впустую
+                async with aclosing(self._render_all(job, load_report)) as reports:
+                    async for filename, pdf in reports:
+                        self._add(archive, filename, pdf)
+                        chunk = sink.drain()
+                        job.bytes_written += len(chunk)
+                        yield chunk
+                self._add_errors(archive, job)
+            chunk = sink.drain()
+            job.bytes_written += len(chunk)
+            job.finish(ExportStatus.COMPLETED)
+            yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            # Клиент оборвал загрузку
+            job.finish(ExportStatus.CANCELED)
+            raise
+        except Exception as e:
+            job.error = str(e)
+            job.finish(ExportStatus.FAILED)
+            logger.error(f"Export stream {job.id} failed: {e}")
+            raise
+
+    async def _render_all(self, job: ExportJob, load_report: ReportLoader) -> AsyncIterator[Tuple[str, bytes]]:
+        concurrency = self.concurrency or pdf_render_pool.workers
+        # Очередь готовых PDF ограничена: воркер ждёт, пока архив заберёт его документ
+        ready: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+        driver_ids = iter(job.driver_ids)
+
+        async def worker():
+            for driver_id in driver_ids:
+                try:
+                    pdf = await self._render_one(job, driver_id, load_report)
+                except Exception as e:
+                    job.failed += 1
+                    job.errors[driver_id] = str(e)
+                    logger.warning(f"Export {job.id}: report for driver {driver_id} failed: {e}")
+                    continue
+                await ready.put((job.report_filename(driver_id), pdf))
+
+        async def close_when_done(workers):
+            await asyncio.gather(*workers, return_exceptions=True)
+            await ready.put(None)
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, job.total))]
+        closer = asyncio.create_task(close_when_done(workers))
+        try:
+            while True:
+                item = await ready.get()
+                if item is None:
+                    break
+                yield item
+                job.completed += 1
+        finally:
+            for task in workers + [closer]:
+                task.cancel()
+            await asyncio.gather(*workers, closer, return_exceptions=True)
+
+    async def _render_one(self, job: ExportJob, driver_id: int, load_report: ReportLoader) -> bytes:
+        render = self._render_report
+        if render is None:
+            from app.services.pdf_generator import pdf_generator
+            render = pdf_generator.generate_driver_report
+
+        report = await load_report(driver_id, job.period_start, job.period_end)
+        for attempt in range(self.BUSY_RETRIES):
+            try:
+                return await render(**report)
+            except PDFRenderBusyError:
+                # Очередь пула занята интерактивными запросами — выгрузка подождёт
+                if attempt == self.BUSY_RETRIES - 1:
+                    raise
+                await asyncio.sleep(self.BUSY_RETRY_SECONDS)
+
+    @staticmethod
+    def _add(archive: zipfile.ZipFile, filename: str, data: bytes) -> None:
+        # PDF уже сжат внутри — ZIP_STORED, без повторного сжатия
+        info = zipfile.ZipInfo(filename, date_time=time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_STORED
+        archive.writestr(info, data)
+
+    def _add_errors(self, archive: zipfile.ZipFile, job: ExportJob) -> None:
+        if job.errors:
+            lines = [f"{driver_id}\t{error}" for driver_id, error in job.errors.items()]
+            self._add(archive, "errors.txt", ("\n".join(lines) + "\n").encode("utf-8"))
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.jobs.get(job_id)
+        if job is None or job.task is None or job.task.done():
+            return False
+        job.task.cancel()
+        return True
+
+    def _prune_jobs(self) -> None:
+        now = time.time()
+        # От старых к новым; незавершённые задачи не трогаем
+        for job_id, job in list(self.jobs.items()):
+            expired = job.finished_at is not None and now - job.finished_at > self.JOB_TTL_SECONDS
+            if not job.finished or not (expired or len(self.jobs) >= self.MAX_JOBS):
+                continue
+            del self.jobs[job_id]
+            if job.path is not None and job.path.exists():
+                job.path.unlink()
+
+    async def stop(self) -> None:
+        tasks = [job.task for job in self.jobs.values() if job.task is not None and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self) -> dict:
+        statuses: Dict[str, int] = {}
+        for job in self.jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {"jobs": len(self.jobs), "by_status": statuses}
+
+
+document_exporter = DocumentExporter()
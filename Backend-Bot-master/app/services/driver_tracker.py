@@ -1,11 +1,14 @@
 
 from datetime import datetime, timedelta
 from enum import Enum
-from typing import Dict, List, Optional, Set
+from typing import Dict, List, Optional, Set, Tuple
 from dataclasses import dataclass, field
 import math
+import time
 import logging
 
+from app.services.metrics import metrics
+
 logger = logging.getLogger(__name__)
 
 
@@ -55,11 +58,14 @@ class DriverState:
 
 class DriverTracker:
     OFFLINE_TIMEOUT_SECONDS = 120 
+    OFFER_LOCK_TTL_SECONDS = 15
     
     def __init__(self):
         self._drivers: Dict[int, DriverState] = {}
         self._user_to_driver: Dict[int, int] = {}
         self._class_index: Dict[str, Set[int]] = {}
+        # driver_profile_id -> (ride_id, monotonic expires_at)
+        self._offer_locks: Dict[int, Tuple[int, float]] = {}
     
     def register_driver(
         self,
@@ -153,6 +159,7 @@ class DriverTracker:
         state = self._drivers[driver_profile_id]
         state.current_ride_id = ride_id
         state.status = DriverStatus.BUSY
+        self._offer_locks.pop(driver_profile_id, None)
         state.updated_at = datetime.utcnow()
         
         logger.info(f"Driver {driver_profile_id} assigned to ride {ride_id}")
@@ -171,6 +178,38 @@ class DriverTracker:
         logger.info(f"Driver {driver_profile_id} released from ride {old_ride}")
         return state
     
+    def lock_for_offer(
+        self,
+        driver_profile_id: int,
+        ride_id: int,
+        ttl_seconds: Optional[float] = None
+    ) -> bool:
+        if self.is_offer_locked(driver_profile_id, for_ride_id=ride_id):
+            return False
+        
+        ttl = ttl_seconds if ttl_seconds is not None else self.OFFER_LOCK_TTL_SECONDS
+        self._offer_locks[driver_profile_id] = (ride_id, time.monotonic() + ttl)
+        return True
+    
+    def release_offer_lock(self, driver_profile_id: int, ride_id: Optional[int] = None) -> bool:
+        lock = self._offer_locks.get(driver_profile_id)
+        if lock is None or (ride_id is not None and lock[0] != ride_id):
+            return False
+        del self._offer_locks[driver_profile_id]
+        return True
+    
+    def is_offer_locked(self, driver_profile_id: int, for_ride_id: Optional[int] = None) -> bool:
+        lock = self._offer_locks.get(driver_profile_id)
+        if lock is None:
+            return False
+        
+        ride_id, expires_at = lock
+        if expires_at <= time.monotonic():
+            del self._offer_locks[driver_profile_id]
+            return False
+        
+        return ride_id != for_ride_id
+    
     def get_driver(self, driver_profile_id: int) -> Optional[DriverState]:
         return self._drivers.get(driver_profile_id)
     
@@ -180,6 +219,7 @@ class DriverTracker:
             return self._drivers.get(driver_id)
         return None
     
+    @metrics.timed("get_available_drivers")
     def get_available_drivers(
         self,
         ride_class: Optional[str] = None,
@@ -234,6 +274,7 @@ class DriverTracker:
             "online": self.get_online_count(),
             "busy": self.get_busy_count(),
             "offline": sum(1 for d in self._drivers.values() if d.status == DriverStatus.OFFLINE),
+            "offer_locks": len(self._offer_locks),
         }
     
     def cleanup_stale(self) -> int:
@@ -246,6 +287,11 @@ class DriverTracker:
                 count += 1
                 logger.info(f"Driver {driver.driver_profile_id} auto-offline (stale)")
         
+        now = time.monotonic()
+        for driver_id, (_, expires_at) in list(self._offer_locks.items()):
+            if expires_at <= now:
+                del self._offer_locks[driver_id]
+        
         return count
     
     def _update_class_index(self, driver_id: int, classes: Set[str]):
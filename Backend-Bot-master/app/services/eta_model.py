@@ -0,0 +1,192 @@
+from typing import List, Optional
+from array import array
+from datetime import datetime
+from pathlib import Path
+import json
+import logging
+import math
+
+from app.services.driver_tracker import DriverTracker
+
+logger = logging.getLogger(__name__)
+
+
+HOURS_PER_WEEK = 168
+
+
+def hour_of_week(moment: datetime) -> int:
+    return moment.weekday() * 24 + moment.hour
+
+
+class ConstantSpeedEstimator:
+    # Прежняя модель: прямая по haversine и одна средняя скорость по городу
+
+    def __init__(self, speed_kmh: float = 30.0):
+        self.speed_kmh = speed_kmh
+
+    def estimate_minutes(
+        self,
+        from_lat: float,
+        from_lng: float,
+        to_lat: float,
+        to_lng: float,
+        distance_km: Optional[float] = None,
+        when: Optional[datetime] = None
+    ) -> float:
+        if distance_km is None:
+            distance_km = DriverTracker._haversine_distance(from_lat, from_lng, to_lat, to_lng)
+        return (distance_km / self.speed_kmh) * 60
+
+    def describe(self) -> dict:
+        return {"model": "constant", "speed_kmh": self.speed_kmh}
+
+
+class SpeedGridEstimator:
+    # Средние скорости по ячейкам сетки и часу недели, обучаются офлайн (см. eta_training).
+    # Сетка хранится плоским array('f'): индекс = (row * cols + col) * 168 + hour,
+    # поэтому оценка для кандидата — одна арифметика и одно обращение к массиву.
+
+    FILE_FORMAT_VERSION = 1
+    MIN_SPEED_KMH = 3.0
+
+    def __init__(
+        self,
+        min_lat: float,
+        min_lng: float,
+        cell_size_deg: float,
+        rows: int,
+        cols: int,
+        speeds: array,
+        hourly_speeds: array,
+        route_factor: float = 1.3,
+        trained_at: Optional[str] = None,
+        samples: int = 0
+    ):
+        if len(speeds) != rows * cols * HOURS_PER_WEEK:
+            raise ValueError(f"Speed grid size {len(speeds)} does not match {rows}x{cols}x{HOURS_PER_WEEK}")
+        if len(hourly_speeds) != HOURS_PER_WEEK:
+            raise ValueError(f"Hourly speeds must have {HOURS_PER_WEEK} values")
+
+        self.min_lat = min_lat
+        self.min_lng = min_lng
+        self.cell_size_deg = cell_size_deg
+        self.rows = rows
+        self.cols = cols
+        self.speeds = speeds
+        self.hourly_speeds = hourly_speeds
+        self.route_factor = route_factor
+        self.trained_at = trained_at
+        self.samples = samples
+
+    def speed_at(self, lat: float, lng: float, hour: int) -> float:
+        row = (lat - self.min_lat) / self.cell_size_deg
+        col = (lng - self.min_lng) / self.cell_size_deg
+        if 0 <= row < self.rows and 0 <= col < self.cols:
+            speed = self.speeds[(int(row) * self.cols + int(col)) * HOURS_PER_WEEK + hour]
+        else:
+            speed = self.hourly_speeds[hour]
+        return max(speed, self.MIN_SPEED_KMH)
+
+    def estimate_minutes(
+        self,
+        from_lat: float,
+        from_lng: float,
+        to_lat: float,
+        to_lng: float,
+        distance_km: Optional[float] = None,
+        when: Optional[datetime] = None
+    ) -> float:
+        if distance_km is None:
+            distance_km = DriverTracker._haversine_distance(from_lat, from_lng, to_lat, to_lng)
+        hour = hour_of_week(when or datetime.utcnow())
+        # Подача короткая, поэтому берём скорость в ячейке середины отрезка
+        speed = self.speed_at((from_lat + to_lat) / 2, (from_lng + to_lng) / 2, hour)
+        return (distance_km * self.route_factor / speed) * 60
+
+    def describe(self) -> dict:
+        return {
+            "model": "speed_grid",
+            "cells": self.rows * self.cols,
+            "cell_size_deg": self.cell_size_deg,
+            "route_factor": round(self.route_factor, 3),
+            "samples": self.samples,
+            "trained_at": self.trained_at,
+            "size_bytes": self.speeds.itemsize * len(self.speeds)
+        }
+
+    def save(self, path: str) -> None:
+        header = {
+            "version": self.FILE_FORMAT_VERSION,
+            "min_lat": self.min_lat,
+            "min_lng": self.min_lng,
+            "cell_size_deg": self.cell_size_deg,
+            "rows": self.rows,
+            "cols": self.cols,
+            "route_factor": self.route_factor,
+            "trained_at": self.trained_at,
+            "samples": self.samples,
+            "hourly_speeds": [round(s, 3) for s in self.hourly_speeds]
+        }
+        target = Path(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_suffix(target.suffix + ".tmp")
+        with tmp_path.open("wb") as f:
+            f.write(json.dumps(header).encode("utf-8") + b"\n")
+            self.speeds.tofile(f)
+        tmp_path.replace(target)
+
+    @classmethod
+    def load(cls, path: str) -> "SpeedGridEstimator":
+        with open(path, "rb") as f:
+            header = json.loads(f.readline().decode("utf-8"))
+            if header.get("version") != cls.FILE_FORMAT_VERSION:
+                raise ValueError(f"Unsupported speed grid version {header.get('version')}")
+            speeds = array("f")
+            speeds.frombytes(f.read())
+
+        return cls(
+            min_lat=header["min_lat"],
+            min_lng=header["min_lng"],
+            cell_size_deg=header["cell_size_deg"],
+            rows=header["rows"],
+            cols=header["cols"],
+            speeds=speeds,
+            hourly_speeds=array("f", header["hourly_speeds"]),
+            route_factor=header["route_factor"],
+            trained_at=header.get("trained_at"),
+            samples=header.get("samples", 0)
+        )
+
+
+def load_eta_estimator(path: Optional[str], default_speed_kmh: float = 30.0):
+    if path and Path(path).exists():
+        try:
+            estimator = SpeedGridEstimator.load(path)
+            logger.info(f"Loaded ETA speed grid from {path}: {estimator.describe()}")
+            return estimator
+        except Exception as e:
+            logger.error(f"Failed to load ETA speed grid from {path}: {e}")
+    return ConstantSpeedEstimator(default_speed_kmh)
+
+
+def segment_cells(
+    from_lat: float,
+    from_lng: float,
+    to_lat: float,
+    to_lng: float,
+    cell_size_deg: float
+) -> List[tuple]:
+    # Ячейки, через которые проходит прямая от точки до точки (шаг — полячейки)
+    steps = max(1, int(math.ceil(max(abs(to_lat - from_lat), abs(to_lng - from_lng)) / (cell_size_deg / 2))))
+    cells = []
+    seen = set()
+    for i in range(steps + 1):
+        t = i / steps
+        cell = (
+            math.floor((from_lat + (to_lat - from_lat) * t) / cell_size_deg),
+            math.floor((from_lng + (to_lng - from_lng) * t) / cell_size_deg)
+        )
+        if cell not in seen:
+            seen.add(cell)
+            cells.append(cell)
+    return cells
@@ -0,0 +1,219 @@
+from typing import Dict, List, Tuple
+from array import array
+from datetime import datetime, timedelta
+import asyncio
+import logging
+import math
+import statistics
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.driver_tracker import DriverTracker
+from app.services.eta_model import HOURS_PER_WEEK, SpeedGridEstimator, hour_of_week, segment_cells
+
+logger = logging.getLogger(__name__)
+
+
+class SpeedGridTrainer:
+    # Офлайн-обучение сетки скоростей: завершённые поездки (distance/duration)
+    # и последовательные точки трека водителя из driver_locations.
+    # Ячейки с малым числом наблюдений подтягиваются к средней скорости этого часа недели.
+
+    CELL_SIZE_DEG = 0.01
+    DEFAULT_SPEED_KMH = 30.0
+    MIN_SPEED_KMH = 3.0
+    MAX_SPEED_KMH = 120.0
+    MIN_TRACK_GAP_SECONDS = 5
+    MAX_TRACK_GAP_SECONDS = 120
+    PRIOR_WEIGHT = 5.0
+    DEFAULT_ROUTE_FACTOR = 1.3
+
+    def __init__(self, cell_size_deg: float = CELL_SIZE_DEG):
+        self.cell_size_deg = cell_size_deg
+        self._sums: Dict[Tuple[int, int, int], float] = {}
+        self._counts: Dict[Tuple[int, int, int], float] = {}
+        self._hour_sums = [0.0] * HOURS_PER_WEEK
+        self._hour_counts = [0.0] * HOURS_PER_WEEK
+        self._route_factors: List[float] = []
+        self.samples = 0
+
+    def add_ride(
+        self,
+        pickup_lat: float,
+        pickup_lng: float,
+        dropoff_lat: float,
+        dropoff_lng: float,
+        distance_meters: int,
+        duration_seconds: int,
+        started_at: datetime
+    ) -> bool:
+        if not distance_meters or not duration_seconds:
+            return False
+        speed = (distance_meters / 1000) / (duration_seconds / 3600)
+        if not self.MIN_SPEED_KMH <= speed <= self.MAX_SPEED_KMH:
+            return False
+
+        straight_km = DriverTracker._haversine_distance(pickup_lat, pickup_lng, dropoff_lat, dropoff_lng)
+        if straight_km > 0.3:
+            self._route_factors.append((distance_meters / 1000) / straight_km)
+
+        cells = segment_cells(pickup_lat, pickup_lng, dropoff_lat, dropoff_lng, self.cell_size_deg)
+        weight = 1.0 / len(cells)
+        hour = hour_of_week(started_at)
+        for row, col in cells:
+            self._add(row, col, hour, speed, weight)
+        return True
+
+    def add_track_point_pair(
+        self,
+        lat1: float,
+        lng1: float,
+        at1: datetime,
+        lat2: float,
+        lng2: float,
+        at2: datetime
+    ) -> bool:
+        gap = (at2 - at1).total_seconds()
+        if not self.MIN_TRACK_GAP_SECONDS <= gap <= self.MAX_TRACK_GAP_SECONDS:
+            return False
+        distance_km = DriverTracker._haversine_distance(lat1, lng1, lat2, lng2)
+        speed = distance_km / (gap / 3600)
+        # Стоянки и скачки GPS не говорят о скорости движения по дорогам
+        if not self.MIN_SPEED_KMH <= speed <= self.MAX_SPEED_KMH:
+            return False
+
+        row = math.floor(((lat1 + lat2) / 2) / self.cell_size_deg)
+        col = math.floor(((lng1 + lng2) / 2) / self.cell_size_deg)
+        self._add(row, col, hour_of_week(at1), speed, 1.0)
+        return True
+
+    def build(self) -> SpeedGridEstimator:
+        hourly = self._hourly_means()
+        route_factor = (
+            statistics.median(self._route_factors)
+            if self._route_factors else self.DEFAULT_ROUTE_FACTOR
+        )
+
+        if not self._counts:
+            return SpeedGridEstimator(
+                min_lat=0.0, min_lng=0.0, cell_size_deg=self.cell_size_deg,
+                rows=0, cols=0, speeds=array("f"), hourly_speeds=array("f", hourly),
+                route_factor=route_factor, trained_at=datetime.utcnow().isoformat(),
+                samples=self.samples
+            )
+
+        min_row = min(k[0] for k in self._counts)
+        max_row = max(k[0] for k in self._counts)
+        min_col = min(k[1] for k in self._counts)
+        max_col = max(k[1] for k in self._counts)
+        rows = max_row - min_row + 1
+        cols = max_col - min_col + 1
+
+        speeds = array("f", [0.0]) * (rows * cols * HOURS_PER_WEEK)
+        for row in range(rows):
+            for col in range(cols):
+                base = (row * cols + col) * HOURS_PER_WEEK
+                speeds[base:base + HOURS_PER_WEEK] = array("f", hourly)
+
+        for (row, col, hour), count in self._counts.items():
+            total = self._sums[(row, col, hour)]
+            index = ((row - min_row) * cols + (col - min_col)) * HOURS_PER_WEEK + hour
+            speeds[index] = (total + self.PRIOR_WEIGHT * hourly[hour]) / (count + self.PRIOR_WEIGHT)
+
+        return SpeedGridEstimator(
+            min_lat=min_row * self.cell_size_deg,
+            min_lng=min_col * self.cell_size_deg,
+            cell_size_deg=self.cell_size_deg,
+            rows=rows,
+            cols=cols,
+            speeds=speeds,
+            hourly_speeds=array("f", hourly),
+            route_factor=route_factor,
+            trained_at=datetime.utcnow().isoformat(),
+            samples=self.samples
+        )
+
+    def _add(self, row: int, col: int, hour: int, speed: float, weight: float) -> None:
+        key = (row, col, hour)
+        self._sums[key] = self._sums.get(key, 0.0) + speed * weight
+        self._counts[key] = self._counts.get(key, 0.0) + weight
+        self._hour_sums[hour] += speed * weight
+        self._hour_counts[hour] += weight
+        self.samples += 1
+
+    def _hourly_means(self) -> List[float]:
+        total_count = sum(self._hour_counts)
+        overall = sum(self._hour_sums) / total_count if total_count else self.DEFAULT_SPEED_KMH
+        return [
+            (self._hour_sums[h] + self.PRIOR_WEIGHT * overall) / (self._hour_counts[h] + self.PRIOR_WEIGHT)
+            for h in range(HOURS_PER_WEEK)
+        ]
+
+
+async def train_from_db(session: AsyncSession, since: datetime) -> SpeedGridEstimator:
+    trainer = SpeedGridTrainer()
+
+    rides = await session.stream(
+        text(
+            """
+            SELECT pickup_lat, pickup_lng, dropoff_lat, dropoff_lng,
+                   distance_meters, duration_seconds, started_at
+            FROM rides
+            WHERE status = 'completed'
+              AND distance_meters > 0 AND duration_seconds > 0
+              AND pickup_lat IS NOT NULL AND dropoff_lat IS NOT NULL
+              AND started_at >= :since
+            """
+        ),
+        {"since": since}
+    )
+    used_rides = 0
+    async for r in rides:
+        used_rides += trainer.add_ride(
+            float(r.pickup_lat), float(r.pickup_lng),
+            float(r.dropoff_lat), float(r.dropoff_lng),
+            r.distance_meters, r.duration_seconds, r.started_at
+        )
+
+    points = await session.stream(
+        text(
+            """
+            SELECT driver_profile_id, latitude, longitude, created_at
+            FROM driver_locations
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+              AND created_at >= :since
+            ORDER BY driver_profile_id, created_at
+            """
+        ),
+        {"since": since}
+    )
+    used_points = 0
+    previous = None
+    async for p in points:
+        current = (p.driver_profile_id, float(p.latitude), float(p.longitude), p.created_at)
+        if previous and previous[0] == current[0]:
+            used_points += trainer.add_track_point_pair(
+                previous[1], previous[2], previous[3],
+                current[1], current[2], current[3]
+            )
+        previous = current
+
+    logger.info(f"ETA grid training: {used_rides} rides, {used_points} track segments")
+    return trainer.build()
+
+
+async def main(days: int = 28) -> None:
+    from app.config import ETA_GRID_PATH
+    from app.db import async_session_maker
+
+    async with async_session_maker() as session:
+        estimator = await train_from_db(session, datetime.utcnow() - timedelta(days=days))
+    estimator.save(ETA_GRID_PATH)
+    logger.info(f"Saved ETA speed grid to {ETA_GRID_PATH}: {estimator.describe()}")
+
+
+if __name__ == "__main__":
+    # python -m app.services.eta_training
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
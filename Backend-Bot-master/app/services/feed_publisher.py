@@ -0,0 +1,204 @@
+from typing import Dict, List, Optional, Set, Tuple
+from dataclasses import dataclass, field
+import asyncio
+import logging
+
+from app.services.driver_tracker import driver_tracker
+from app.services.matching_engine import matching_engine
+from app.services.ride_index import ride_index, PendingRideIndex
+from app.services.websocket_manager import manager
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FeedSubscription:
+    user_id: int
+    driver_profile_id: int
+    radius_km: float
+    limit: int
+    # ride_id -> расстояние до подачи, км: по нему лента держит limit ближайших заказов
+    rides: Dict[int, float] = field(default_factory=dict)
+    # Ячейка сетки PendingRideIndex, где водитель был при подписке или последнем on_driver_moved
+    cell: Optional[Tuple[int, int]] = None
+
+
+class DriverFeedPublisher:
+    # Подписки разложены по ячейкам сетки индекса заказов по позиции водителя. Событие заказа
+    # проверяет только подписки из ячеек в радиусе FEED_RADIUS_KM от точки подачи и тех,
+    # у кого заказ уже в ленте, — а не всех онлайн-водителей.
+
+    MAX_FEED_SIZE = 100
+
+    def __init__(self, index: PendingRideIndex = ride_index):
+        self.index = index
+        self._subscriptions: Dict[int, FeedSubscription] = {}
+        self._cells: Dict[Tuple[int, int], Set[int]] = {}
+        # ride_id -> user_id подписок, у которых заказ в ленте
+        self._ride_holders: Dict[int, Set[int]] = {}
+        self._pending_sends: Set[asyncio.Task] = set()
+        self.index.add_listener(self.on_ride_event)
+
+    def subscribe(
+        self,
+        user_id: int,
+        radius_km: float = PendingRideIndex.FEED_RADIUS_KM,
+        limit: int = 20
+    ) -> Optional[dict]:
+        driver = driver_tracker.get_driver_by_user(user_id)
+        if not driver or driver.latitude is None:
+            return None
+
+        self.unsubscribe(user_id)
+        subscription = FeedSubscription(
+            user_id=user_id,
+            driver_profile_id=driver.driver_profile_id,
+            radius_km=min(radius_km, PendingRideIndex.FEED_RADIUS_KM),
+            limit=min(limit, self.MAX_FEED_SIZE)
+        )
+        feed = self._build_feed(subscription)
+        self._set_rides(subscription, {r["id"]: r["distance_to_pickup_km"] for r in feed})
+        self._subscriptions[user_id] = subscription
+        self._place(subscription, driver.latitude, driver.longitude)
+
+        logger.info(f"Driver {driver.driver_profile_id} subscribed to feed ({len(feed)} rides)")
+        return {
+            "type": "feed_snapshot",
+            "driver_profile_id": driver.driver_profile_id,
+            "count": len(feed),
+            "rides": feed
+        }
+
+    def unsubscribe(self, user_id: int) -> bool:
+        subscription = self._subscriptions.pop(user_id, None)
+        if subscription is None:
+            return False
+        self._set_rides(subscription, {})
+        self._place(subscription, None, None)
+        return True
+
+    def is_subscribed(self, user_id: int) -> bool:
+        return user_id in self._subscriptions
+
+    async def on_driver_moved(self, user_id: int) -> None:
+        subscription = self._subscriptions.get(user_id)
+        if not subscription:
+            return
+
+        driver = driver_tracker.get_driver(subscription.driver_profile_id)
+        if driver and driver.latitude is not None:
+            self._place(subscription, driver.latitude, driver.longitude)
+
+        feed = self._build_feed(subscription)
+        new_rides = {r["id"]: r["distance_to_pickup_km"] for r in feed}
+        added = [r for r in feed if r["id"] not in subscription.rides]
+        removed = [ride_id for ride_id in subscription.rides if ride_id not in new_rides]
+        self._set_rides(subscription, new_rides)
+
+        if added or removed:
+            await manager.send_personal_message(user_id, {
+                "type": "feed_diff",
+                "added": added,
+                "updated": [],
+                "removed": removed
+            })
+
+    def on_ride_event(self, event: str, ride: dict) -> None:
+        # Вызывается индексом после commit транзакции, изменившей заказ
+        ride_id = ride["id"]
+        holders = self._ride_holders.get(ride_id, set())
+
+        if event == "remove":
+            for user_id in list(holders):
+                self._drop_ride(self._subscriptions[user_id], ride_id)
+                self._push(user_id, {"removed": [ride_id]})
+            return
+
+        candidates = set(holders)
+        for cell in self.index.cells_in_radius(ride["pickup_lat"], ride["pickup_lng"], PendingRideIndex.FEED_RADIUS_KM):
+            candidates.update(self._cells.get(cell, ()))
+
+        for user_id in candidates:
+            subscription = self._subscriptions[user_id]
+            in_feed = ride_id in subscription.rides
+            relevant = matching_engine.get_driver_feed(subscription.driver_profile_id, [ride], limit=1)
+            if relevant and relevant[0]["distance_to_pickup_km"] <= subscription.radius_km:
+                distance = relevant[0]["distance_to_pickup_km"]
+                removed = []
+                if not in_feed and len(subscription.rides) >= subscription.limit:
+                    # Лента заполнена: как и в снапшоте, остаются limit ближайших заказов
+                    farthest = max(subscription.rides, key=subscription.rides.get, default=None)
+                    if farthest is None or subscription.rides[farthest] <= distance:
+                        continue
+                    self._drop_ride(subscription, farthest)
+                    removed.append(farthest)
+                self._add_ride(subscription, ride_id, distance)
+                key = "updated" if in_feed else "added"
+                self._push(user_id, {key: relevant, "removed": removed})
+            elif in_feed:
+                self._drop_ride(subscription, ride_id)
+                self._push(user_id, {"removed": [ride_id]})
+
+    def get_stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscriptions),
+            "cells": len(self._cells),
+            "pending_sends": len(self._pending_sends)
+        }
+
+    def _place(self, subscription: FeedSubscription, lat: Optional[float], lng: Optional[float]) -> None:
+        cell = self.index.cell_of(lat, lng) if lat is not None else None
+        if cell == subscription.cell:
+            return
+        if subscription.cell is not None:
+            users = self._cells[subscription.cell]
+            users.discard(subscription.user_id)
+            if not users:
+                del self._cells[subscription.cell]
+        if cell is not None:
+            self._cells.setdefault(cell, set()).add(subscription.user_id)
+        subscription.cell = cell
+
+    def _add_ride(self, subscription: FeedSubscription, ride_id: int, distance: float) -> None:
+        subscription.rides[ride_id] = distance
+        self._ride_holders.setdefault(ride_id, set()).add(subscription.user_id)
+
+    def _drop_ride(self, subscription: FeedSubscription, ride_id: int) -> None:
+        del subscription.rides[ride_id]
+        holders = self._ride_holders.get(ride_id)
+        if holders is not None:
+            holders.discard(subscription.user_id)
+            if not holders:
+                del self._ride_holders[ride_id]
+
+    def _set_rides(self, subscription: FeedSubscription, rides: Dict[int, float]) -> None:
+        for ride_id in [r for r in subscription.rides if r not in rides]:
+            self._drop_ride(subscription, ride_id)
+        for ride_id, distance in rides.items():
+            self._add_ride(subscription, ride_id, distance)
+
+    def _build_feed(self, subscription: FeedSubscription) -> List[dict]:
+        driver = driver_tracker.get_driver(subscription.driver_profile_id)
+        if not driver or driver.latitude is None:
+            return []
+        nearby = self.index.nearby(driver.latitude, driver.longitude, radius_km=subscription.radius_km)
+        return matching_engine.get_driver_feed(subscription.driver_profile_id, nearby, subscription.limit)
+
+    def _push(self, user_id: int, diff: dict) -> None:
+        message = {
+            "type": "feed_diff",
+            "added": diff.get("added", []),
+            "updated": diff.get("updated", []),
+            "removed": diff.get("removed", [])
+        }
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+
+        task = loop.create_task(manager.send_personal_message(user_id, message))
+        self._pending_sends.add(task)
+        task.add_done_callback(self._pending_sends.discard)
+
+
+feed_publisher = DriverFeedPublisher()
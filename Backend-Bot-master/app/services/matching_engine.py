@@ -1,6 +1,6 @@
 
 from datetime import datetime
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 import logging
 
@@ -10,6 +10,10 @@ from app.services.driver_tracker import (
     DriverStatus,
     RideClass
 )
+from app.services.eta_model import load_eta_estimator
+from app.services.scoring_weights import ScoringWeights
+from app.services.metrics import metrics
+from app.config import ETA_GRID_PATH, SCORING_WEIGHTS_PATH
 
 logger = logging.getLogger(__name__)
 
@@ -37,6 +41,7 @@ class DriverMatch:
     eta_minutes: float 
     rating: float
     score: float 
+    features: Optional[Dict[str, float]] = None
     
     def to_dict(self) -> dict:
         return {
@@ -55,11 +60,22 @@ class MatchingEngine:
     WEIGHT_DISTANCE = 0.5  
     WEIGHT_RATING = 0.3    
     WEIGHT_FRESHNESS = 0.2  
+    OFFER_LOCK_PENALTY = 0.5
     DEFAULT_LIMIT = 20
     
     def __init__(self):
         self.tracker = driver_tracker
+        self.eta_estimator = load_eta_estimator(ETA_GRID_PATH, self.AVG_CITY_SPEED_KMH)
+        self.weights = ScoringWeights(SCORING_WEIGHTS_PATH, {
+            "distance": self.WEIGHT_DISTANCE,
+            "rating": self.WEIGHT_RATING,
+            "freshness": self.WEIGHT_FRESHNESS
+        })
     
+    def set_eta_estimator(self, estimator) -> None:
+        self.eta_estimator = estimator
+    
+    @metrics.timed("find_drivers")
     def find_drivers(
         self,
         ride_request: RideRequest,
@@ -79,6 +95,7 @@ class MatchingEngine:
         
         matches = []
         now = datetime.utcnow()
+        self.weights.maybe_reload()
         
         for driver in available:
             distance = self.tracker._haversine_distance(
@@ -88,10 +105,21 @@ class MatchingEngine:
                 driver.longitude
             )
             
-
-            eta_minutes = (distance / self.AVG_CITY_SPEED_KMH) * 60
+            eta_minutes = self.eta_estimator.estimate_minutes(
+                driver.latitude,
+                driver.longitude,
+                ride_request.pickup_lat,
+                ride_request.pickup_lng,
+                distance_km=distance,
+                when=now
+            )
             
-            score = self._calculate_score(driver, distance, now)
+            # Ранжируем по времени подачи: ETA переводим в эквивалент км при средней скорости
+            features = self._score_features(driver, eta_minutes * self.AVG_CITY_SPEED_KMH / 60, now)
+            score = self._weighted_score(features)
+            # Водитель уже думает над другим оффером — опускаем его ниже
+            if self.tracker.is_offer_locked(driver.driver_profile_id, for_ride_id=ride_request.ride_id):
+                score *= self.OFFER_LOCK_PENALTY
             
             matches.append(DriverMatch(
                 driver_profile_id=driver.driver_profile_id,
@@ -99,7 +127,8 @@ class MatchingEngine:
                 distance_km=distance,
                 eta_minutes=eta_minutes,
                 rating=driver.rating,
-                score=score
+                score=score,
+                features=features
             ))
         
         matches.sort(key=lambda m: -m.score)
@@ -150,6 +179,7 @@ class MatchingEngine:
             return []
         
         relevant_rides = []
+        now = datetime.utcnow()
         
         for ride in rides:
             ride_class = ride.get('ride_class', ride.get('class', 'economy'))
@@ -166,10 +196,16 @@ class MatchingEngine:
                 driver.latitude, driver.longitude,
                 float(pickup_lat), float(pickup_lng)
             )
+            eta_minutes = self.eta_estimator.estimate_minutes(
+                driver.latitude, driver.longitude,
+                float(pickup_lat), float(pickup_lng),
+                distance_km=distance,
+                when=now
+            )
             ride_with_distance = {
                 **ride,
                 'distance_to_pickup_km': round(distance, 2),
-                'eta_minutes': round((distance / self.AVG_CITY_SPEED_KMH) * 60, 1)
+                'eta_minutes': round(eta_minutes, 1)
             }
             relevant_rides.append((distance, ride_with_distance))
         
@@ -183,6 +219,14 @@ class MatchingEngine:
         distance_km: float,
         now: datetime
     ) -> float:
+        return self._weighted_score(self._score_features(driver, distance_km, now))
+    
+    def _score_features(
+        self,
+        driver: DriverState,
+        distance_km: float,
+        now: datetime
+    ) -> Dict[str, float]:
         distance_score = 1 / (1 + distance_km)
         
         rating_score = driver.rating / 5.0
@@ -190,24 +234,27 @@ class MatchingEngine:
         age_seconds = (now - driver.updated_at).total_seconds()
         freshness_score = max(0, 1 - (age_seconds / 300)) 
         
-        score = (
-            self.WEIGHT_DISTANCE * distance_score +
-            self.WEIGHT_RATING * rating_score +
-            self.WEIGHT_FRESHNESS * freshness_score
+        return {
+            "distance": distance_score,
+            "rating": rating_score,
+            "freshness": freshness_score
+        }
+    
+    def _weighted_score(self, features: Dict[str, float]) -> float:
+        weights = self.weights.current
+        return (
+            weights["distance"] * features["distance"] +
+            weights["rating"] * features["rating"] +
+            weights["freshness"] * features["freshness"]
         )
-        
-        return score
     
     def get_stats(self) -> dict:
         return {
             "tracker_stats": self.tracker.get_stats(),
+            "eta_model": self.eta_estimator.describe(),
             "config": {
                 "avg_speed_kmh": self.AVG_CITY_SPEED_KMH,
-                "weights": {
-                    "distance": self.WEIGHT_DISTANCE,
-                    "rating": self.WEIGHT_RATING,
-                    "freshness": self.WEIGHT_FRESHNESS
-                }
+                "weights": self.weights.describe()
             }
         }
 
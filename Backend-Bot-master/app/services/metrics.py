@@ -0,0 +1,165 @@
+from typing import Callable, Dict, List, Optional, Tuple
+from bisect import bisect_left
+from functools import wraps
+import asyncio
+import inspect
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    # Кумулятивные бакеты считаются только при выгрузке, на горячем пути — bisect и два сложения
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        result = []
+        running = 0
+        for bound, count in zip(self.buckets, self.counts):
+            running += count
+            result.append((repr(bound), running))
+        result.append(("+Inf", running + self.counts[-1]))
+        return result
+
+
+class MetricsRegistry:
+    LOOP_LAG_INTERVAL_SECONDS = 0.5
+
+    def __init__(self):
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._gauges: Dict[str, Callable[[], float]] = {}
+        self._help: Dict[str, str] = {}
+        self.loop_lag_seconds = 0.0
+
+    def describe(self, name: str, help_text: str) -> None:
+        self._help[name] = help_text
+
+    def histogram(self, name: str, **labels: str) -> Histogram:
+        series = self._histograms.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram()
+        return histogram
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        self.histogram(name, **labels).observe(value)
+
+    def inc(self, name: str, amount: float = 1.0, **labels: str) -> None:
+        series = self._counters.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0.0) + amount
+
+    def register_gauge(self, name: str, getter: Callable[[], float], help_text: Optional[str] = None) -> None:
+        # Значение берётся в момент выгрузки /metrics — на горячем пути ничего не делаем
+        self._gauges[name] = getter
+        if help_text:
+            self.describe(name, help_text)
+
+    def timed(self, op: str, metric: str = "hot_path_duration_seconds"):
+        # Серия выбирается один раз при декорировании — в обёртке только perf_counter и observe
+        histogram = self.histogram(metric, op=op)
+
+        def decorator(func):
+            if inspect.iscoroutinefunction(func):
+                @wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    started = time.perf_counter()
+                    try:
+                        return await func(*args, **kwargs)
+                    finally:
+                        histogram.observe(time.perf_counter() - started)
+                return async_wrapper
+
+            @wraps(func)
+            def sync_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - started)
+            return sync_wrapper
+        return decorator
+
+    async def run_loop_lag_monitor(self, interval_seconds: float = LOOP_LAG_INTERVAL_SECONDS) -> None:
+        # Насколько позже запланированного просыпается sleep — прямая мера занятости event loop
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(interval_seconds)
+            lag = max(0.0, time.perf_counter() - started - interval_seconds)
+            self.loop_lag_seconds = lag
+            self.observe("event_loop_lag_seconds", lag)
+
+    def render(self) -> str:
+        lines: List[str] = []
+
+        for name in sorted(self._counters):
+            self._header(lines, name, "counter")
+            for key, value in self._counters[name].items():
+                lines.append(f"{name}{self._labels(key)} {value}")
+
+        for name in sorted(self._gauges):
+            self._header(lines, name, "gauge")
+            try:
+                value = float(self._gauges[name]())
+            except Exception as e:
+                logger.error(f"Gauge {name} failed: {e}")
+                continue
+            lines.append(f"{name} {value}")
+
+        for name in sorted(self._histograms):
+            self._header(lines, name, "histogram")
+            for key, histogram in list(self._histograms[name].items()):
+                for bound, count in histogram.cumulative():
+                    lines.append(f"{name}_bucket{self._labels(key + (('le', bound),))} {count}")
+                lines.append(f"{name}_sum{self._labels(key)} {histogram.total}")
+                lines.append(f"{name}_count{self._labels(key)} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        # Гистограммы обнуляем на месте: на них держат ссылки обёртки timed()
+        for series in self._histograms.values():
+            for histogram in series.values():
+                histogram.counts = [0] * len(histogram.counts)
+                histogram.total = 0.0
+                histogram.count = 0
+        self._counters.clear()
+
+    def _header(self, lines: List[str], name: str, kind: str) -> None:
+        if name in self._help:
+            lines.append(f"# HELP {name} {self._help[name]}")
+        lines.append(f"# TYPE {name} {kind}")
+
+    @staticmethod
+    def _labels(key: LabelKey) -> str:
+        if not key:
+            return ""
+        pairs = []
+        for k, v in key:
+            value = str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            pairs.append(f'{k}="{value}"')
+        return "{" + ",".join(pairs) + "}"
+
+
+metrics = MetricsRegistry()
+metrics.describe("hot_path_duration_seconds", "Duration of instrumented service calls")
+metrics.describe("http_request_duration_seconds", "HTTP request latency by route template")
+metrics.describe("event_loop_lag_seconds", "Event loop wake-up delay")
@@ -0,0 +1,176 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from pathlib import Path
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+
+from app.config import MODERATION_DICT_DIR, MODERATION_LANGUAGES
+from app.services.aho_corasick import AhoCorasick
+
+logger = logging.getLogger(__name__)
+
+
+# Встроенный словарь — используется, пока не загружены файлы из MODERATION_DICT_DIR
+BANNED_WORDS = {
+
+    "хуй", "хуя", "хуе", "хуи", "пизд", "блять", "блядь", "бля", "ебать",
+    "ебан", "ебал", "ебу", "еби", "сука", "сучк", "мудак", "мудил",
+    "пидор", "пидар", "гандон", "залупа", "шлюх", "дрочи",
+
+    "fuck", "shit", "bitch", "asshole", "dick", "pussy", "cunt",
+}
+
+LEET_REPLACEMENTS = {
+    '0': 'о', '1': 'и', '3': 'е', '4': 'а', '5': 's', '6': 'б', '@': 'а',
+    '$': 's', '!': 'и', '*': '', '.': '', '-': '', '_': '',
+}
+
+LEET_FILE = "leet.json"
+WORDS_SUFFIX = ".txt"
+
+
+class ModerationRules:
+    # Неизменяемый снимок: автомат и таблица нормализации меняются только вместе,
+    # одной заменой ссылки ModerationDictionary.rules
+
+    def __init__(
+        self,
+        matcher: AhoCorasick,
+        leet: Dict[str, str],
+        version: str,
+        languages: Dict[str, int],
+        source: str
+    ):
+        self.matcher = matcher
+        self.normalize_table = str.maketrans(leet)
+        self.version = version
+        self.languages = languages
+        self.source = source
+        self.loaded_at = time.time()
+
+    @classmethod
+    def build(cls, words_by_language: Dict[str, Iterable[str]], leet: Dict[str, str], source: str) -> "ModerationRules":
+        # Слова словаря нормализуются той же таблицей, что и сообщения
+        table = str.maketrans(leet)
+        words = set()
+        languages = {}
+        digest = hashlib.sha1(json.dumps(leet, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        for language in sorted(words_by_language):
+            normalized = {w.strip().lower().translate(table) for w in words_by_language[language]}
+            normalized.discard("")
+            languages[language] = len(normalized)
+            words |= normalized
+            digest.update(language.encode("utf-8"))
+            digest.update("\n".join(sorted(normalized)).encode("utf-8"))
+        return cls(AhoCorasick(words), leet, digest.hexdigest()[:12], languages, source)
+
+    def describe(self) -> dict:
+        return {
+            "version": self.version,
+            "source": self.source,
+            "languages": self.languages,
+            "words": len(self.matcher),
+            "automaton_states": self.matcher.state_count,
+            "automaton_bytes": self.matcher.nbytes,
+            "loaded_at": self.loaded_at
+        }
+
+
+def load_rules(path: Path, languages: Optional[List[str]] = None) -> ModerationRules:
+    # Формат каталога: <язык>.txt — по слову в строке, "#" — комментарий; leet.json — замены символов
+    words_by_language: Dict[str, List[str]] = {}
+    for file in sorted(path.glob(f"*{WORDS_SUFFIX}")):
+        language = file.name[:-len(WORDS_SUFFIX)]
+        if languages and language not in languages:
+            continue
+        with open(file, encoding="utf-8") as f:
+            words_by_language[language] = [line for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+    leet = LEET_REPLACEMENTS
+    leet_path = path / LEET_FILE
+    if leet_path.exists():
+        leet = {str(k): str(v) for k, v in json.loads(leet_path.read_text(encoding="utf-8")).items()}
+
+    if not words_by_language:
+        raise FileNotFoundError(f"No moderation dictionaries in {path}")
+    return ModerationRules.build(words_by_language, leet, str(path))
+
+
+class ModerationDictionary:
+    # Словари модерации с горячей перезагрузкой. Каталог проверяется по mtime/size файлов
+    # раз в RELOAD_CHECK_SECONDS; новый автомат собирается в пуле потоков и подменяется
+    # атомарно — event loop не блокируется, сообщения модерируются старым снимком до замены.
+
+    RELOAD_CHECK_SECONDS = 30.0
+
+    def __init__(self, path: Optional[str], languages: Optional[List[str]] = None):
+        self.path = Path(path) if path else None
+        self.languages = languages or None
+        self.rules = ModerationRules.build({"builtin": BANNED_WORDS}, LEET_REPLACEMENTS, "builtin")
+        self.reload_count = 0
+        self.last_error: Optional[str] = None
+        self._signature: Optional[Tuple] = None
+        self._reloading = False
+
+    def _scan(self) -> Optional[Tuple]:
+        if self.path is None or not self.path.is_dir():
+            return None
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.name.endswith(WORDS_SUFFIX) or entry.name == LEET_FILE:
+                stat = entry.stat()
+                entries.append((entry.name, stat.st_mtime_ns, stat.st_size))
+        return tuple(sorted(entries)) or None
+
+    async def reload(self, force: bool = False) -> bool:
+        if self._reloading:
+            return False
+        signature = self._scan()
+        if signature is None or (signature == self._signature and not force):
+            return False
+
+        self._reloading = True
+        try:
+            loop = asyncio.get_running_loop()
+            started = time.perf_counter()
+            rules = await loop.run_in_executor(None, load_rules, self.path, self.languages)
+        except Exception as e:
+            # Тот же набор файлов не перечитываем, пока его не исправят
+            self._signature = signature
+            self.last_error = str(e)
+            logger.error(f"Moderation dictionary reload failed: {e}")
+            return False
+        finally:
+            self._reloading = False
+
+        self._signature = signature
+        self.rules = rules
+        self.reload_count += 1
+        self.last_error = None
+        logger.info(
+            f"Moderation dictionary v{rules.version} loaded: {rules.languages}, "
+            f"{rules.matcher.state_count} states in {time.perf_counter() - started:.2f}s"
+        )
+        return True
+
+    async def run_reloader(self, interval_seconds: float = RELOAD_CHECK_SECONDS) -> None:
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.reload()
+            except Exception as e:
+                logger.error(f"Moderation dictionary reloader error: {e}")
+
+    def get_stats(self) -> dict:
+        return {
+            **self.rules.describe(),
+            "path": str(self.path) if self.path else None,
+            "reload_count": self.reload_count,
+            "last_error": self.last_error
+        }
+
+
+moderation_dictionary = ModerationDictionary(MODERATION_DICT_DIR, MODERATION_LANGUAGES)
@@ -0,0 +1,85 @@
+from typing import Dict, List, Optional, Set
+from datetime import datetime
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class OfferPayloadCache:
+    # Неизменяемая часть оффера сериализуется один раз при диспатче.
+    # Персональные поля водителя дописываются к готовой JSON-строке без повторного кодирования.
+    # Используется волнами диспатча и переподключением водителя. Лента водителя (feed_publisher)
+    # сюда не ходит: её элементы — плоские записи PendingRideIndex обо всех открытых заказах
+    # с расстоянием и ETA, а не оффер "new_ride", и кэш есть только у заказов в активном диспатче.
+
+    def __init__(self):
+        self._payloads: Dict[int, str] = {}
+        self._offered_users: Dict[int, Dict[int, dict]] = {}
+        self._user_offers: Dict[int, Set[int]] = {}
+        self._total_size = 0
+        self._hits = 0
+
+    @staticmethod
+    def encode(data: dict) -> str:
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+
+    def put(self, ride_id: int, ride_data: dict) -> str:
+        payload = self.encode(ride_data)
+        self.evict(ride_id)
+        self._payloads[ride_id] = payload
+        self._total_size += len(payload)
+        return payload
+
+    def get(self, ride_id: int) -> Optional[str]:
+        payload = self._payloads.get(ride_id)
+        if payload is not None:
+            self._hits += 1
+        return payload
+
+    def render(self, ride_id: int, personal: dict) -> Optional[str]:
+        payload = self.get(ride_id)
+        if payload is None:
+            return None
+        personal = {**personal, "timestamp": datetime.utcnow().isoformat()}
+        return payload[:-1] + "," + self.encode(personal)[1:]
+
+    def mark_offered(self, ride_id: int, user_id: int, personal: dict) -> None:
+        # Заказ уже вытеснен (принят, отменён, истёк) — иначе записи остались бы навсегда
+        if ride_id not in self._payloads:
+            return
+        self._offered_users.setdefault(ride_id, {})[user_id] = personal
+        self._user_offers.setdefault(user_id, set()).add(ride_id)
+
+    def offers_for_user(self, user_id: int) -> List[str]:
+        rendered = []
+        for ride_id in self._user_offers.get(user_id, ()):
+            personal = self._offered_users.get(ride_id, {}).get(user_id, {})
+            text = self.render(ride_id, personal)
+            if text is not None:
+                rendered.append(text)
+        return rendered
+
+    def evict(self, ride_id: int) -> bool:
+        payload = self._payloads.pop(ride_id, None)
+        if payload is not None:
+            self._total_size -= len(payload)
+        for user_id in self._offered_users.pop(ride_id, ()):
+            rides = self._user_offers.get(user_id)
+            if rides is None:
+                continue
+            rides.discard(ride_id)
+            if not rides:
+                del self._user_offers[user_id]
+        return payload is not None
+
+    def get_stats(self) -> dict:
+        return {
+            "payloads": len(self._payloads),
+            "total_size": self._total_size,
+            "drivers_with_offers": len(self._user_offers),
+            "hits": self._hits
+        }
+
+
+offer_cache = OfferPayloadCache()
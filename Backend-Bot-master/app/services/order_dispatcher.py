@@ -1,11 +1,16 @@
-from typing import Optional, List
+from typing import Optional, List, Tuple
+from dataclasses import asdict
 from datetime import datetime
 import asyncio
 import logging
 
 from app.services.driver_tracker import driver_tracker
 from app.services.matching_engine import matching_engine, RideRequest, DriverMatch
+from app.services.batch_matcher import batch_matcher, BatchResult
 from app.services.websocket_manager import manager
+from app.services.wave_scheduler import wave_scheduler
+from app.services.offer_cache import offer_cache
+from app.services.dispatch_journal import dispatch_journal
 
 logger = logging.getLogger(__name__)
 
@@ -17,9 +22,22 @@ class OrderDispatcher:
     MAX_DRIVERS_PER_WAVE = 10
     WAVE_INTERVAL_SECONDS = 15
     MAX_WAVES = 5
+    BATCH_WINDOW_SECONDS = 0.5
+    MAX_BATCH_SIZE = 500
+    RESUME_DELAY_SECONDS = 1.0
     
     def __init__(self):
         self._active_dispatches: dict[int, dict] = {}
+        self._batch_queue: List[Tuple[dict, asyncio.Future]] = []
+        self._batch_task: Optional[asyncio.Task] = None
+        self._batch_totals = {
+            "batches": 0,
+            "rides": 0,
+            "eta_saved_minutes": 0.0
+        }
+        self._last_batch: Optional[dict] = None
+        wave_scheduler.set_callback(self._on_wave_due)
+        dispatch_journal.set_snapshot_provider(self._journal_snapshot)
     
     async def dispatch_new_ride(
         self,
@@ -33,6 +51,8 @@ class OrderDispatcher:
         expected_fare: Optional[float] = None,
         pickup_address: Optional[str] = None,
         dropoff_address: Optional[str] = None,
+        preferred_driver: Optional[DriverMatch] = None,
+        candidates: Optional[List[DriverMatch]] = None,
     ) -> dict:
         request = RideRequest(
             ride_id=ride_id,
@@ -46,21 +66,23 @@ class OrderDispatcher:
             search_radius_km=self.DEFAULT_RADIUS_KM
         )
         
-        drivers = matching_engine.expand_search(
-            request,
-            max_radius_km=self.MAX_RADIUS_KM,
-            step_km=self.RADIUS_STEP_KM
-        )
+        if candidates is None:
+            drivers = matching_engine.expand_search(
+                request,
+                max_radius_km=self.MAX_RADIUS_KM,
+                step_km=self.RADIUS_STEP_KM
+            )
+        else:
+            drivers = candidates
         
         if not drivers:
             logger.warning(f"No available drivers for ride {ride_id}")
-            return {
-                "ride_id": ride_id,
-                "notified_count": 0,
-                "message": "No available drivers found"
-            }
         
-        first_wave = drivers[:self.MAX_DRIVERS_PER_WAVE]
+        # В пакетном режиме первая волна — только водитель из глобального назначения
+        if preferred_driver:
+            first_wave = [preferred_driver]
+        else:
+            first_wave = drivers[:self.MAX_DRIVERS_PER_WAVE]
         
         ride_data = {
             "type": "new_ride",
@@ -80,38 +102,36 @@ class OrderDispatcher:
             "created_at": datetime.utcnow().isoformat()
         }
         
-        notified = []
-        for driver in first_wave:
-            personal_data = {
-                **ride_data,
-                "your_distance_km": driver.distance_km,
-                "your_eta_minutes": driver.eta_minutes
-            }
-            
-            success = await manager.send_personal_message(
-                driver.user_id,
-                personal_data
-            )
-            
-            if success:
-                notified.append({
-                    "driver_profile_id": driver.driver_profile_id,
-                    "user_id": driver.user_id,
-                    "distance_km": driver.distance_km
-                })
-        
-        self._active_dispatches[ride_id] = {
-            "notified_drivers": {d["driver_profile_id"] for d in notified},
+        offer_cache.put(ride_id, ride_data)
+        dispatch = {
+            "request": request,
+            "ride_data": ride_data,
+            "notified_drivers": set(),
+            "notified_users": {},
+            "offers": {},
             "all_candidates": [d.driver_profile_id for d in drivers],
             "created_at": datetime.utcnow(),
             "waves": 1
         }
+        self._active_dispatches[ride_id] = dispatch
+        dispatch_journal.append({"op": "open", "ride_id": ride_id, **self._journal_state(dispatch)})
+        
+        notified = await self._send_offers(dispatch, first_wave, wave=1)
+        if self._active_dispatches.get(ride_id) is dispatch:
+            wave_scheduler.schedule(ride_id, self.WAVE_INTERVAL_SECONDS)
         
         logger.info(
             f"Dispatched ride {ride_id} to {len(notified)} drivers "
             f"(class={ride_class}, total_candidates={len(drivers)})"
         )
         
+        if not drivers:
+            return {
+                "ride_id": ride_id,
+                "notified_count": 0,
+                "message": "No available drivers found"
+            }
+        
         return {
             "ride_id": ride_id,
             "ride_class": ride_class,
@@ -120,6 +140,164 @@ class OrderDispatcher:
             "notified_drivers": notified
         }
     
+    async def _send_offers(self, dispatch: dict, drivers: List[DriverMatch], wave: int) -> List[dict]:
+        ride_id = dispatch["request"].ride_id
+        notified = []
+        for driver in drivers:
+            # Каждая отправка отдаёт управление: за это время заказ могут принять, отменить или снять по сроку
+            if self._active_dispatches.get(ride_id) is not dispatch:
+                logger.info(f"Dispatch for ride {ride_id} closed during wave {wave}, stopping")
+                break
+            
+            personal = {
+                "your_distance_km": driver.distance_km,
+                "your_eta_minutes": driver.eta_minutes,
+                "wave": wave
+            }
+            text = offer_cache.render(ride_id, personal)
+            if text is None:
+                break
+            
+            if not driver_tracker.lock_for_offer(driver.driver_profile_id, ride_id):
+                logger.info(f"Driver {driver.driver_profile_id} skipped for ride {ride_id}: holds another offer")
+                continue
+            
+            success = await manager.send_personal_text(driver.user_id, text)
+            
+            if self._active_dispatches.get(ride_id) is not dispatch:
+                # Закрытие уже сняло блокировки уведомлённых водителей — снимаем и эту
+                driver_tracker.release_offer_lock(driver.driver_profile_id, ride_id)
+                break
+            
+            if not success:
+                driver_tracker.release_offer_lock(driver.driver_profile_id, ride_id)
+            else:
+                offer_cache.mark_offered(ride_id, driver.user_id, personal)
+                dispatch["notified_drivers"].add(driver.driver_profile_id)
+                dispatch["notified_users"][driver.driver_profile_id] = driver.user_id
+                dispatch["offers"][driver.driver_profile_id] = {
+                    "features": driver.features,
+                    "wave": wave,
+                    "offered_at": datetime.utcnow()
+                }
+                notified.append({
+                    "driver_profile_id": driver.driver_profile_id,
+                    "user_id": driver.user_id,
+                    "distance_km": driver.distance_km
+                })
+        
+        if self._active_dispatches.get(ride_id) is not dispatch:
+            return notified
+        dispatch_journal.append({
+            "op": "wave",
+            "ride_id": ride_id,
+            "wave": wave,
+            "notified": [[n["driver_profile_id"], n["user_id"]] for n in notified],
+            "all_candidates": dispatch["all_candidates"]
+        })
+        return notified
+    
+    async def resend_pending_offers(self, user_id: int) -> int:
+        # Переподключившийся водитель снова получает активные офферы из кэша, без БД
+        offers = offer_cache.offers_for_user(user_id)
+        for text in offers:
+            await manager.send_personal_text(user_id, text)
+        return len(offers)
+    
+    async def enqueue_ride(self, **ride_params) -> dict:
+        """Пакетный режим: копит заказы BATCH_WINDOW_SECONDS и назначает их вместе."""
+        future = asyncio.get_running_loop().create_future()
+        self._batch_queue.append((ride_params, future))
+        
+        if len(self._batch_queue) >= self.MAX_BATCH_SIZE:
+            await self._flush_batch()
+        elif self._batch_task is None or self._batch_task.done():
+            self._batch_task = asyncio.create_task(self._flush_after_window())
+        
+        return await future
+    
+    async def _flush_after_window(self) -> None:
+        await asyncio.sleep(self.BATCH_WINDOW_SECONDS)
+        await self._flush_batch()
+    
+    async def _flush_batch(self) -> None:
+        batch, self._batch_queue = self._batch_queue, []
+        if not batch:
+            return
+        
+        try:
+            requests = [
+                RideRequest(
+                    ride_id=params["ride_id"],
+                    client_id=params["client_id"],
+                    ride_class=params["ride_class"],
+                    pickup_lat=params["pickup_lat"],
+                    pickup_lng=params["pickup_lng"],
+                    dropoff_lat=params.get("dropoff_lat"),
+                    dropoff_lng=params.get("dropoff_lng"),
+                    expected_fare=params.get("expected_fare"),
+                    search_radius_km=self.DEFAULT_RADIUS_KM
+                )
+                for params, _ in batch
+            ]
+            result = batch_matcher.match(
+                requests,
+                max_radius_km=self.MAX_RADIUS_KM,
+                step_km=self.RADIUS_STEP_KM
+            )
+            self._record_batch(result)
+        except Exception as e:
+            logger.error(f"Batch matching failed for {len(batch)} rides: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        assigned = {m.driver_profile_id for m in result.assignments.values() if m}
+        
+        for params, future in batch:
+            ride_id = params["ride_id"]
+            preferred = result.assignments.get(ride_id)
+            # Водители, назначенные на другие заказы пакета, уходят в конец списка
+            candidates = sorted(
+                result.candidates.get(ride_id, []),
+                key=lambda m: m.driver_profile_id in assigned and m is not preferred
+            )
+            try:
+                dispatch = await self.dispatch_new_ride(
+                    **params,
+                    preferred_driver=preferred,
+                    candidates=candidates
+                )
+                if not future.done():
+                    future.set_result(dispatch)
+            except Exception as e:
+                logger.error(f"Batch dispatch failed for ride {ride_id}: {e}")
+                if not future.done():
+                    future.set_exception(e)
+    
+    def _record_batch(self, result: BatchResult) -> None:
+        self._batch_totals["batches"] += 1
+        self._batch_totals["rides"] += len(result.assignments)
+        self._batch_totals["eta_saved_minutes"] += result.eta_saved_minutes
+        self._last_batch = result.to_dict()
+        
+        logger.info(
+            f"Batch matched {result.optimal_matched}/{len(result.assignments)} rides "
+            f"(greedy {result.greedy_matched}), ETA saved vs greedy: "
+            f"{result.eta_saved_minutes:.1f} min over {result.compared_rides} rides, solve {result.solve_ms:.1f}ms"
+        )
+    
+    def get_batch_stats(self) -> dict:
+        return {
+            "window_seconds": self.BATCH_WINDOW_SECONDS,
+            "queued": len(self._batch_queue),
+            "batches": self._batch_totals["batches"],
+            "rides": self._batch_totals["rides"],
+            "eta_saved_minutes": round(self._batch_totals["eta_saved_minutes"], 1),
+            "last_batch": self._last_batch
+        }
+    
     async def dispatch_next_wave(self, ride_id: int) -> dict:
         dispatch = self._active_dispatches.get(ride_id)
         if not dispatch:
@@ -131,38 +309,28 @@ class OrderDispatcher:
                 "message": "Max waves reached",
                 "waves": dispatch["waves"]
             }
+        
+        # Водители могли приехать или освободиться — ищем заново, а не по старому списку
+        drivers = matching_engine.expand_search(
+            dispatch["request"],
+            max_radius_km=self.MAX_RADIUS_KM,
+            step_km=self.RADIUS_STEP_KM
+        )
         already_notified = dispatch["notified_drivers"]
-        all_candidates = dispatch["all_candidates"]
+        known = set(dispatch["all_candidates"])
+        dispatch["all_candidates"].extend(
+            d.driver_profile_id for d in drivers if d.driver_profile_id not in known
+        )
         
         remaining = [
-            dpid for dpid in all_candidates 
-            if dpid not in already_notified
+            d for d in drivers
+            if d.driver_profile_id not in already_notified
         ]
-        
-        if not remaining:
-            return {
-                "ride_id": ride_id,
-                "message": "No more drivers to notify",
-                "waves": dispatch["waves"]
-            }
+        remaining.sort(key=lambda d: driver_tracker.is_offer_locked(d.driver_profile_id, for_ride_id=ride_id))
         next_batch = remaining[:self.MAX_DRIVERS_PER_WAVE]
         
-        # TODO: Получить ride_data из БД или кэша
-        # Пока упрощённое уведомление
-        notified = []
-        for dpid in next_batch:
-            driver = driver_tracker.get_driver(dpid)
-            if driver and manager.is_connected(driver.user_id):
-                await manager.send_personal_message(driver.user_id, {
-                    "type": "new_ride_reminder",
-                    "ride_id": ride_id,
-                    "message": "Заказ всё ещё доступен!",
-                    "wave": dispatch["waves"] + 1
-                })
-                notified.append(dpid)
-                dispatch["notified_drivers"].add(dpid)
-        
         dispatch["waves"] += 1
+        notified = await self._send_offers(dispatch, next_batch, wave=dispatch["waves"])
         
         return {
             "ride_id": ride_id,
@@ -170,13 +338,56 @@ class OrderDispatcher:
             "notified_count": len(notified)
         }
     
+    async def _on_wave_due(self, ride_id: int) -> None:
+        dispatch = self._active_dispatches.get(ride_id)
+        if not dispatch:
+            return
+        
+        if dispatch["waves"] >= self.MAX_WAVES:
+            logger.info(f"Dispatch for ride {ride_id} expired after {dispatch['waves']} waves")
+            await self.cancel_dispatch(ride_id)
+            return
+        
+        result = await self.dispatch_next_wave(ride_id)
+        logger.info(f"Wave {result.get('wave')} for ride {ride_id}: notified {result.get('notified_count', 0)}")
+        
+        if ride_id in self._active_dispatches:
+            wave_scheduler.schedule(ride_id, self.WAVE_INTERVAL_SECONDS)
+    
+    async def complete_dispatch(self, ride_id: int, driver_profile_id: Optional[int] = None) -> bool:
+        wave_scheduler.cancel(ride_id)
+        offer_cache.evict(ride_id)
+        dispatch = self._active_dispatches.pop(ride_id, None)
+        if not dispatch:
+            return False
+        dispatch_journal.append({"op": "close", "ride_id": ride_id})
+        
+        for dpid in dispatch["notified_drivers"]:
+            driver_tracker.release_offer_lock(dpid, ride_id)
+            if dpid == driver_profile_id:
+                continue
+            user_id = self._notified_user(dispatch, dpid)
+            if user_id:
+                await manager.send_personal_message(user_id, {
+                    "type": "ride_unavailable",
+                    "ride_id": ride_id,
+                    "message": "Заказ уже принят другим водителем"
+                })
+        
+        logger.info(f"Completed dispatch for ride {ride_id} (driver={driver_profile_id})")
+        return True
+    
     async def cancel_dispatch(self, ride_id: int) -> bool:
+        wave_scheduler.cancel(ride_id)
+        offer_cache.evict(ride_id)
         if ride_id in self._active_dispatches:
             dispatch = self._active_dispatches.pop(ride_id)
+            dispatch_journal.append({"op": "close", "ride_id": ride_id})
             for dpid in dispatch["notified_drivers"]:
-                driver = driver_tracker.get_driver(dpid)
-                if driver:
-                    await manager.send_personal_message(driver.user_id, {
+                driver_tracker.release_offer_lock(dpid, ride_id)
+                user_id = self._notified_user(dispatch, dpid)
+                if user_id:
+                    await manager.send_personal_message(user_id, {
                         "type": "ride_unavailable",
                         "ride_id": ride_id,
                         "message": "Заказ больше недоступен"
@@ -200,6 +411,29 @@ class OrderDispatcher:
             "age_seconds": (datetime.utcnow() - dispatch["created_at"]).total_seconds()
         }
     
+    def get_offer_meta(self, ride_id: int, driver_profile_id: int) -> Optional[dict]:
+        # Признаки всех офферов заказа — пишутся в историю статусов для обучения весов скоринга
+        dispatch = self._active_dispatches.get(ride_id)
+        if not dispatch or not dispatch.get("offers"):
+            return None
+        
+        offers = [
+            {"driver_profile_id": dpid, "wave": offer["wave"], "features": offer["features"]}
+            for dpid, offer in dispatch["offers"].items()
+            if offer["features"]
+        ]
+        accepted_offer = dispatch["offers"].get(driver_profile_id)
+        response_seconds = None
+        if accepted_offer:
+            response_seconds = round((datetime.utcnow() - accepted_offer["offered_at"]).total_seconds(), 1)
+        
+        return {
+            "offers": offers,
+            "accepted_driver_profile_id": driver_profile_id,
+            "response_seconds": response_seconds,
+            "waves": dispatch["waves"]
+        }
+    
     def get_active_dispatches(self) -> List[int]:
         return list(self._active_dispatches.keys())
     
@@ -213,10 +447,72 @@ class OrderDispatcher:
                 to_remove.append(ride_id)
         
         for ride_id in to_remove:
-            del self._active_dispatches[ride_id]
+            dispatch = self._active_dispatches.pop(ride_id)
+            for dpid in dispatch["notified_drivers"]:
+                driver_tracker.release_offer_lock(dpid, ride_id)
+            wave_scheduler.cancel(ride_id)
+            offer_cache.evict(ride_id)
+            dispatch_journal.append({"op": "close", "ride_id": ride_id})
             logger.info(f"Cleaned up stale dispatch for ride {ride_id}")
         
         return len(to_remove)
+    
+    def restore_from_journal(self) -> int:
+        # После рестарта поднимаем незавершённые диспатчи и продолжаем волны с места остановки
+        restored = dispatch_journal.replay()
+        
+        for ride_id, state in restored.items():
+            request_data = dict(state["request"])
+            if isinstance(request_data.get("scheduled_at"), str):
+                request_data["scheduled_at"] = datetime.fromisoformat(request_data["scheduled_at"])
+            
+            notified_users = {dpid: user_id for dpid, user_id in state["notified"]}
+            dispatch = {
+                "request": RideRequest(**request_data),
+                "ride_data": state["ride_data"],
+                "notified_drivers": set(notified_users),
+                "notified_users": notified_users,
+                "offers": {},
+                "all_candidates": state["all_candidates"],
+                "created_at": datetime.fromisoformat(state["created_at"]),
+                "waves": state["waves"]
+            }
+            self._active_dispatches[ride_id] = dispatch
+            
+            offer_cache.put(ride_id, state["ride_data"])
+            for user_id in notified_users.values():
+                offer_cache.mark_offered(ride_id, user_id, {"wave": state["waves"]})
+            wave_scheduler.schedule(ride_id, self.RESUME_DELAY_SECONDS)
+        
+        dispatch_journal.compact(self._journal_snapshot())
+        if restored:
+            logger.info(f"Restored {len(restored)} in-flight dispatches from journal")
+        return len(restored)
+    
+    def _journal_snapshot(self) -> dict:
+        return {
+            ride_id: self._journal_state(dispatch)
+            for ride_id, dispatch in self._active_dispatches.items()
+        }
+    
+    @staticmethod
+    def _journal_state(dispatch: dict) -> dict:
+        return {
+            "request": asdict(dispatch["request"]),
+            "ride_data": dispatch["ride_data"],
+            "created_at": dispatch["created_at"].isoformat(),
+            "waves": dispatch["waves"],
+            "notified": [[dpid, user_id] for dpid, user_id in dispatch["notified_users"].items()],
+            "all_candidates": list(dispatch["all_candidates"])
+        }
+    
+    @staticmethod
+    def _notified_user(dispatch: dict, driver_profile_id: int) -> Optional[int]:
+        user_id = dispatch.get("notified_users", {}).get(driver_profile_id)
+        if user_id:
+            return user_id
+        driver = driver_tracker.get_driver(driver_profile_id)
+        return driver.user_id if driver else None
 
 
 order_dispatcher = OrderDispatcher()
@@ -0,0 +1,228 @@
+from typing import Any, Awaitable, Callable, Dict, Optional
+from collections import OrderedDict
+from pathlib import Path
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import uuid
+
+from app.config import PDF_CACHE_DIR, PDF_CACHE_MEMORY_BYTES, PDF_CACHE_DISK_BYTES
+
+logger = logging.getLogger(__name__)
+
+
+class CachedPDF:
+    # Либо content (из памяти или только что отрендерен), либо path + stat (файл на диске)
+    __slots__ = ("key", "content", "path", "stat")
+
+    def __init__(
+        self,
+        key: str,
+        content: Optional[bytes] = None,
+        path: Optional[Path] = None,
+        stat: Optional[os.stat_result] = None
+    ):
+        self.key = key
+        self.content = content
+        self.path = path
+        self.stat = stat
+
+    @property
+    def etag(self) -> str:
+        return pdf_etag(self.key)
+
+
+def pdf_etag(key: str) -> str:
+    return f'"{key[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        # Сравнение для If-None-Match слабое: W/"x" совпадает с "x"
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class PDFCache:
+    # Кэш готовых PDF с адресацией по содержимому: ключ — sha256 от версии шаблона, вида документа
+    # и входных данных, поэтому инвалидация не нужна — новые данные или шаблон дают новый ключ.
+    # Два уровня: LRU в памяти (по суммарному размеру) и файлы на диске, общие для всех воркеров.
+    # С диска файл отдаётся потоком (FileResponse), целиком в память не читается.
+    # Одновременные запросы одного документа ждут один рендер.
+
+    MAX_MEMORY_ITEM_BYTES = 1024 * 1024
+    PRUNE_TO_RATIO = 0.9
+
+    def __init__(
+        self,
+        path: Optional[str] = PDF_CACHE_DIR,
+        memory_bytes: int = PDF_CACHE_MEMORY_BYTES,
+        disk_bytes: int = PDF_CACHE_DISK_BYTES
+    ):
+        self.path = Path(path) if path else None
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_used = 0
+        self._disk_used: Optional[int] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.renders = 0
+        self.disk_errors = 0
+
+    @staticmethod
+    def make_key(kind: str, template_version: str, data: Dict[str, Any]) -> str:
+        payload = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+        digest = hashlib.sha256()
+        for part in (template_version, kind, payload):
+            digest.update(part.encode("utf-8"))
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    def _file_path(self, key: str) -> Path:
+        return self.path / key[:2] / f"{key}.pdf"
+
+    def lookup(self, key: str) -> Optional[CachedPDF]:
+        content = self._memory.get(key)
+        if content is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return CachedPDF(key, content=content)
+
+        if self.path is not None:
+            file_path = self._file_path(key)
+            try:
+                stat = os.stat(file_path)
+                # mtime — время последнего обращения, по нему чистится диск
+                os.utime(file_path)
+            except OSError:
+                pass
+            else:
+                self.disk_hits += 1
+                return CachedPDF(key, path=file_path, stat=stat)
+        return None
+
+    async def get_or_render(self, key: str, render: Callable[[], Awaitable[bytes]]) -> CachedPDF:
+        cached = self.lookup(key)
+        if cached is not None:
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            return CachedPDF(key, content=await asyncio.shield(inflight))
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            content = await render()
+        except BaseException as e:
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                # Ошибку уже получил сам запрос; ожидающих может и не быть
+                future.exception()
+            else:
+                future.cancel()
+            raise
+        finally:
+            del self._inflight[key]
+
+        self.renders += 1
+        future.set_result(content)
+        self._remember(key, content)
+        await self._store(key, content)
+        return CachedPDF(key, content=content)
+
+    def _remember(self, key: str, content: bytes) -> None:
+        if len(content) > self.MAX_MEMORY_ITEM_BYTES or key in self._memory:
+            return
+        self._memory[key] = content
+        self._memory_used += len(content)
+        while self._memory_used > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_used -= len(evicted)
+
+    async def _store(self, key: str, content: bytes) -> None:
+        if self.path is None:
+            return
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._write_file, key, content)
+        except OSError as e:
+            # Без диска кэш продолжает работать на уровне памяти
+            self.disk_errors += 1
+            logger.error(f"Failed to store PDF {key[:12]} in cache: {e}")
+
+    def _write_file(self, key: str, content: bytes) -> None:
+        file_path = self._file_path(key)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        # Запись во временный файл и os.replace: читатель никогда не увидит недописанный PDF
+        tmp_path = file_path.with_name(f".{key}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, file_path)
+
+        if self._disk_used is None:
+            self._disk_used = sum(size for _, _, size in self._scan())
+        else:
+            self._disk_used += len(content)
+        if self._disk_used > self.disk_bytes:
+            self._prune()
+
+    def _scan(self):
+        for bucket in os.scandir(self.path):
+            if not bucket.is_dir():
+                continue
+            for entry in os.scandir(bucket.path):
+                if entry.name.endswith(".pdf"):
+                    stat = entry.stat()
+                    yield stat.st_mtime, entry.path, stat.st_size
+
+    def _prune(self) -> None:
+        # Каталог общий для воркеров, поэтому размер пересчитывается сканированием, а не по счётчику
+        files = sorted(self._scan())
+        used = sum(size for _, _, size in files)
+        target = self.disk_bytes * self.PRUNE_TO_RATIO
+        removed = 0
+        for _, file_path, size in files:
+            if used <= target:
+                break
+            try:
+                os.remove(file_path)
+            except OSError:
+                continue
+            used -= size
+            removed += 1
+        self._disk_used = used
+        logger.info(f"PDF cache pruned {removed} files, {used} bytes on disk")
+
+    def clear_memory(self) -> None:
+        self._memory.clear()
+        self._memory_used = 0
+
+    def get_stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_items": len(self._memory),
+            "memory_bytes": self._memory_used,
+            "memory_limit_bytes": self.memory_bytes,
+            "disk_bytes": self._disk_used,
+            "disk_limit_bytes": self.disk_bytes,
+            "path": str(self.path) if self.path else None,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            "renders": self.renders,
+            "disk_errors": self.disk_errors
+        }
+
+
+pdf_cache = PDFCache()
@@ -0,0 +1,161 @@
+from typing import Any, Callable, Optional
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import asyncio
+import logging
+import multiprocessing
+import time
+
+from app.config import (
+    PDF_RENDER_WORKERS,
+    PDF_RENDER_QUEUE_LIMIT,
+    PDF_RENDER_TIMEOUT_SECONDS,
+    PDF_RENDER_MAX_TASKS_PER_CHILD,
+)
+from app.services.metrics import metrics
+from app.services.pdf_templates import init_render_worker
+
+logger = logging.getLogger(__name__)
+
+
+class PDFRenderBusyError(Exception):
+    pass
+
+
+class PDFRenderTimeoutError(Exception):
+    pass
+
+
+class PDFRenderPool:
+    # Рендеринг PDF в отдельных процессах: WeasyPrint держит CPU сотни миллисекунд и в event loop
+    # останавливал бы все WebSocket воркера. В пул одновременно отдаётся не больше workers задач,
+    # остальные ждут в asyncio-очереди длиной queue_limit, сверх неё — PDFRenderBusyError (503).
+    # Так таймаут считается от начала рендеринга, а не от постановки в очередь.
+    #
+    # Процесс перезапускается после max_tasks_per_child задач (утечки памяти в cairo/pango).
+    # Зависший рендер не прервать, поэтому по таймауту пул убивается и создаётся заново;
+    # чужие задачи, упавшие вместе с ним, повторяются один раз.
+
+    def __init__(
+        self,
+        workers: int = PDF_RENDER_WORKERS,
+        queue_limit: int = PDF_RENDER_QUEUE_LIMIT,
+        timeout_seconds: float = PDF_RENDER_TIMEOUT_SECONDS,
+        max_tasks_per_child: Optional[int] = PDF_RENDER_MAX_TASKS_PER_CHILD,
+        initializer: Optional[Callable[[], None]] = None,
+    ):
+        self.workers = max(1, workers)
+        self.queue_limit = queue_limit
+        self.timeout_seconds = timeout_seconds
+        self.max_tasks_per_child = max_tasks_per_child or None
+        # Выполняется при старте каждого процесса, в том числе после перезапуска
+        self.initializer = initializer
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._waiting = 0
+        self._running = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.restarts = 0
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        # func и аргументы должны пиклиться: функция уровня модуля, данные — строки/числа
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Семафор привязан к loop — после рестарта lifespan (или в тестах) создаём заново
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.workers)
+            self._waiting = 0
+            self._running = 0
+        if self._slots.locked() and self._waiting >= self.queue_limit:
+            self.rejected += 1
+            raise PDFRenderBusyError(f"PDF render queue is full ({self.queue_limit} waiting)")
+
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        self._running += 1
+        try:
+            return await self._run_with_retry(loop, func, args)
+        finally:
+            self._running -= 1
+            self._slots.release()
+
+    async def _run_with_retry(self, loop: asyncio.AbstractEventLoop, func: Callable[..., Any], args: tuple) -> Any:
+        for attempt in range(2):
+            executor = self._get_executor()
+            started = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(loop.run_in_executor(executor, func, *args), self.timeout_seconds)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                self.failed += 1
+                logger.error(f"PDF render timed out after {self.timeout_seconds}s, restarting pool")
+                self._restart(executor)
+                raise PDFRenderTimeoutError(f"PDF render timed out after {self.timeout_seconds}s")
+            except BrokenProcessPool:
+                # Процесс убит (OOM или таймаут соседней задачи) — пробуем ещё раз на новом пуле
+                self._restart(executor)
+                if attempt:
+                    self.failed += 1
+                    raise
+                logger.warning("PDF render pool broken, retrying on a fresh pool")
+                continue
+            except Exception:
+                self.failed += 1
+                raise
+            self.completed += 1
+            metrics.observe("pdf_render_seconds", time.perf_counter() - started)
+            return result
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # max_tasks_per_child несовместим с fork, spawn к тому же одинаково работает на Linux и Windows
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=self.max_tasks_per_child,
+                initializer=self.initializer,
+            )
+        return self._executor
+
+    def _restart(self, executor: ProcessPoolExecutor) -> None:
+        if self._executor is not executor:
+            # Пул уже пересоздала другая задача
+            return
+        self._executor = None
+        self.restarts += 1
+        # Публичного способа прервать работающую задачу нет (terminate_workers появился только в 3.14)
+        for process in list((getattr(executor, "_processes", None) or {}).values()):
+            if process.is_alive():
+                process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self) -> None:
+        executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def get_stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "running": self._running,
+            "waiting": self._waiting,
+            "queue_limit": self.queue_limit,
+            "timeout_seconds": self.timeout_seconds,
+            "max_tasks_per_child": self.max_tasks_per_child,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "restarts": self.restarts
+        }
+
+
+pdf_render_pool = PDFRenderPool(initializer=init_render_worker)
+metrics.describe("pdf_render_seconds", "PDF rendering time in the process pool")
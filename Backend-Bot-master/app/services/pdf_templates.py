@@ -0,0 +1,132 @@
+from typing import Any, Dict, Optional, Tuple
+from datetime import datetime
+from io import BytesIO
+from pathlib import Path
+import hashlib
+import logging
+import time
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, select_autoescape
+
+from app.config import ROOT_DIR
+
+logger = logging.getLogger(__name__)
+
+try:
+    from weasyprint import HTML, CSS
+    from weasyprint.fonts import FontConfiguration
+    WEASYPRINT_AVAILABLE = True
+except ImportError:
+    WEASYPRINT_AVAILABLE = False
+    logger.warning("WeasyPrint not installed. PDF generation will use fallback method.")
+
+try:
+    from reportlab.pdfgen import canvas
+    from reportlab.lib.pagesizes import A4
+    REPORTLAB_AVAILABLE = True
+except ImportError:
+    REPORTLAB_AVAILABLE = False
+    logger.warning("ReportLab not installed. PDF generation may be limited.")
+
+
+TEMPLATES_DIR = ROOT_DIR / "app" / "templates" / "pdf"
+STYLESHEET = "styles.css"
+
+
+def _money(value: float) -> str:
+    return f"{value:.2f} ₽"
+
+
+def _datetime(value: datetime) -> str:
+    return value.strftime('%d.%m.%Y %H:%M')
+
+
+def _date(value: datetime) -> str:
+    return value.strftime('%d.%m.%Y')
+
+
+def template_version(path: Path = TEMPLATES_DIR) -> str:
+    # Хэш всех шаблонов и стилей: правка любого файла меняет ключи pdf_cache
+    digest = hashlib.sha1()
+    for file in sorted(path.iterdir()):
+        if file.is_file():
+            digest.update(file.name.encode("utf-8"))
+            digest.update(file.read_bytes())
+    renderer = "weasyprint" if WEASYPRINT_AVAILABLE else "reportlab"
+    return f"{digest.hexdigest()[:12]}-{renderer}"
+
+
+class DocumentRenderer:
+    # Живёт в процессе пула рендеринга и создаётся один раз на процесс (инициализатор пула):
+    # шаблоны компилируются, CSS разбирается и шрифты настраиваются заранее, а не на каждый документ
+
+    def __init__(self, path: Path = TEMPLATES_DIR):
+        self.env = Environment(
+            loader=FileSystemLoader(str(path)),
+            autoescape=select_autoescape(["html"]),
+            undefined=StrictUndefined,
+            trim_blocks=True,
+            lstrip_blocks=True,
+            auto_reload=False,
+        )
+        self.env.filters["money"] = _money
+        self.env.filters["datetime"] = _datetime
+        self.env.filters["date"] = _date
+        self.templates = {name: self.env.get_template(name) for name in self.env.list_templates(extensions=["html"])}
+
+        self.font_config = None
+        self.stylesheet = None
+        if WEASYPRINT_AVAILABLE:
+            self.font_config = FontConfiguration()
+            self.stylesheet = CSS(string=(path / STYLESHEET).read_text(encoding="utf-8"), font_config=self.font_config)
+
+    def render_html(self, template_name: str, context: Dict[str, Any]) -> str:
+        return self.templates[template_name].render(**context)
+
+    def render(self, template_name: str, context: Dict[str, Any]) -> Tuple[bytes, Dict[str, float]]:
+        started = time.perf_counter()
+        html = self.render_html(template_name, context)
+        templated = time.perf_counter()
+        timings = {"template": templated - started}
+
+        if WEASYPRINT_AVAILABLE:
+            document = HTML(string=html).render(stylesheets=[self.stylesheet], font_config=self.font_config)
+            laid_out = time.perf_counter()
+            pdf = document.write_pdf()
+            timings["layout"] = laid_out - templated
+            timings["write"] = time.perf_counter() - laid_out
+        else:
+            pdf = _generate_fallback()
+            timings["write"] = time.perf_counter() - templated
+        return pdf, timings
+
+
+_renderer: Optional[DocumentRenderer] = None
+
+
+def init_render_worker() -> None:
+    global _renderer
+    if _renderer is None:
+        _renderer = DocumentRenderer()
+
+
+def render_document(template_name: str, context: Dict[str, Any]) -> Tuple[bytes, Dict[str, float]]:
+    # Точка входа для pdf_render_pool: аргументы — имя шаблона и пиклящийся контекст
+    init_render_worker()
+    return _renderer.render(template_name, context)
+
+
+def _generate_fallback() -> bytes:
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
+    width, height = A4
+    c.setFont("Helvetica-Bold", 16)
+    c.drawString(50, height - 50, "U-BRO TAXI")
+    c.setFont("Helvetica", 12)
+    c.drawString(50, height - 80, "PDF документ")
+    c.drawString(50, height - 110, f"Сгенерирован: {datetime.utcnow().strftime('%d.%m.%Y %H:%M')}")
+    c.drawString(50, height - 150, "Для полноценной генерации установите WeasyPrint")
+
+    c.save()
+    buffer.seek(0)
+    return buffer.read()
@@ -0,0 +1,138 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from array import array
+from dataclasses import dataclass
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    messages: int
+    period_seconds: float
+
+    @property
+    def refill_per_second(self) -> float:
+        return self.messages / self.period_seconds
+
+
+class TokenBucketTable:
+    # Token bucket на ключ: два числа (токены, время обновления) в общем array('d'),
+    # в словаре — только номер слота. Проверка O(1), свободные слоты переиспользуются.
+
+    def __init__(self, rule: RateLimitRule):
+        self.rule = rule
+        self._slots: Dict[int, int] = {}
+        self._state = array("d")
+        self._free: List[int] = []
+
+    def consume(self, key: int, now: float, cost: float = 1.0) -> Tuple[bool, float]:
+        capacity = float(self.rule.messages)
+        rate = self.rule.refill_per_second
+        slot = self._slots.get(key)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+            else:
+                slot = len(self._state) // 2
+                self._state.extend((capacity, now))
+            self._slots[key] = slot
+            tokens = capacity
+        else:
+            tokens = min(capacity, self._state[2 * slot] + (now - self._state[2 * slot + 1]) * rate)
+
+        if tokens >= cost:
+            self._state[2 * slot] = tokens - cost
+            self._state[2 * slot + 1] = now
+            return True, 0.0
+
+        self._state[2 * slot] = tokens
+        self._state[2 * slot + 1] = now
+        return False, (cost - tokens) / rate
+
+    def evict_idle(self, now: float) -> int:
+        # Ведро, которое успело наполниться, ничем не отличается от нового — удаляем без потери точности
+        full_after = self.rule.period_seconds
+        idle = [key for key, slot in self._slots.items() if now - self._state[2 * slot + 1] >= full_after]
+        for key in idle:
+            self._free.append(self._slots.pop(key))
+        return len(idle)
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+
+class RateLimiter:
+    # Лимиты по скоупам "<endpoint>:<тип сообщения>". Правило ищется от частного к общему:
+    # "ws:image" -> "image" -> "ws" -> "default"; у каждого правила своя таблица вёдер.
+    # Тип сообщения приходит от клиента: неизвестные типы (не из message_types) получают правило
+    # эндпоинта или default и не кэшируются, чтобы произвольные значения не раздували _resolved.
+
+    EVICT_INTERVAL_SECONDS = 60.0
+
+    def __init__(self, rules: Dict[str, RateLimitRule], message_types: Optional[Iterable[str]] = None):
+        if "default" not in rules:
+            raise ValueError("Rate limit rules must include 'default'")
+        self.rules = dict(rules)
+        # None — допустима любая строка
+        self.message_types = frozenset(message_types) if message_types is not None else None
+        self._tables: Dict[str, TokenBucketTable] = {name: TokenBucketTable(rule) for name, rule in self.rules.items()}
+        self._resolved: Dict[Tuple[Optional[str], Optional[str]], str] = {}
+        self._next_evict = 0.0
+        self.evicted_total = 0
+
+    def is_known_type(self, message_type) -> bool:
+        if message_type is None:
+            return True
+        if not isinstance(message_type, str):
+            return False
+        return self.message_types is None or message_type in self.message_types
+
+    def resolve(self, endpoint: Optional[str] = None, message_type: Optional[str] = None) -> str:
+        if not self.is_known_type(message_type):
+            return endpoint if endpoint in self.rules else "default"
+        cache_key = (endpoint, message_type)
+        name = self._resolved.get(cache_key)
+        if name is None:
+            candidates = [f"{endpoint}:{message_type}", message_type, endpoint, "default"]
+            name = next(c for c in candidates if c in self.rules)
+            self._resolved[cache_key] = name
+        return name
+
+    def check(
+        self,
+        user_id: int,
+        endpoint: Optional[str] = None,
+        message_type: Optional[str] = None,
+        now: Optional[float] = None
+    ) -> Tuple[bool, float, RateLimitRule]:
+        now = time.monotonic() if now is None else now
+        if now >= self._next_evict:
+            self._next_evict = now + self.EVICT_INTERVAL_SECONDS
+            self.evict_idle(now)
+
+        name = self.resolve(endpoint, message_type)
+        allowed, retry_after = self._tables[name].consume(user_id, now)
+        return allowed, retry_after, self.rules[name]
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        now = time.monotonic() if now is None else now
+        evicted = sum(table.evict_idle(now) for table in self._tables.values())
+        if evicted:
+            self.evicted_total += evicted
+            logger.debug(f"Rate limiter evicted {evicted} idle buckets")
+        return evicted
+
+    def tracked_count(self) -> int:
+        return sum(len(table) for table in self._tables.values())
+
+    def get_stats(self) -> dict:
+        return {
+            "tracked": {name: len(table) for name, table in self._tables.items()},
+            "evicted_total": self.evicted_total,
+            "rules": {
+                name: {"messages": rule.messages, "period_seconds": rule.period_seconds}
+                for name, rule in self.rules.items()
+            }
+        }
@@ -0,0 +1,150 @@
+from typing import Any, AsyncIterator, Dict, List
+from contextlib import aclosing
+from datetime import datetime
+import logging
+
+from sqlalchemy import Numeric, and_, cast, func, select
+
+from app.models.commission import Commission
+from app.models.driver_profile import DriverProfile
+from app.models.ride import Ride
+from app.models.transaction import Transaction
+from app.models.user import User
+
+logger = logging.getLogger(__name__)
+
+
+COMPLETED_RIDE_STATUS = "completed"
+
+
+class ReportAggregator:
+    # Данные для отчётов одним SQL-запросом на документ. Строки читаются потоком (серверный курсор,
+    # yield_per) в виде кортежей колонок — без ORM-объектов и identity map; итоги считают оконные
+    # функции в том же запросе, поэтому они есть уже в первой строке.
+    #
+    # Поездки присоединяются к профилю через LEFT JOIN с условиями периода в ON:
+    # у водителя без поездок за период всё равно приходит одна строка с именем и нулевыми итогами.
+
+    YIELD_PER = 500
+
+    def __init__(self, session_maker=None):
+        self._session_maker = session_maker
+
+    def _get_session_maker(self):
+        if self._session_maker is None:
+            from app.db import async_session_maker
+            return async_session_maker
+        return self._session_maker
+
+    @staticmethod
+    def driver_report_query(driver_id: int, period_start: datetime, period_end: datetime):
+        # Сумма поездки: фактическая, иначе сумма оплаты, иначе расчётная
+        fare = func.coalesce(Ride.actual_fare, cast(Transaction.amount, Numeric(15, 2)), Ride.expected_fare, 0)
+        commission = func.coalesce(Commission.fixed_amount, 0) + fare * func.coalesce(Commission.percentage, 0) / 100
+        return (
+            select(
+                DriverProfile.display_name,
+                DriverProfile.first_name,
+                DriverProfile.last_name,
+                Ride.id.label("ride_id"),
+                Ride.completed_at,
+                Ride.pickup_address,
+                Ride.dropoff_address,
+                fare.label("fare"),
+                func.coalesce(func.sum(fare).over(), 0).label("total_earnings"),
+                func.coalesce(func.sum(commission).over(), 0).label("total_commission"),
+            )
+            .select_from(DriverProfile)
+            .outerjoin(Ride, and_(
+                Ride.driver_profile_id == DriverProfile.id,
+                Ride.status == COMPLETED_RIDE_STATUS,
+                Ride.completed_at >= period_start,
+                Ride.completed_at < period_end,
+            ))
+            .outerjoin(Transaction, Transaction.id == Ride.transaction_id)
+            .outerjoin(Commission, Commission.id == Ride.commission_id)
+            .where(DriverProfile.id == driver_id)
+            .order_by(Ride.completed_at, Ride.id)
+        )
+
+    @staticmethod
+    def balance_statement_query(user_id: int, period_start: datetime, period_end: datetime):
+        return (
+            select(
+                User.id.label("user_id"),
+                User.first_name,
+                User.username,
+                User.balance,
+                Transaction.id.label("transaction_id"),
+                Transaction.created_at,
+                Transaction.is_withdraw,
+                Transaction.amount,
+            )
+            .select_from(User)
+            .outerjoin(Transaction, and_(
+                Transaction.user_id == User.id,
+                Transaction.created_at >= period_start,
+                Transaction.created_at < period_end,
+            ))
+            .where(User.id == user_id)
+            .order_by(Transaction.created_at, Transaction.id)
+        )
+
+    async def _stream(self, statement) -> AsyncIterator[Any]:
+        async with self._get_session_maker()() as session:
+            result = await session.stream(statement.execution_options(yield_per=self.YIELD_PER))
+            async for row in result:
+                yield row
+
+    async def driver_report(self, driver_id: int, period_start: datetime, period_end: datetime) -> Dict[str, Any]:
+        # Возвращает аргументы PDFGenerator.generate_driver_report
+        report = None
+        rides: List[Dict[str, Any]] = []
+        async with aclosing(self._stream(self.driver_report_query(driver_id, period_start, period_end))) as rows:
+            async for row in rows:
+                if report is None:
+                    name = row.display_name or " ".join(p for p in (row.first_name, row.last_name) if p)
+                    report = {
+                        "driver_name": name or f"Водитель #{driver_id}",
+                        "period_start": period_start,
+                        "period_end": period_end,
+                        "rides": rides,
+                        "total_earnings": float(row.total_earnings),
+                        "total_commission": float(row.total_commission),
+                    }
+                if row.ride_id is not None:
+                    rides.append({
+                        "id": row.ride_id,
+                        "date": row.completed_at.strftime('%d.%m.%Y'),
+                        "route": f"{row.pickup_address or '-'} → {row.dropoff_address or '-'}",
+                        "fare": float(row.fare),
+                    })
+        if report is None:
+            raise LookupError(f"Driver {driver_id} not found")
+        return report
+
+    async def balance_statement(self, user_id: int, period_start: datetime, period_end: datetime) -> Dict[str, Any]:
+        # Возвращает аргументы PDFGenerator.generate_balance_statement
+        statement = None
+        transactions: List[Dict[str, Any]] = []
+        async with aclosing(self._stream(self.balance_statement_query(user_id, period_start, period_end))) as rows:
+            async for row in rows:
+                if statement is None:
+                    statement = {
+                        "user_name": row.first_name or row.username or f"#{row.user_id}",
+                        "current_balance": float(row.balance),
+                        "transactions": transactions,
+                    }
+                if row.transaction_id is not None:
+                    transactions.append({
+                        "id": row.transaction_id,
+                        "date": row.created_at.strftime('%d.%m.%Y'),
+                        "is_withdraw": row.is_withdraw,
+                        "amount": float(row.amount),
+                    })
+        if statement is None:
+            raise LookupError(f"User {user_id} not found")
+        return statement
+
+
+report_aggregator = ReportAggregator()
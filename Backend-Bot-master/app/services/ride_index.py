@@ -0,0 +1,213 @@
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set, Tuple, Iterable
+import asyncio
+import math
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.services.driver_tracker import DriverTracker
+
+logger = logging.getLogger(__name__)
+
+
+OPEN_STATUSES = {"requested", "driver_assigned"}
+# Ключ session.info: события индекса, отложенные до commit транзакции
+PENDING_EVENTS_KEY = "ride_index_events"
+
+
+class PendingRideIndex:
+    # Заказы разложены по сетке ячеек, поиск в радиусе смотрит только соседние ячейки.
+    # Обновляется из RideCrud, периодическая сверка с БД исправляет расхождения (rollback и т.п.)
+
+    CELL_SIZE_DEG = 0.05
+    KM_PER_DEG_LAT = 111.32
+    FEED_RADIUS_KM = 15.0
+    RECONCILE_INTERVAL_SECONDS = 30
+
+    def __init__(self):
+        self._rides: Dict[int, dict] = {}
+        self._ride_cells: Dict[int, Tuple[int, int]] = {}
+        self._cells: Dict[Tuple[int, int], Set[int]] = {}
+        self._last_reconciled_at: Optional[datetime] = None
+        self._last_drift = 0
+        self._listeners: List[Callable[[str, dict], None]] = []
+
+    def add_listener(self, listener: Callable[[str, dict], None]) -> None:
+        # listener(event, ride), event: "add" | "update" | "remove".
+        # С session слушатели вызываются после её commit (при откате — никогда), без session — сразу.
+        self._listeners.append(listener)
+
+    def upsert(self, ride, session=None) -> None:
+        if ride.status not in OPEN_STATUSES or ride.pickup_lat is None or ride.pickup_lng is None:
+            self.remove(ride.id, session)
+            return
+
+        data = self._ride_to_dict(ride)
+        known = self._rides.get(ride.id)
+        if known == data:
+            return
+        cell = self.cell_of(data["pickup_lat"], data["pickup_lng"])
+
+        old_cell = self._ride_cells.get(ride.id)
+        if old_cell is not None and old_cell != cell:
+            self._discard_from_cell(ride.id, old_cell)
+
+        self._rides[ride.id] = data
+        self._ride_cells[ride.id] = cell
+        self._cells.setdefault(cell, set()).add(ride.id)
+        self._notify("add" if known is None else "update", data, session)
+
+    def remove(self, ride_id: int, session=None) -> Optional[dict]:
+        data = self._rides.pop(ride_id, None)
+        cell = self._ride_cells.pop(ride_id, None)
+        if cell is not None:
+            self._discard_from_cell(ride_id, cell)
+        if data is not None:
+            self._notify("remove", data, session)
+        return data
+
+    def get(self, ride_id: int) -> Optional[dict]:
+        return self._rides.get(ride_id)
+
+    def nearby(
+        self,
+        lat: float,
+        lng: float,
+        radius_km: float = FEED_RADIUS_KM,
+        limit: Optional[int] = None
+    ) -> List[dict]:
+        found = []
+        for cell in self.cells_in_radius(lat, lng, radius_km):
+            ride_ids = self._cells.get(cell)
+            if not ride_ids:
+                continue
+            for ride_id in ride_ids:
+                ride = self._rides[ride_id]
+                distance = DriverTracker._haversine_distance(
+                    lat, lng, ride["pickup_lat"], ride["pickup_lng"]
+                )
+                if distance <= radius_km:
+                    found.append((distance, ride))
+
+        found.sort(key=lambda x: x[0])
+        if limit is not None:
+            found = found[:limit]
+        return [r[1] for r in found]
+
+    def reconcile(self, rides: Iterable) -> int:
+        """Заменяет содержимое индекса актуальным состоянием из БД, возвращает число исправлений."""
+        fresh = {}
+        for ride in rides:
+            if ride.pickup_lat is None or ride.pickup_lng is None:
+                continue
+            fresh[ride.id] = ride
+
+        drift = 0
+        for ride_id in list(self._rides.keys()):
+            if ride_id not in fresh:
+                self.remove(ride_id)
+                drift += 1
+
+        for ride_id, ride in fresh.items():
+            known = self._rides.get(ride_id)
+            data = self._ride_to_dict(ride)
+            if known != data:
+                drift += 1
+                self.upsert(ride)
+
+        self._last_reconciled_at = datetime.utcnow()
+        self._last_drift = drift
+        if drift:
+            logger.warning(f"Pending ride index repaired {drift} entries during reconciliation")
+        return drift
+
+    async def run_reconciliation(self, session_maker, interval_seconds: int = RECONCILE_INTERVAL_SECONDS) -> None:
+        from app.crud.ride import ride_crud
+
+        while True:
+            try:
+                async with session_maker() as session:
+                    rides = await ride_crud.get_open_rides(session)
+                self.reconcile(rides)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Pending ride index reconciliation failed: {e}")
+
+            await asyncio.sleep(interval_seconds)
+
+    def get_stats(self) -> dict:
+        return {
+            "open_rides": len(self._rides),
+            "cells": len(self._cells),
+            "last_reconciled_at": self._last_reconciled_at.isoformat() if self._last_reconciled_at else None,
+            "last_drift": self._last_drift,
+        }
+
+    def cells_in_radius(self, lat: float, lng: float, radius_km: float) -> Iterable[Tuple[int, int]]:
+        # Ячейки сетки, которые пересекает квадрат со стороной 2 * radius_km вокруг точки
+        lat_span = radius_km / self.KM_PER_DEG_LAT
+        lng_span = radius_km / (self.KM_PER_DEG_LAT * max(math.cos(math.radians(lat)), 0.01))
+
+        min_row, min_col = self.cell_of(lat - lat_span, lng - lng_span)
+        max_row, max_col = self.cell_of(lat + lat_span, lng + lng_span)
+        for row in range(min_row, max_row + 1):
+            for col in range(min_col, max_col + 1):
+                yield row, col
+
+    def _notify(self, event: str, ride: dict, session=None) -> None:
+        if session is not None:
+            session.info.setdefault(PENDING_EVENTS_KEY, []).append((self, event, ride))
+            return
+        self._deliver(event, ride)
+
+    def _deliver(self, event: str, ride: dict) -> None:
+        for listener in self._listeners:
+            try:
+                listener(event, ride)
+            except Exception as e:
+                logger.error(f"Ride index listener failed on {event} for ride {ride['id']}: {e}")
+
+    def _discard_from_cell(self, ride_id: int, cell: Tuple[int, int]) -> None:
+        ride_ids = self._cells.get(cell)
+        if ride_ids is None:
+            return
+        ride_ids.discard(ride_id)
+        if not ride_ids:
+            del self._cells[cell]
+
+    def cell_of(self, lat: float, lng: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.CELL_SIZE_DEG), math.floor(lng / self.CELL_SIZE_DEG))
+
+    @staticmethod
+    def _ride_to_dict(ride) -> dict:
+        return {
+            "id": ride.id,
+            "client_id": ride.client_id,
+            "status": ride.status,
+            "pickup_address": ride.pickup_address,
+            "pickup_lat": float(ride.pickup_lat),
+            "pickup_lng": float(ride.pickup_lng),
+            "dropoff_address": ride.dropoff_address,
+            "dropoff_lat": float(ride.dropoff_lat) if ride.dropoff_lat is not None else None,
+            "dropoff_lng": float(ride.dropoff_lng) if ride.dropoff_lng is not None else None,
+            "expected_fare": float(ride.expected_fare) if ride.expected_fare is not None else None,
+            "ride_class": "economy",  # TODO: добавить поле в модель
+            "created_at": ride.created_at.isoformat() if ride.created_at else None
+        }
+
+
+@event.listens_for(Session, "after_commit")
+def _deliver_committed_events(session: Session) -> None:
+    for index, event_name, ride in session.info.pop(PENDING_EVENTS_KEY, ()):
+        index._deliver(event_name, ride)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_rolled_back_events(session: Session) -> None:
+    session.info.pop(PENDING_EVENTS_KEY, None)
+
+
+ride_index = PendingRideIndex()
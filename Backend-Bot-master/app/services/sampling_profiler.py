@@ -0,0 +1,170 @@
+from typing import Dict, List, Optional, Tuple
+from collections import Counter
+import asyncio
+import json
+import logging
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# Кадр стека: (имя функции с модулем, файл, строка объявления)
+Frame = Tuple[str, str, int]
+Stack = Tuple[Frame, ...]
+
+
+class ProfilerBusyError(Exception):
+    pass
+
+
+class SamplingProfiler:
+    # Сэмплирующий профилировщик живого процесса: отдельный поток раз в interval
+    # снимает sys._current_frames() и считает одинаковые стеки. Код приложения не трогаем,
+    # поэтому включать можно прямо на нагруженном воркере.
+
+    DEFAULT_INTERVAL_SECONDS = 0.005
+    MIN_INTERVAL_SECONDS = 0.001
+    MAX_DURATION_SECONDS = 60.0
+    MAX_STACK_DEPTH = 128
+
+    FORMATS = ("collapsed", "speedscope")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.running = False
+        self.last_run: Optional[dict] = None
+
+    async def profile(
+        self,
+        duration_seconds: float,
+        interval_seconds: float = DEFAULT_INTERVAL_SECONDS,
+        thread_id: Optional[int] = None
+    ) -> "ProfileResult":
+        # Ждём поток через executor — event loop продолжает обслуживать запросы во время съёма
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("Profiler is already running")
+        try:
+            self.running = True
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                None, self.sample, duration_seconds, interval_seconds, thread_id
+            )
+        finally:
+            self.running = False
+            self._lock.release()
+
+    def sample(
+        self,
+        duration_seconds: float,
+        interval_seconds: float = DEFAULT_INTERVAL_SECONDS,
+        thread_id: Optional[int] = None
+    ) -> "ProfileResult":
+        duration_seconds = min(max(duration_seconds, 0.0), self.MAX_DURATION_SECONDS)
+        interval_seconds = max(interval_seconds, self.MIN_INTERVAL_SECONDS)
+
+        own_id = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        stacks: Counter = Counter()
+        samples = 0
+
+        started = time.perf_counter()
+        deadline = started + duration_seconds
+        next_tick = started
+        while time.perf_counter() < deadline:
+            for ident, frame in sys._current_frames().items():
+                if ident == own_id or (thread_id is not None and ident != thread_id):
+                    continue
+                stacks[self._walk(frame, names.get(ident, f"thread-{ident}"))] += 1
+            samples += 1
+            next_tick += interval_seconds
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Снимок оказался дольше интервала — не догоняем, иначе поток съест CPU
+                next_tick = time.perf_counter()
+
+        elapsed = time.perf_counter() - started
+        result = ProfileResult(stacks, samples, interval_seconds, elapsed)
+        self.last_run = {
+            "finished_at": time.time(),
+            "duration_seconds": round(elapsed, 3),
+            "samples": samples,
+            "unique_stacks": len(stacks)
+        }
+        logger.info(f"Sampling profile done: {samples} samples, {len(stacks)} unique stacks in {elapsed:.1f}s")
+        return result
+
+    def _walk(self, frame, thread_name: str) -> Stack:
+        frames: List[Frame] = []
+        while frame is not None and len(frames) < self.MAX_STACK_DEPTH:
+            code = frame.f_code
+            module = frame.f_globals.get("__name__", "?")
+            frames.append((f"{module}:{getattr(code, 'co_qualname', code.co_name)}", code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        frames.append((f"thread:{thread_name}", "", 0))
+        frames.reverse()
+        return tuple(frames)
+
+    def get_stats(self) -> dict:
+        return {
+            "running": self.running,
+            "last_run": self.last_run
+        }
+
+
+class ProfileResult:
+
+    def __init__(self, stacks: Counter, samples: int, interval_seconds: float, elapsed_seconds: float):
+        self.stacks = stacks
+        self.samples = samples
+        self.interval_seconds = interval_seconds
+        self.elapsed_seconds = elapsed_seconds
+
+    def to_collapsed(self) -> str:
+        # Формат Brendan Gregg: "корень;...;лист count" — понимают flamegraph.pl, speedscope, inferno
+        lines = []
+        for stack, count in self.stacks.most_common():
+            lines.append(";".join(name.replace(";", ":") for name, _, _ in stack) + f" {count}")
+        return "\n".join(lines) + "\n"
+
+    def to_speedscope(self, name: str = "profile") -> str:
+        frame_index: Dict[Frame, int] = {}
+        frames = []
+        samples = []
+        weights = []
+        for stack, count in self.stacks.items():
+            indexed = []
+            for frame in stack:
+                index = frame_index.get(frame)
+                if index is None:
+                    index = frame_index[frame] = len(frames)
+                    entry = {"name": frame[0]}
+                    if frame[1]:
+                        entry["file"] = frame[1]
+                        entry["line"] = frame[2]
+                    frames.append(entry)
+                indexed.append(index)
+            samples.append(indexed)
+            weights.append(round(count * self.interval_seconds, 6))
+
+        return json.dumps({
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": frames},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": round(sum(weights), 6),
+                "samples": samples,
+                "weights": weights
+            }],
+            "name": name,
+            "exporter": "ubro-sampling-profiler"
+        })
+
+
+sampling_profiler = SamplingProfiler()
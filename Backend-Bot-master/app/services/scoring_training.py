@@ -0,0 +1,169 @@
+from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+import asyncio
+import json
+import logging
+import math
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services.scoring_weights import FEATURES, write_weights_config
+
+logger = logging.getLogger(__name__)
+
+
+# Одна выборка: признаки всех водителей, получивших оффер, и индекс принявшего
+Sample = Tuple[List[List[float]], int]
+
+
+class ScoringWeightsTrainer:
+    # Условный логит: P(принял водитель j | офферы) = softmax(w · x_j).
+    # Все выборки разворачиваются в плоские массивы, градиент считается одним проходом на эпоху.
+
+    LEARNING_RATE = 0.5
+    EPOCHS = 300
+    L2 = 0.001
+    MIN_SAMPLES = 50
+
+    def __init__(self, initial: Optional[Dict[str, float]] = None):
+        self.initial = [float((initial or {}).get(name, 1.0 / len(FEATURES))) for name in FEATURES]
+
+    @staticmethod
+    def sample_from_meta(meta: dict) -> Optional[Sample]:
+        offers = meta.get("offers") or []
+        accepted = meta.get("accepted_driver_profile_id")
+        if len(offers) < 2 or accepted is None:
+            return None
+
+        rows = []
+        chosen = None
+        for offer in offers:
+            features = offer.get("features") or {}
+            if any(name not in features for name in FEATURES):
+                return None
+            if offer.get("driver_profile_id") == accepted:
+                chosen = len(rows)
+            rows.append([float(features[name]) for name in FEATURES])
+        if chosen is None:
+            return None
+        return rows, chosen
+
+    def fit(self, samples: List[Sample]) -> Dict[str, float]:
+        k = len(FEATURES)
+        flat: List[List[float]] = []
+        offsets: List[int] = []
+        chosen: List[int] = []
+        for rows, index in samples:
+            offsets.append(len(flat))
+            chosen.append(len(flat) + index)
+            flat.extend(rows)
+        offsets.append(len(flat))
+
+        # Сумма признаков выбранных водителей — постоянная часть градиента
+        chosen_sum = [sum(flat[i][f] for i in chosen) for f in range(k)]
+        n = len(samples)
+        w = list(self.initial)
+
+        for _ in range(self.EPOCHS):
+            utilities = [sum(w[f] * row[f] for f in range(k)) for row in flat]
+            expected = [0.0] * k
+            for s in range(n):
+                start, end = offsets[s], offsets[s + 1]
+                peak = max(utilities[start:end])
+                exps = [math.exp(u - peak) for u in utilities[start:end]]
+                total = sum(exps)
+                for e, row in zip(exps, flat[start:end]):
+                    p = e / total
+                    for f in range(k):
+                        expected[f] += p * row[f]
+            w = [
+                w[f] + self.LEARNING_RATE * ((chosen_sum[f] - expected[f]) / n - self.L2 * w[f])
+                for f in range(k)
+            ]
+
+        return dict(zip(FEATURES, w))
+
+    @staticmethod
+    def log_likelihood(samples: List[Sample], weights: Dict[str, float]) -> float:
+        w = [weights[name] for name in FEATURES]
+        total = 0.0
+        for rows, index in samples:
+            utilities = [sum(wf * x for wf, x in zip(w, row)) for row in rows]
+            peak = max(utilities)
+            total += utilities[index] - peak - math.log(sum(math.exp(u - peak) for u in utilities))
+        return total / len(samples) if samples else 0.0
+
+    @staticmethod
+    def normalize(weights: Dict[str, float]) -> Dict[str, float]:
+        # Для ранжирования важно только направление вектора — приводим к сумме 1, как в дефолтах
+        clipped = {name: max(weights[name], 0.0) for name in FEATURES}
+        total = sum(clipped.values())
+        if total <= 0:
+            return {name: 1.0 / len(FEATURES) for name in FEATURES}
+        return {name: round(value / total, 4) for name, value in clipped.items()}
+
+
+async def load_samples(session: AsyncSession, since: datetime) -> Tuple[List[Sample], List[float]]:
+    result = await session.stream(
+        text(
+            """
+            SELECT meta
+            FROM ride_status_history
+            WHERE to_status = 'accepted'
+              AND meta -> 'offers' IS NOT NULL
+              AND created_at >= :since
+            """
+        ),
+        {"since": since}
+    )
+    samples = []
+    response_times = []
+    async for row in result:
+        meta = row.meta if isinstance(row.meta, dict) else json.loads(row.meta or "{}")
+        sample = ScoringWeightsTrainer.sample_from_meta(meta)
+        if sample:
+            samples.append(sample)
+        if meta.get("response_seconds") is not None:
+            response_times.append(float(meta["response_seconds"]))
+    return samples, response_times
+
+
+async def main(days: int = 28) -> None:
+    from app.config import SCORING_WEIGHTS_PATH
+    from app.db import async_session_maker
+    from app.services.matching_engine import MatchingEngine
+
+    defaults = {
+        "distance": MatchingEngine.WEIGHT_DISTANCE,
+        "rating": MatchingEngine.WEIGHT_RATING,
+        "freshness": MatchingEngine.WEIGHT_FRESHNESS
+    }
+
+    async with async_session_maker() as session:
+        samples, response_times = await load_samples(session, datetime.utcnow() - timedelta(days=days))
+
+    trainer = ScoringWeightsTrainer(defaults)
+    if len(samples) < trainer.MIN_SAMPLES:
+        logger.warning(f"Only {len(samples)} accepted offers with features, need {trainer.MIN_SAMPLES}; config not written")
+        return
+
+    raw = trainer.fit(samples)
+    weights = trainer.normalize(raw)
+    response_times.sort()
+    version = write_weights_config(
+        SCORING_WEIGHTS_PATH,
+        weights,
+        trained_at=datetime.utcnow().isoformat(),
+        samples=len(samples),
+        log_likelihood=round(trainer.log_likelihood(samples, raw), 4),
+        baseline_log_likelihood=round(trainer.log_likelihood(samples, defaults), 4),
+        median_response_seconds=response_times[len(response_times) // 2] if response_times else None
+    )
+    logger.info(f"Wrote scoring weights v{version} to {SCORING_WEIGHTS_PATH}: {weights}")
+
+
+if __name__ == "__main__":
+    # python -m app.services.scoring_training
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
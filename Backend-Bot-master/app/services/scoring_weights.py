@@ -0,0 +1,83 @@
+from typing import Dict, Optional
+from pathlib import Path
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+FEATURES = ("distance", "rating", "freshness")
+
+
+class ScoringWeights:
+    # Веса скоринга из версионированного JSON-конфига (пишет офлайн-тренер scoring_training).
+    # Файл перечитывается по mtime не чаще раза в RELOAD_CHECK_SECONDS — без рестарта сервиса.
+
+    RELOAD_CHECK_SECONDS = 5.0
+
+    def __init__(self, path: Optional[str], defaults: Dict[str, float]):
+        self.path = Path(path) if path else None
+        self.defaults = dict(defaults)
+        self.current: Dict[str, float] = dict(defaults)
+        self.version: Optional[int] = None
+        self.meta: dict = {}
+        self._mtime: Optional[float] = None
+        self._next_check = 0.0
+        self.maybe_reload(force=True)
+
+    def maybe_reload(self, force: bool = False) -> bool:
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return False
+        self._next_check = now + self.RELOAD_CHECK_SECONDS
+
+        if self.path is None:
+            return False
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return False
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+
+        try:
+            config = json.loads(self.path.read_text(encoding="utf-8"))
+            weights = {name: float(config["weights"][name]) for name in FEATURES}
+        except Exception as e:
+            logger.error(f"Invalid scoring weights config {self.path}: {e}")
+            return False
+
+        self.current = weights
+        self.version = config.get("version")
+        self.meta = {k: v for k, v in config.items() if k != "weights"}
+        logger.info(f"Loaded scoring weights v{self.version}: {weights}")
+        return True
+
+    def describe(self) -> dict:
+        return {
+            "version": self.version,
+            "source": "config" if self.version is not None else "defaults",
+            **{k: round(v, 4) for k, v in self.current.items()},
+            "trained_at": self.meta.get("trained_at"),
+            "samples": self.meta.get("samples")
+        }
+
+
+def write_weights_config(path: str, weights: Dict[str, float], **meta) -> int:
+    target = Path(path)
+    version = 1
+    if target.exists():
+        try:
+            version = int(json.loads(target.read_text(encoding="utf-8")).get("version", 0)) + 1
+        except Exception:
+            pass
+
+    config = {"version": version, **meta, "weights": weights}
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = target.with_suffix(target.suffix + ".tmp")
+    tmp_path.write_text(json.dumps(config, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp_path, target)
+    return version
@@ -0,0 +1,101 @@
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class WaveScheduler:
+    # Одна куча дедлайнов и одна задача-таймер на все заказы вместо sleep-задачи на каждый заказ.
+    # Отмена ленивая: запись в куче остаётся, но не совпадает с _deadlines и пропускается.
+
+    def __init__(self, callback: Optional[Callable[[int], Awaitable[None]]] = None):
+        self._callback = callback
+        self._heap: List[Tuple[float, int, int]] = []
+        self._deadlines: Dict[int, Tuple[float, int]] = {}
+        self._counter = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._running_callbacks: Set[asyncio.Task] = set()
+        self._fired = 0
+
+    def set_callback(self, callback: Callable[[int], Awaitable[None]]) -> None:
+        self._callback = callback
+
+    def schedule(self, ride_id: int, delay_seconds: float) -> None:
+        due = time.monotonic() + delay_seconds
+        seq = next(self._counter)
+        self._deadlines[ride_id] = (due, seq)
+        heapq.heappush(self._heap, (due, seq, ride_id))
+
+        self._ensure_runner()
+        if self._heap[0][1] == seq:
+            self._wakeup.set()
+
+    def cancel(self, ride_id: int) -> bool:
+        return self._deadlines.pop(ride_id, None) is not None
+
+    def is_scheduled(self, ride_id: int) -> bool:
+        return ride_id in self._deadlines
+
+    async def stop(self) -> None:
+        if self._runner:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+
+    def get_stats(self) -> dict:
+        return {
+            "scheduled": len(self._deadlines),
+            "heap_size": len(self._heap),
+            "running_callbacks": len(self._running_callbacks),
+            "fired": self._fired
+        }
+
+    def _ensure_runner(self) -> None:
+        if self._runner is None or self._runner.done():
+            self._wakeup = asyncio.Event()
+            self._runner = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            timeout = None
+            now = time.monotonic()
+
+            while self._heap:
+                due, seq, ride_id = self._heap[0]
+                if self._deadlines.get(ride_id) != (due, seq):
+                    heapq.heappop(self._heap)
+                    continue
+                if due > now:
+                    timeout = due - now
+                    break
+                heapq.heappop(self._heap)
+                del self._deadlines[ride_id]
+                self._fire(ride_id)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _fire(self, ride_id: int) -> None:
+        if self._callback is None:
+            return
+        self._fired += 1
+        task = asyncio.create_task(self._safe_callback(ride_id))
+        self._running_callbacks.add(task)
+        task.add_done_callback(self._running_callbacks.discard)
+
+    async def _safe_callback(self, ride_id: int) -> None:
+        try:
+            await self._callback(ride_id)
+        except Exception as e:
+            logger.error(f"Wave callback failed for ride {ride_id}: {e}")
+
+
+wave_scheduler = WaveScheduler()
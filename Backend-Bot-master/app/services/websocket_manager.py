@@ -1,20 +1,79 @@
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Set
 from fastapi import WebSocket, WebSocketDisconnect
+from starlette.websockets import WebSocketState
 import json
 import logging
 from datetime import datetime
 
+from app.services.metrics import metrics
+
 logger = logging.getLogger(__name__)
 
 
+class RideMembership:
+    # Двусторонний индекс участников поездок: ride -> users и user -> rides.
+    # Обе стороны меняются вместе, пустые множества удаляются — индекс не течёт.
+    
+    def __init__(self):
+        self._ride_users: Dict[int, Set[int]] = {}
+        self._user_rides: Dict[int, Set[int]] = {}
+        self._memberships = 0
+    
+    def join(self, ride_id: int, user_id: int) -> bool:
+        users = self._ride_users.setdefault(ride_id, set())
+        if user_id in users:
+            return False
+        users.add(user_id)
+        self._user_rides.setdefault(user_id, set()).add(ride_id)
+        self._memberships += 1
+        return True
+    
+    def leave(self, ride_id: int, user_id: int) -> bool:
+        users = self._ride_users.get(ride_id)
+        if not users or user_id not in users:
+            return False
+        users.discard(user_id)
+        if not users:
+            del self._ride_users[ride_id]
+        rides = self._user_rides[user_id]
+        rides.discard(ride_id)
+        if not rides:
+            del self._user_rides[user_id]
+        self._memberships -= 1
+        return True
+    
+    def leave_all(self, user_id: int) -> List[int]:
+        rides = list(self._user_rides.get(user_id, ()))
+        for ride_id in rides:
+            self.leave(ride_id, user_id)
+        return rides
+    
+    def participants(self, ride_id: int) -> Set[int]:
+        return self._ride_users.get(ride_id, set())
+    
+    def rides_of(self, user_id: int) -> Set[int]:
+        return self._user_rides.get(user_id, set())
+    
+    def has_ride(self, ride_id: int) -> bool:
+        return ride_id in self._ride_users
+    
+    def ride_count(self) -> int:
+        return len(self._ride_users)
+    
+    def membership_count(self) -> int:
+        return self._memberships
+
+
 class ConnectionManager:
     
     def __init__(self):
         self.active_connections: Dict[int, List[WebSocket]] = {}
-        self.ride_participants: Dict[int, set] = {}
+        self.rides = RideMembership()
     
     async def connect(self, websocket: WebSocket, user_id: int) -> None:
-        await websocket.accept()
+        # Чат-роутер принимает соединение сам — повторный accept рвал handshake
+        if websocket.application_state == WebSocketState.CONNECTING:
+            await websocket.accept()
         
         if user_id not in self.active_connections:
             self.active_connections[user_id] = []
@@ -29,12 +88,17 @@ class ConnectionManager:
             
             if not self.active_connections[user_id]:
                 del self.active_connections[user_id]
+                # Последнее соединение пользователя — выходим из всех его поездок
+                left = self.rides.leave_all(user_id)
+                if left:
+                    logger.info(f"User {user_id} removed from rides {left} on last disconnect")
         
         logger.info(f"WebSocket disconnected: user_id={user_id}")
     
     def is_connected(self, user_id: int) -> bool:
         return user_id in self.active_connections and len(self.active_connections[user_id]) > 0
     
+    @metrics.timed("send_personal_message")
     async def send_personal_message(self, user_id: int, message: dict) -> bool:
         if user_id not in self.active_connections:
             logger.warning(f"User {user_id} is not connected")
@@ -54,7 +118,28 @@ class ConnectionManager:
                 disconnected.append(websocket)
         
         for ws in disconnected:
-            self.active_connections[user_id].remove(ws)
+            # Соединение могло уже уйти через disconnect() — список пользователя тогда удалён
+            self.disconnect(ws, user_id)
+        
+        return True
+    
+    async def send_personal_text(self, user_id: int, text: str) -> bool:
+        # Для заранее сериализованных сообщений — без повторного json-кодирования
+        if user_id not in self.active_connections:
+            logger.warning(f"User {user_id} is not connected")
+            return False
+        
+        disconnected = []
+        for websocket in self.active_connections[user_id]:
+            try:
+                await websocket.send_text(text)
+            except Exception as e:
+                logger.error(f"Failed to send message to user {user_id}: {e}")
+                disconnected.append(websocket)
+        
+        for ws in disconnected:
+            # Соединение могло уже уйти через disconnect() — список пользователя тогда удалён
+            self.disconnect(ws, user_id)
         
         return True
     
@@ -76,24 +161,24 @@ class ConnectionManager:
     
     
     def join_ride(self, ride_id: int, user_id: int) -> None:
-        if ride_id not in self.ride_participants:
-            self.ride_participants[ride_id] = set()
-        self.ride_participants[ride_id].add(user_id)
+        self.rides.join(ride_id, user_id)
         logger.info(f"User {user_id} joined ride {ride_id}")
     
     def leave_ride(self, ride_id: int, user_id: int) -> None:
-        if ride_id in self.ride_participants:
-            self.ride_participants[ride_id].discard(user_id)
-            if not self.ride_participants[ride_id]:
-                del self.ride_participants[ride_id]
+        self.rides.leave(ride_id, user_id)
         logger.info(f"User {user_id} left ride {ride_id}")
     
+    def get_user_rides(self, user_id: int) -> Set[int]:
+        return self.rides.rides_of(user_id)
+    
+    @metrics.timed("send_to_ride")
     async def send_to_ride(self, ride_id: int, message: dict, exclude_user_id: Optional[int] = None) -> None:
-        if ride_id not in self.ride_participants:
+        if not self.rides.has_ride(ride_id):
             logger.warning(f"No participants in ride {ride_id}")
             return
         
-        for user_id in self.ride_participants[ride_id]:
+        # Копия: пока ждём отправку, участники могут зайти или выйти
+        for user_id in list(self.rides.participants(ride_id)):
             if exclude_user_id and user_id == exclude_user_id:
                 continue
             await self.send_personal_message(user_id, message)
@@ -101,6 +186,9 @@ class ConnectionManager:
     def get_online_users(self) -> List[int]:
         return list(self.active_connections.keys())
     
+    def get_online_count(self) -> int:
+        return len(self.active_connections)
+    
     def get_connection_count(self) -> int:
         return sum(len(conns) for conns in self.active_connections.values())
 
@@ -0,0 +1,400 @@
+"""
+Нагрузочный симулятор матчинга: синтетический автопарк, поток координат и всплески заказов
+прогоняются через DriverTracker / MatchingEngine / OrderDispatcher в одном процессе.
+WebSocket-отправка подменяется FakeConnectionManager, БД не нужна.
+
+    python -m benchmarks.matching_simulator --drivers 50000 --rides 500
+    python -m benchmarks.matching_simulator --drivers 10000 --json
+    python -m benchmarks.matching_simulator --replay events.jsonl
+"""
+from typing import Dict, Iterator, List, Optional, Tuple
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+import argparse
+import asyncio
+import gc
+import importlib
+import json
+import logging
+import math
+import random
+import tempfile
+import time
+import tracemalloc
+
+from app.services.driver_tracker import DriverTracker, DriverStatus
+from app.services.matching_engine import MatchingEngine, RideRequest
+from app.services.dispatch_journal import dispatch_journal
+from app.services.wave_scheduler import wave_scheduler
+
+
+RIDE_CLASSES = ["economy", "comfort", "business"]
+# Доли водителей, имеющих допуск к классу (economy есть у всех)
+CLASS_SHARE = {"economy": 1.0, "comfort": 0.45, "business": 0.12}
+
+
+class FakeConnectionManager:
+    # Повторяет интерфейс ConnectionManager, но ничего не отправляет — считаем только вызовы
+
+    def __init__(self):
+        self.sent = 0
+        self.sent_bytes = 0
+
+    def is_connected(self, user_id: int) -> bool:
+        return True
+
+    async def send_personal_message(self, user_id: int, message: dict) -> bool:
+        self.sent += 1
+        return True
+
+    async def send_personal_text(self, user_id: int, text: str) -> bool:
+        self.sent += 1
+        self.sent_bytes += len(text)
+        return True
+
+    async def send_to_ride(self, ride_id: int, message: dict, exclude_user_id: Optional[int] = None) -> None:
+        self.sent += 1
+
+    async def broadcast(self, message: dict, exclude_user_id: Optional[int] = None) -> None:
+        self.sent += 1
+
+
+@dataclass
+class CityModel:
+    # Город как смесь гауссовых «горячих точек» (центр, вокзалы, спальные районы) и равномерного фона
+    center_lat: float = 55.7558
+    center_lng: float = 37.6173
+    radius_km: float = 25.0
+    hotspots: int = 12
+    background_share: float = 0.25
+    seed: int = 42
+    _spots: List[Tuple[float, float, float, float]] = field(default_factory=list, init=False)
+
+    def __post_init__(self):
+        rng = random.Random(self.seed)
+        for i in range(self.hotspots):
+            # Первая точка — центр города: самая плотная и компактная
+            distance = 0.0 if i == 0 else rng.uniform(0.2, 0.8) * self.radius_km
+            angle = rng.uniform(0, 2 * math.pi)
+            lat, lng = self._offset(self.center_lat, self.center_lng, distance, angle)
+            sigma_km = 1.5 if i == 0 else rng.uniform(1.0, 3.5)
+            weight = 4.0 if i == 0 else rng.uniform(0.5, 2.0)
+            self._spots.append((lat, lng, sigma_km, weight))
+
+    def sample(self, rng: random.Random) -> Tuple[float, float]:
+        if rng.random() < self.background_share:
+            distance = self.radius_km * math.sqrt(rng.random())
+            return self._offset(self.center_lat, self.center_lng, distance, rng.uniform(0, 2 * math.pi))
+        lat, lng, sigma_km, _ = rng.choices(self._spots, weights=[s[3] for s in self._spots])[0]
+        return self._offset(lat, lng, abs(rng.gauss(0, sigma_km)), rng.uniform(0, 2 * math.pi))
+
+    @staticmethod
+    def move(lat: float, lng: float, rng: random.Random, max_step_km: float = 0.3) -> Tuple[float, float]:
+        return CityModel._offset(lat, lng, rng.uniform(0, max_step_km), rng.uniform(0, 2 * math.pi))
+
+    @staticmethod
+    def _offset(lat: float, lng: float, distance_km: float, angle: float) -> Tuple[float, float]:
+        dlat = (distance_km * math.cos(angle)) / 111.32
+        dlng = (distance_km * math.sin(angle)) / (111.32 * max(math.cos(math.radians(lat)), 0.01))
+        return lat + dlat, lng + dlng
+
+
+class LatencyRecorder:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {}
+
+    @contextmanager
+    def measure(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.setdefault(name, []).append((time.perf_counter() - started) * 1000)
+
+    def summary(self) -> Dict[str, dict]:
+        result = {}
+        for name, values in self.samples.items():
+            ordered = sorted(values)
+            result[name] = {
+                "count": len(ordered),
+                "p50_ms": round(self._percentile(ordered, 50), 4),
+                "p99_ms": round(self._percentile(ordered, 99), 4),
+                "max_ms": round(ordered[-1], 4),
+                "total_ms": round(sum(ordered), 1)
+            }
+        return result
+
+    @staticmethod
+    def _percentile(ordered: List[float], pct: float) -> float:
+        if not ordered:
+            return 0.0
+        index = min(len(ordered) - 1, max(0, int(math.ceil(pct / 100 * len(ordered))) - 1))
+        return ordered[index]
+
+
+@contextmanager
+def isolated_services(tracker: DriverTracker, connection_manager: FakeConnectionManager) -> Iterator[object]:
+    # Сервисы держат ссылки на синглтоны модулей — на время прогона подменяем их свежими экземплярами
+    engine_module = importlib.import_module("app.services.matching_engine")
+    batch_module = importlib.import_module("app.services.batch_matcher")
+    dispatcher_module = importlib.import_module("app.services.order_dispatcher")
+
+    engine = MatchingEngine()
+    engine.tracker = tracker
+    dispatcher = dispatcher_module.OrderDispatcher()
+
+    originals = {
+        (dispatcher_module, "driver_tracker"): dispatcher_module.driver_tracker,
+        (dispatcher_module, "matching_engine"): dispatcher_module.matching_engine,
+        (dispatcher_module, "manager"): dispatcher_module.manager,
+        (engine_module, "driver_tracker"): engine_module.driver_tracker,
+        (batch_module, "matching_engine"): batch_module.matching_engine,
+    }
+    replacements = {
+        (dispatcher_module, "driver_tracker"): tracker,
+        (dispatcher_module, "matching_engine"): engine,
+        (dispatcher_module, "manager"): connection_manager,
+        (engine_module, "driver_tracker"): tracker,
+        (batch_module, "matching_engine"): engine,
+    }
+    original_batch_engine = batch_module.batch_matcher.engine
+    original_journal_path = dispatch_journal.path
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        dispatch_journal.path = Path(tmp_dir) / "journal.jsonl"
+        for (module, name), value in replacements.items():
+            setattr(module, name, value)
+        batch_module.batch_matcher.engine = engine
+        try:
+            yield engine, dispatcher
+        finally:
+            for (module, name), value in originals.items():
+                setattr(module, name, value)
+            batch_module.batch_matcher.engine = original_batch_engine
+            dispatch_journal.path = original_journal_path
+            # Конструктор OrderDispatcher перехватил общие колбэки — возвращаем их рабочему диспетчеру
+            wave_scheduler.set_callback(dispatcher_module.order_dispatcher._on_wave_due)
+            dispatch_journal.set_snapshot_provider(dispatcher_module.order_dispatcher._journal_snapshot)
+
+
+def build_fleet(tracker: DriverTracker, city: CityModel, size: int, rng: random.Random) -> List[int]:
+    driver_ids = []
+    for i in range(size):
+        driver_profile_id = i + 1
+        classes = [c for c in RIDE_CLASSES if rng.random() < CLASS_SHARE[c]]
+        tracker.register_driver(
+            driver_profile_id=driver_profile_id,
+            user_id=1_000_000 + driver_profile_id,
+            classes_allowed=classes,
+            rating=round(rng.uniform(4.0, 5.0), 2)
+        )
+        lat, lng = city.sample(rng)
+        tracker.update_location(driver_profile_id, lat, lng)
+        tracker.set_status(driver_profile_id, DriverStatus.ONLINE)
+        driver_ids.append(driver_profile_id)
+    return driver_ids
+
+
+def measure_memory_per_driver(city: CityModel, size: int, seed: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracker = DriverTracker()
+    build_fleet(tracker, city, size, random.Random(seed))
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del tracker
+    gc.collect()
+    return allocated / size if size else 0.0
+
+
+def make_ride_request(ride_id: int, city: CityModel, rng: random.Random) -> RideRequest:
+    pickup_lat, pickup_lng = city.sample(rng)
+    dropoff_lat, dropoff_lng = city.sample(rng)
+    return RideRequest(
+        ride_id=ride_id,
+        client_id=ride_id,
+        ride_class=rng.choices(RIDE_CLASSES, weights=[0.7, 0.25, 0.05])[0],
+        pickup_lat=pickup_lat,
+        pickup_lng=pickup_lng,
+        dropoff_lat=dropoff_lat,
+        dropoff_lng=dropoff_lng,
+        expected_fare=round(rng.uniform(200, 2500), 2),
+        search_radius_km=3.0
+    )
+
+
+async def run_synthetic(args: argparse.Namespace) -> dict:
+    rng = random.Random(args.seed)
+    city = CityModel(seed=args.seed)
+    recorder = LatencyRecorder()
+    connection_manager = FakeConnectionManager()
+    tracker = DriverTracker()
+
+    memory_per_driver = None
+    if not args.skip_memory:
+        memory_per_driver = measure_memory_per_driver(city, min(args.drivers, args.memory_sample), args.seed)
+
+    started = time.perf_counter()
+    driver_ids = build_fleet(tracker, city, args.drivers, rng)
+    fleet_seconds = time.perf_counter() - started
+
+    # Доля водителей на линии, остальные — оффлайн или на заказе
+    for driver_profile_id in driver_ids:
+        roll = rng.random()
+        if roll < 0.15:
+            tracker.set_status(driver_profile_id, DriverStatus.OFFLINE)
+        elif roll < 0.35:
+            tracker.assign_ride(driver_profile_id, -driver_profile_id)
+
+    with isolated_services(tracker, connection_manager) as (engine, dispatcher):
+        for _ in range(args.updates):
+            driver_profile_id = rng.choice(driver_ids)
+            driver = tracker.get_driver(driver_profile_id)
+            lat, lng = CityModel.move(driver.latitude, driver.longitude, rng)
+            with recorder.measure("update_location"):
+                tracker.update_location(driver_profile_id, lat, lng, speed=rng.uniform(0, 60))
+
+        for i in range(args.queries):
+            request = make_ride_request(10_000_000 + i, city, rng)
+            with recorder.measure("get_available_drivers"):
+                tracker.get_available_drivers(
+                    ride_class=request.ride_class,
+                    center_lat=request.pickup_lat,
+                    center_lng=request.pickup_lng,
+                    radius_km=request.search_radius_km
+                )
+            with recorder.measure("find_drivers"):
+                engine.find_drivers(request)
+
+        ride_id = 1
+        for _ in range(args.bursts):
+            burst = []
+            for _ in range(args.rides):
+                burst.append(make_ride_request(ride_id, city, rng))
+                ride_id += 1
+
+            for request in burst:
+                with recorder.measure("dispatch_new_ride"):
+                    await dispatcher.dispatch_new_ride(
+                        ride_id=request.ride_id,
+                        client_id=request.client_id,
+                        ride_class=request.ride_class,
+                        pickup_lat=request.pickup_lat,
+                        pickup_lng=request.pickup_lng,
+                        dropoff_lat=request.dropoff_lat,
+                        dropoff_lng=request.dropoff_lng,
+                        expected_fare=request.expected_fare
+                    )
+
+            for request in burst:
+                with recorder.measure("cancel_dispatch"):
+                    await dispatcher.cancel_dispatch(request.ride_id)
+
+        await wave_scheduler.stop()
+        with recorder.measure("journal_flush"):
+            await dispatch_journal.flush()
+
+    return {
+        "drivers": args.drivers,
+        "fleet_build_seconds": round(fleet_seconds, 2),
+        "memory_bytes_per_driver": round(memory_per_driver) if memory_per_driver is not None else None,
+        "messages_sent": connection_manager.sent,
+        "message_bytes": connection_manager.sent_bytes,
+        "latency": recorder.summary()
+    }
+
+
+async def run_replay(args: argparse.Namespace) -> dict:
+    # Формат событий (JSON lines):
+    #   {"op": "register", "driver_profile_id", "user_id", "classes", "rating"}
+    #   {"op": "location", "driver_profile_id", "lat", "lng"}
+    #   {"op": "status", "driver_profile_id", "status"}
+    #   {"op": "ride", "ride_id", "client_id", "ride_class", "pickup_lat", "pickup_lng", ...}
+    #   {"op": "cancel", "ride_id"}
+    recorder = LatencyRecorder()
+    connection_manager = FakeConnectionManager()
+    tracker = DriverTracker()
+    events = 0
+
+    with isolated_services(tracker, connection_manager) as (engine, dispatcher):
+        with open(args.replay, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                event = json.loads(line)
+                op = event.pop("op")
+                events += 1
+
+                if op == "register":
+                    with recorder.measure("register_driver"):
+                        tracker.register_driver(
+                            event["driver_profile_id"], event["user_id"],
+                            event.get("classes", ["economy"]), event.get("rating", 5.0)
+                        )
+                elif op == "location":
+                    with recorder.measure("update_location"):
+                        tracker.update_location(event["driver_profile_id"], event["lat"], event["lng"])
+                elif op == "status":
+                    tracker.set_status(event["driver_profile_id"], DriverStatus(event["status"]))
+                elif op == "ride":
+                    with recorder.measure("dispatch_new_ride"):
+                        await dispatcher.dispatch_new_ride(**event)
+                elif op == "cancel":
+                    with recorder.measure("cancel_dispatch"):
+                        await dispatcher.cancel_dispatch(event["ride_id"])
+
+        await wave_scheduler.stop()
+        await dispatch_journal.flush()
+
+    return {
+        "replay": args.replay,
+        "events": events,
+        "messages_sent": connection_manager.sent,
+        "latency": recorder.summary()
+    }
+
+
+def print_report(report: dict) -> None:
+    for key, value in report.items():
+        if key != "latency":
+            print(f"{key:>26}: {value}")
+    print()
+    print(f"{'operation':<24}{'count':>8}{'p50 ms':>12}{'p99 ms':>12}{'max ms':>12}")
+    for name, stats in report["latency"].items():
+        print(f"{name:<24}{stats['count']:>8}{stats['p50_ms']:>12.4f}{stats['p99_ms']:>12.4f}{stats['max_ms']:>12.4f}")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="In-process matching load simulator")
+    parser.add_argument("--drivers", type=int, default=10_000)
+    parser.add_argument("--updates", type=int, default=20_000, help="location updates to apply")
+    parser.add_argument("--queries", type=int, default=200, help="find_drivers / get_available_drivers calls")
+    parser.add_argument("--rides", type=int, default=200, help="rides per burst")
+    parser.add_argument("--bursts", type=int, default=3)
+    parser.add_argument("--memory-sample", type=int, default=20_000, help="fleet size for memory measurement")
+    parser.add_argument("--skip-memory", action="store_true")
+    parser.add_argument("--replay", help="JSON lines event log to replay instead of synthetic load")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="print machine-readable report")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> dict:
+    args = parse_args(argv)
+    # Логи сервисов на каждый вызов искажают замеры
+    logging.getLogger("app").setLevel(logging.ERROR)
+
+    report = asyncio.run(run_replay(args) if args.replay else run_synthetic(args))
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+"""
+Нагрузочный тест WebSocket: тысячи клиентов против приложения, поднятого в этом же процессе.
+
+Сервер (uvicorn) крутится в отдельном потоке со своим event loop, клиенты — в основном.
+Клиенты воспроизводят смесь location_update / ping / join_ride / chat_message на /ws/{user_id}
+и сообщения в /chat/ws/{ride_id}. Отчёт: задержки ответа и доставки в комнату заказа,
+лаг event loop сервера, память процесса на соединение.
+
+По умолчанию собирается приложение только с websocket/chat роутерами и без БД: сообщения чата
+chat_writer пишет в InMemoryChatStore (групповая запись, id и кэш истории работают как с Postgres,
+но без сетевого round-trip к базе — задержки чата получаются нижней оценкой). Для прогона на полном
+приложении с настоящей записью в БД (--full-app) нужны DB_* переменные, указывающие на локальный
+Postgres (например, из docker compose).
+
+    python -m benchmarks.ws_load_test --clients 2000 --duration 30
+    python -m benchmarks.ws_load_test --clients 5000 --rate 0.5 --chat-share 0.2 --json
+"""
+from typing import Dict, List, Optional
+from collections import deque
+import argparse
+import asyncio
+import gc
+import itertools
+import json
+import logging
+import os
+import random
+import resource
+import string
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI
+from websockets.asyncio.client import connect
+
+from app.services.driver_tracker import driver_tracker, DriverStatus
+from app.services.chat_writer import chat_writer
+
+
+API_PREFIX = "/api/v1"
+RIDE_ID_BASE = 900_000
+DRIVER_PROFILE_BASE = 900_000
+
+
+class InMemoryChatStore:
+    # Замена async_session_maker для chat_writer: принимает многострочный INSERT ... RETURNING
+    # и выдаёт последовательные id, строки не хранит
+
+    def __init__(self):
+        self.next_id = 1
+        self.inserted = 0
+
+    def session_maker(self) -> "InMemoryChatSession":
+        return InMemoryChatSession(self)
+
+
+class InMemoryChatRow:
+    __slots__ = ("id",)
+
+    def __init__(self, id: int):
+        self.id = id
+
+
+class InMemoryChatResult:
+    def __init__(self, ids: List[int]):
+        self._rows = [InMemoryChatRow(i) for i in ids]
+
+    def __iter__(self):
+        return iter(self._rows)
+
+
+class InMemoryChatSession:
+    def __init__(self, store: InMemoryChatStore):
+        self.store = store
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, rows):
+        ids = list(range(self.store.next_id, self.store.next_id + len(rows)))
+        self.store.next_id += len(rows)
+        self.store.inserted += len(rows)
+        return InMemoryChatResult(ids)
+
+    async def commit(self):
+        pass
+
+
+def build_ws_app(chat_store: Optional[InMemoryChatStore] = None) -> FastAPI:
+    from app.backend.routers.websocket import websocket_router
+    from app.backend.routers.chat import chat_router
+
+    chat_writer.session_maker = (chat_store or InMemoryChatStore()).session_maker
+    app = FastAPI()
+    app.include_router(websocket_router, prefix=API_PREFIX)
+    app.include_router(chat_router, prefix=API_PREFIX)
+    return app
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # macOS: ru_maxrss в байтах, Linux: в КБ — берём как есть, это только оценка
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def raise_fd_limit(wanted: int) -> int:
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    target = min(hard, max(soft, wanted))
+    if target > soft:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (target, hard))
+    return target
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.sent: Dict[str, int] = {}
+        self.received: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.token_sent_at: Dict[str, float] = {}
+
+    def add_latency(self, name: str, seconds: float) -> None:
+        self.latencies.setdefault(name, []).append(seconds * 1000)
+
+    def count(self, bucket: Dict[str, int], name: str) -> None:
+        bucket[name] = bucket.get(name, 0) + 1
+
+    def summary(self) -> dict:
+        latency = {}
+        for name, values in self.latencies.items():
+            ordered = sorted(values)
+            latency[name] = {
+                "count": len(ordered),
+                "p50_ms": round(percentile(ordered, 50), 3),
+                "p99_ms": round(percentile(ordered, 99), 3),
+                "max_ms": round(ordered[-1], 3)
+            }
+        return {
+            "sent": self.sent,
+            "received": self.received,
+            "errors": self.errors,
+            "latency": latency
+        }
+
+
+def percentile(ordered: List[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(len(ordered) * pct / 100 + 0.5) - 1))]
+
+
+def make_token(counter: itertools.count) -> str:
+    # Только буквы: цифры в тексте чата может зацепить модерация (телефоны)
+    n = next(counter)
+    letters = []
+    while True:
+        n, rem = divmod(n, 26)
+        letters.append(string.ascii_lowercase[rem])
+        if n == 0:
+            break
+    return "lt" + "".join(letters)
+
+
+class LoopLagMonitor:
+    INTERVAL_SECONDS = 0.05
+
+    def __init__(self):
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.INTERVAL_SECONDS)
+            self.samples.append(max(0.0, time.perf_counter() - started - self.INTERVAL_SECONDS) * 1000)
+
+    def summary(self) -> dict:
+        ordered = sorted(self.samples)
+        return {
+            "samples": len(ordered),
+            "p50_ms": round(percentile(ordered, 50), 3),
+            "p99_ms": round(percentile(ordered, 99), 3),
+            "max_ms": round(ordered[-1], 3) if ordered else 0.0
+        }
+
+
+class ServerThread:
+    # uvicorn в отдельном потоке: нагрузка клиентов не смешивается с лагом серверного loop
+
+    def __init__(self, app: FastAPI, host: str = "127.0.0.1"):
+        self.config = uvicorn.Config(app, host=host, port=0, log_level="error", ws_max_queue=1024)
+        self.server = uvicorn.Server(self.config)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.lag = LoopLagMonitor()
+        self._thread = threading.Thread(target=self._run, name="ws-load-server", daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.server.servers[0].sockets[0].getsockname()[1]
+
+    def start(self, timeout: float = 10.0) -> None:
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError("uvicorn did not start")
+            time.sleep(0.05)
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self._thread.join(timeout=10)
+
+    def _run(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self.lag.start)
+        self.loop.run_until_complete(self.server.serve())
+
+
+class LoadClient:
+    # Один пользователь: постоянное соединение /ws/{user_id} (+ опционально /chat/ws/{ride_id})
+
+    def __init__(self, index: int, base_url: str, args: argparse.Namespace, stats: Stats, tokens: itertools.count):
+        self.index = index
+        self.is_driver = index % 2 == 0
+        self.user_id = 1_000_000 + index
+        self.ride_id = RIDE_ID_BASE + index // 2
+        self.base_url = base_url
+        self.args = args
+        self.stats = stats
+        self.tokens = tokens
+        self.rng = random.Random(args.seed + index)
+        self.use_chat = self.rng.random() < args.chat_share
+        self.pending: Dict[str, deque] = {"pong": deque(), "location_ack": deque(), "joined_ride": deque()}
+        self.ws = None
+        self.chat_ws = None
+        self.lat = 55.75 + self.rng.uniform(-0.1, 0.1)
+        self.lng = 37.62 + self.rng.uniform(-0.15, 0.15)
+
+    async def open(self) -> None:
+        self.ws = await connect(f"{self.base_url}/ws/{self.user_id}", max_queue=None, open_timeout=30)
+        await self._expect_connected(self.ws)
+        if self.use_chat:
+            self.chat_ws = await connect(
+                f"{self.base_url}/chat/ws/{self.ride_id}?user_id={self.user_id}",
+                max_queue=None,
+                open_timeout=30
+            )
+            await self._expect_connected(self.chat_ws)
+
+    async def _expect_connected(self, ws) -> None:
+        message = json.loads(await ws.recv())
+        if message.get("type") != "connected":
+            raise RuntimeError(f"Unexpected handshake message: {message}")
+
+    async def run(self, until: float) -> None:
+        readers = [asyncio.create_task(self._read(self.ws))]
+        if self.chat_ws:
+            readers.append(asyncio.create_task(self._read(self.chat_ws)))
+
+        try:
+            await self._send(self.ws, {"type": "join_ride", "ride_id": self.ride_id}, "join_ride", "joined_ride")
+            interval = 1.0 / self.args.rate
+            # Разносим клиентов по фазе, чтобы не слать всё одним залпом
+            await asyncio.sleep(self.rng.uniform(0, interval))
+            while time.perf_counter() < until:
+                await self._send_one()
+                await asyncio.sleep(self.rng.expovariate(self.args.rate))
+            await asyncio.sleep(self.args.drain_seconds)
+        finally:
+            for reader in readers:
+                reader.cancel()
+
+    async def close(self) -> None:
+        for ws in (self.chat_ws, self.ws):
+            if ws is not None:
+                try:
+                    await ws.close()
+                except Exception:
+                    pass
+
+    async def _send_one(self) -> None:
+        roll = self.rng.random()
+        mix = self.args
+        if self.is_driver and roll < mix.location_share:
+            self.lat += self.rng.uniform(-0.001, 0.001)
+            self.lng += self.rng.uniform(-0.001, 0.001)
+            await self._send(self.ws, {
+                "type": "location_update",
+                "lat": self.lat,
+                "lng": self.lng,
+                "ride_id": self.ride_id,
+                "speed": 30
+            }, "location_update", "location_ack")
+        elif roll < mix.location_share + mix.chat_message_share:
+            token = make_token(self.tokens)
+            self.stats.token_sent_at[token] = time.perf_counter()
+            if self.chat_ws:
+                await self._send(self.chat_ws, {"type": "message", "text": f"load {token}"}, "chat_ws_message")
+            else:
+                await self._send(self.ws, {
+                    "type": "chat_message",
+                    "ride_id": self.ride_id,
+                    "text": f"load {token}"
+                }, "ws_chat_message")
+        else:
+            await self._send(self.ws, {"type": "ping"}, "ping", "pong")
+
+    async def _send(self, ws, message: dict, name: str, reply: Optional[str] = None) -> None:
+        if reply:
+            self.pending[reply].append(time.perf_counter())
+        try:
+            await ws.send(json.dumps(message))
+            self.stats.count(self.stats.sent, name)
+        except Exception:
+            self.stats.count(self.stats.errors, f"send_{name}")
+
+    async def _read(self, ws) -> None:
+        try:
+            async for raw in ws:
+                now = time.perf_counter()
+                message = json.loads(raw)
+                kind = message.get("type")
+                self.stats.count(self.stats.received, kind)
+
+                queue = self.pending.get(kind)
+                if queue:
+                    self.stats.add_latency(f"{kind}_rtt", now - queue.popleft())
+                elif kind in ("chat_message", "new_message"):
+                    text = message.get("text") or message.get("message", {}).get("text", "")
+                    sent_at = self.stats.token_sent_at.get(text.rsplit(" ", 1)[-1])
+                    if sent_at is not None:
+                        self.stats.add_latency(f"{kind}_delivery", now - sent_at)
+                elif kind == "error":
+                    self.stats.count(self.stats.errors, message.get("code") or message.get("message", "error"))
+        except Exception:
+            pass
+
+
+async def run_load(args: argparse.Namespace, base_url: str) -> dict:
+    stats = Stats()
+    tokens = itertools.count()
+    clients = [LoadClient(i, base_url, args, stats, tokens) for i in range(args.clients)]
+
+    # Водители должны быть в трекере, иначе location_update не подтверждается
+    for client in clients:
+        if client.is_driver:
+            driver_tracker.register_driver(DRIVER_PROFILE_BASE + client.index, client.user_id, ["economy"])
+            driver_tracker.set_status(DRIVER_PROFILE_BASE + client.index, DriverStatus.ONLINE)
+
+    gc.collect()
+    rss_before = rss_bytes()
+    connect_started = time.perf_counter()
+    connected: List[LoadClient] = []
+    for start in range(0, len(clients), args.connect_batch):
+        batch = clients[start:start + args.connect_batch]
+        results = await asyncio.gather(*(c.open() for c in batch), return_exceptions=True)
+        for client, result in zip(batch, results):
+            if isinstance(result, Exception):
+                stats.count(stats.errors, f"connect_{type(result).__name__}")
+            else:
+                connected.append(client)
+    connect_seconds = time.perf_counter() - connect_started
+
+    gc.collect()
+    connections = sum(1 + (c.chat_ws is not None) for c in connected)
+    rss_per_connection = (rss_bytes() - rss_before) / connections if connections else 0
+
+    client_lag = LoopLagMonitor()
+    client_lag.start()
+    load_started = time.perf_counter()
+    until = load_started + args.duration
+    await asyncio.gather(*(c.run(until) for c in connected), return_exceptions=True)
+    elapsed = time.perf_counter() - load_started
+    client_lag.stop()
+
+    await asyncio.gather(*(c.close() for c in connected), return_exceptions=True)
+
+    summary = stats.summary()
+    return {
+        "clients": args.clients,
+        "connected_clients": len(connected),
+        "connections": connections,
+        "connect_seconds": round(connect_seconds, 2),
+        "rss_bytes_per_connection": round(rss_per_connection),
+        "messages_sent_per_second": round(sum(summary["sent"].values()) / elapsed, 1),
+        "messages_received_per_second": round(sum(summary["received"].values()) / elapsed, 1),
+        "client_loop_lag": client_lag.summary(),
+        **summary
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="WebSocket load test against an in-process app")
+    parser.add_argument("--clients", type=int, default=1000, help="users; even ones are drivers, odd ones riders")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds of steady load")
+    parser.add_argument("--rate", type=float, default=1.0, help="messages per second per client")
+    parser.add_argument("--location-share", type=float, default=0.6, help="share of location_update for drivers")
+    parser.add_argument("--chat-message-share", type=float, default=0.15)
+    parser.add_argument("--chat-share", type=float, default=0.3, help="share of users with a /chat/ws connection")
+    parser.add_argument("--connect-batch", type=int, default=200)
+    parser.add_argument("--drain-seconds", type=float, default=1.0)
+    parser.add_argument("--full-app", action="store_true", help="use app.backend.main:app (needs Postgres)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true")
+    return parser.parse_args(argv)
+
+
+def print_report(report: dict) -> None:
+    for key in ("clients", "connected_clients", "connections", "connect_seconds",
+                "rss_bytes_per_connection", "messages_sent_per_second", "messages_received_per_second"):
+        print(f"{key:>30}: {report[key]}")
+    print(f"{'server_loop_lag':>30}: {report['server_loop_lag']}")
+    print(f"{'client_loop_lag':>30}: {report['client_loop_lag']}")
+    print(f"{'errors':>30}: {report['errors']}")
+    print()
+    print(f"{'latency':<26}{'count':>8}{'p50 ms':>12}{'p99 ms':>12}{'max ms':>12}")
+    for name, s in sorted(report["latency"].items()):
+        print(f"{name:<26}{s['count']:>8}{s['p50_ms']:>12.3f}{s['p99_ms']:>12.3f}{s['max_ms']:>12.3f}")
+
+
+def main(argv: Optional[List[str]] = None) -> dict:
+    args = parse_args(argv)
+    raise_fd_limit(args.clients * 6 + 256)
+
+    session_maker = chat_writer.session_maker
+    if args.full_app:
+        from app.backend.main import app
+    else:
+        app = build_ws_app()
+    # app.logger выставляет INFO при импорте роутеров — глушим после сборки приложения
+    logging.getLogger("app").setLevel(logging.ERROR)
+
+    server = ServerThread(app)
+    server.start()
+    try:
+        report = asyncio.run(run_load(args, f"ws://127.0.0.1:{server.port}{API_PREFIX}"))
+    finally:
+        server.lag.stop()
+        server.stop()
+        chat_writer.session_maker = session_maker
+    report["server_loop_lag"] = server.lag.summary()
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+"""add chat_messages (ride_id, id) index
+
+Revision ID: add_chat_ride_index
+Revises: add_update_balance
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_chat_ride_index'
+down_revision: Union[str, None] = 'add_update_balance'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # История, пагинация и sync чата всегда идут по ride_id с диапазоном по id
+    op.create_index('ix_chat_messages_ride_id_id', 'chat_messages', ['ride_id', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_chat_messages_ride_id_id', table_name='chat_messages')
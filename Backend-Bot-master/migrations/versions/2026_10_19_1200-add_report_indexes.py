@@ -0,0 +1,28 @@
+"""add rides (driver_profile_id, completed_at) and transactions (user_id, created_at) indexes
+
+Revision ID: add_report_indexes
+Revises: add_chat_ride_index
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = 'add_report_indexes'
+down_revision: Union[str, None] = 'add_chat_ride_index'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Отчёт водителя и выписка по балансу выбирают строки одного водителя/пользователя за период
+    op.create_index('ix_rides_driver_profile_id_completed_at', 'rides', ['driver_profile_id', 'completed_at'])
+    op.create_index('ix_transactions_user_id_created_at', 'transactions', ['user_id', 'created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_transactions_user_id_created_at', table_name='transactions')
+    op.drop_index('ix_rides_driver_profile_id_completed_at', table_name='rides')
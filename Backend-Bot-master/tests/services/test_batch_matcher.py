@@ -0,0 +1,69 @@
+from app.services.batch_matcher import solve_assignment, BatchMatcher
+from app.services.matching_engine import RideRequest, DriverMatch
+
+
+def make_match(driver_id, eta):
+    return DriverMatch(
+        driver_profile_id=driver_id, user_id=driver_id,
+        distance_km=eta / 2, eta_minutes=eta, rating=5.0, score=1.0
+    )
+
+
+def test_solve_assignment_finds_global_minimum():
+    cost = [
+        [4, 1, 3],
+        [2, 0, 5],
+        [3, 2, 2],
+    ]
+    assert solve_assignment(cost) == [1, 0, 2]
+
+
+def test_solve_assignment_rectangular():
+    assert solve_assignment([[1, 2, 3]]) == [0]
+    assert solve_assignment([[5], [1]]) == [-1, 0]
+
+
+def match_batch(candidates):
+    class FakeEngine:
+        def expand_search(self, request, **kwargs):
+            return candidates[request.ride_id]
+
+    matcher = BatchMatcher()
+    matcher.engine = FakeEngine()
+    requests = [
+        RideRequest(ride_id=i, client_id=0, ride_class="economy", pickup_lat=0, pickup_lng=0)
+        for i in candidates
+    ]
+    return matcher.match(requests)
+
+
+def test_batch_beats_greedy():
+    # Первый заказ жадно забирает водителя 1, оставляя второму далёкого водителя 2
+    result = match_batch({
+        1: [make_match(1, 2.0), make_match(2, 3.0)],
+        2: [make_match(1, 2.5), make_match(2, 20.0)],
+    })
+
+    assert result.assignments[1].driver_profile_id == 2
+    assert result.assignments[2].driver_profile_id == 1
+    assert result.optimal_eta_minutes == 5.5
+    assert result.greedy_eta_minutes == 22.0
+    assert result.eta_saved_minutes == 16.5
+    assert result.compared_rides == 2
+
+
+def test_saving_compares_only_rides_matched_by_both():
+    # Жадный отдаёт водителя 1 первому заказу, и второму не остаётся никого;
+    # оптимальный назначает обоих, отдав первому заказу водителя подальше
+    result = match_batch({
+        1: [make_match(1, 1.0), make_match(2, 5.0)],
+        2: [make_match(1, 2.0)],
+    })
+
+    assert (result.optimal_matched, result.greedy_matched) == (2, 1)
+    assert result.compared_rides == 1
+    # Разница сумм (1 - 7) смешала бы лишний назначенный заказ с экономией
+    assert result.eta_saved_minutes == -4.0
+    stats = result.to_dict()
+    assert stats["optimal_mean_eta_minutes"] == 3.5
+    assert stats["greedy_mean_eta_minutes"] == 1.0
@@ -0,0 +1,198 @@
+import asyncio
+import importlib
+from datetime import datetime
+
+from app.models.chat_message import ChatMessage
+from app.schemas.chat_message import ChatMessageSchema
+from app.services.chat_history_cache import ChatHistoryCache
+
+chat_service_module = importlib.import_module("app.services.chat_service")
+
+
+def message(message_id, ride_id=1, text=None, deleted=False):
+    return ChatMessageSchema(
+        id=message_id,
+        ride_id=ride_id,
+        sender_id=10,
+        text=text or f"m{message_id}",
+        message_type="text",
+        is_moderated=True,
+        created_at=datetime(2026, 1, 1),
+        deleted_at=datetime(2026, 1, 2) if deleted else None,
+    )
+
+
+def test_serves_pages_from_window_and_falls_back_past_it():
+    cache = ChatHistoryCache(max_messages=5)
+    assert cache.get(1, 10) is None
+    assert cache.begin_load(1)
+    cache.finish_load(1, [message(i) for i in range(20, 25)], complete=False)
+
+    assert [m.id for m in cache.get(1, 3)] == [22, 23, 24]
+    assert [m.id for m in cache.get(1, 2, before_id=23)] == [21, 22]
+    # Старше окна — только в БД
+    assert cache.get(1, 10) is None
+    assert cache.get(1, 2, before_id=21) is None
+
+
+def test_complete_chat_answers_any_limit_and_respects_deleted():
+    cache = ChatHistoryCache()
+    cache.begin_load(1)
+    cache.finish_load(1, [message(1), message(2, deleted=True), message(3)], complete=True)
+
+    assert [m.id for m in cache.get(1, 50)] == [1, 3]
+    assert [m.id for m in cache.get(1, 50, include_deleted=True)] == [1, 2, 3]
+
+
+def test_write_through_and_eviction():
+    cache = ChatHistoryCache(max_rides=2, max_messages=3)
+    cache.begin_load(1)
+    # Сообщение, записанное во время загрузки окна, не теряется
+    cache.add(message(4))
+    cache.finish_load(1, [message(1), message(2), message(3)], complete=True)
+    assert [m.id for m in cache.get(1, 3)] == [2, 3, 4]
+    # Окно обрезано до трёх сообщений — за первым идём в БД
+    assert cache.get(1, 4) is None
+
+    cache.update(message(3, text="edited"))
+    cache.update(message(4, deleted=True))
+    assert [m.text for m in cache.get(1, 2)] == ["m2", "edited"]
+
+    cache.on_ride_status(1, "started")
+    assert cache.get(1, 1) is not None
+    cache.on_ride_status(1, "completed")
+    assert cache.get(1, 1) is None
+
+    for ride_id in (2, 3, 4):
+        cache.begin_load(ride_id)
+        cache.finish_load(ride_id, [], complete=True)
+    assert cache.get(2, 1) is None
+    assert cache.get(4, 1) == []
+
+
+class FakeScalars:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def all(self):
+        return self._rows
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def scalars(self):
+        return FakeScalars(self._rows)
+
+
+class FakeSession:
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    async def execute(self, query):
+        self.queries += 1
+        return FakeResult(list(reversed(self.rows)))
+
+
+def test_chat_service_reads_history_once(monkeypatch):
+    cache = ChatHistoryCache()
+    monkeypatch.setattr(chat_service_module, "chat_history_cache", cache)
+    service = chat_service_module.ChatService()
+    rows = [
+        ChatMessage(id=i, ride_id=7, sender_id=1, text=f"t{i}", message_type="text", is_moderated=True)
+        for i in range(1, 4)
+    ]
+    session = FakeSession(rows)
+
+    async def scenario():
+        first = await service.get_chat_history(session, 7, limit=51)
+        second = await service.get_chat_history(session, 7, limit=51)
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert [m.id for m in first] == [m.id for m in second] == [1, 2, 3]
+    assert session.queries == 1
+    assert cache.get_stats()["hits"] >= 2
+
+
+def test_sync_returns_new_messages_and_recent_edits_from_cache(monkeypatch):
+    cache = ChatHistoryCache()
+    monkeypatch.setattr(chat_service_module, "chat_history_cache", cache)
+    service = chat_service_module.ChatService()
+    edited = message(2, text="edited")
+    edited.edited_at = datetime(2026, 1, 1, 12, 0)
+    cache.begin_load(1)
+    cache.finish_load(1, [message(1), edited, message(3, deleted=True), message(4), message(5)], complete=True)
+
+    async def scenario():
+        return await service.get_chat_changes(None, 1, since_id=3, since=datetime(2026, 1, 1, 11, 0))
+
+    changes = asyncio.run(scenario())
+    assert [m.id for m in changes["messages"]] == [4, 5]
+    # Правка сообщения 2 и удаление 3 случились после водяного знака клиента
+    assert [m.id for m in changes["updates"]] == [2, 3]
+    assert changes["watermark"]["last_id"] == 5
+    assert not changes["has_more"]
+
+    assert [m.id for m in cache.get_after(1, 0, 2)] == [1, 2]
+
+
+class EditSession:
+    def __init__(self, row):
+        self.row = row
+
+    async def execute(self, query):
+        return type("Result", (), {"scalar_one_or_none": lambda _: self.row})()
+
+    async def flush(self):
+        pass
+
+    async def refresh(self, row):
+        pass
+
+
+def test_edit_and_delete_leave_cache_to_caller_after_commit(monkeypatch):
+    cache = ChatHistoryCache()
+    monkeypatch.setattr(chat_service_module, "chat_history_cache", cache)
+    service = chat_service_module.ChatService()
+    cache.begin_load(1)
+    cache.finish_load(1, [message(1)], complete=True)
+    row = ChatMessage(
+        id=1, ride_id=1, sender_id=10, text="m1", message_type="text",
+        is_moderated=True, created_at=datetime(2026, 1, 1),
+    )
+
+    async def scenario():
+        edited = await service.edit_message(EditSession(row), 1, 10, "новый текст")
+        deleted = await service.soft_delete_message(EditSession(row), 1, 10)
+        return edited, deleted
+
+    edited, deleted = asyncio.run(scenario())
+    assert edited.text == "новый текст" and deleted.deleted_at is not None
+    # До commit в кэше прежняя версия: при откате транзакции он не разойдётся с БД
+    assert cache.get(1, 1)[0].text == "m1"
+    cache.update(deleted)
+    assert cache.get(1, 1) == []
+
+
+class HangingSession:
+    async def execute(self, query):
+        await asyncio.sleep(10)
+
+
+def test_cancelled_history_load_releases_placeholder(monkeypatch):
+    cache = ChatHistoryCache()
+    monkeypatch.setattr(chat_service_module, "chat_history_cache", cache)
+    service = chat_service_module.ChatService()
+
+    async def scenario():
+        task = asyncio.create_task(service.get_chat_history(HangingSession(), 9))
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(scenario())
+    # Следующее чтение снова может загрузить окно в кэш
+    assert cache.begin_load(9)
@@ -0,0 +1,62 @@
+import random
+import time
+
+from app.services.aho_corasick import AhoCorasick
+from app.services.chat_service import ChatService
+from app.services.moderation_dictionary import BANNED_WORDS
+
+
+def test_automaton_finds_overlapping_words():
+    matcher = AhoCorasick(["he", "she", "his", "hers"])
+    found = sorted(matcher.iter_matches("ushers"))
+    assert found == [(4, "he"), (4, "she"), (6, "hers")]
+    assert matcher.find_first("nothing here") == "he"
+    assert matcher.find_first("xyz") is None
+
+
+def test_automaton_matches_naive_substring_search():
+    rng = random.Random(7)
+    words = {"".join(rng.choice("abc") for _ in range(rng.randint(1, 4))) for _ in range(30)}
+    matcher = AhoCorasick(words)
+    for _ in range(200):
+        text = "".join(rng.choice("abcd") for _ in range(rng.randint(0, 30)))
+        expected = sorted(
+            (i + len(w), w) for w in words for i in range(len(text)) if text.startswith(w, i)
+        )
+        assert sorted(matcher.iter_matches(text)) == expected
+
+
+def test_censor_keeps_original_positions():
+    service = ChatService()
+    assert service._censor_text("Ну ты СУКА, а") == "Ну ты ****, а"
+    # Разделители и leet внутри слова тоже закрываются, остальной текст не трогаем
+    assert service._censor_text("what the f.u.c.k!") == "what the *******!"
+    assert service._censor_text("сyка") == "сyка"
+    assert service._censor_text("$hit and 5hit") == "**** and ****"
+
+
+def test_moderate_message_reports_word():
+    service = ChatService()
+    result = service.moderate_message("блять, опять пробка")
+    assert result.passed
+    assert result.filtered == "*****, опять пробка"
+    assert result.reason.startswith("Censored: бля")
+
+    clean = service.moderate_message("Буду через 5 минут")
+    assert clean.filtered == clean.original and clean.reason is None
+
+
+def test_moderation_time_independent_of_dictionary_size():
+    text = "обычное сообщение без мата " * 70
+    small = AhoCorasick(BANNED_WORDS)
+    large = AhoCorasick(BANNED_WORDS | {f"слово{i}" for i in range(20000)})
+
+    def best(matcher):
+        timings = []
+        for _ in range(5):
+            started = time.perf_counter()
+            list(matcher.iter_matches(text))
+            timings.append(time.perf_counter() - started)
+        return min(timings)
+
+    assert best(large) < best(small) * 5
@@ -0,0 +1,106 @@
+import asyncio
+
+from app.services.chat_writer import ChatMessageWriter
+
+
+class FakeResult:
+    def __init__(self, ids):
+        self._rows = [type("Row", (), {"id": i}) for i in ids]
+
+    def __iter__(self):
+        return iter(self._rows)
+
+
+class FakeSession:
+    def __init__(self, db):
+        self.db = db
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, statement, rows):
+        self.db.statements.append(len(rows))
+        if any(row["ride_id"] is None for row in rows):
+            raise ValueError("ride_id violates foreign key")
+        ids = list(range(self.db.next_id, self.db.next_id + len(rows)))
+        self.db.next_id += len(rows)
+        self.db.rows.extend(rows)
+        return FakeResult(ids)
+
+    async def commit(self):
+        self.db.commits += 1
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.next_id = 1
+        self.rows = []
+        self.statements = []
+        self.commits = 0
+
+    def __call__(self):
+        return FakeSession(self)
+
+
+def test_concurrent_writes_share_one_insert():
+    db = FakeDatabase()
+    writer = ChatMessageWriter(session_maker=db)
+
+    async def scenario():
+        saved = await asyncio.gather(*[
+            writer.write(ride_id=1, sender_id=n, text=f"msg {n}", message_type="text")
+            for n in range(50)
+        ])
+        await writer.stop()
+        return saved
+
+    saved = asyncio.run(scenario())
+    assert [m["id"] for m in saved] == list(range(1, 51))
+    assert [m["sender_id"] for m in saved] == list(range(50))
+    assert db.statements == [50]
+    assert db.commits == 1
+    assert writer.get_stats()["written"] == 50
+
+
+def test_bad_message_does_not_fail_batch():
+    db = FakeDatabase()
+    writer = ChatMessageWriter(session_maker=db)
+
+    async def scenario():
+        results = await asyncio.gather(
+            writer.write(ride_id=1, sender_id=1, text="ok", message_type="text"),
+            writer.write(ride_id=None, sender_id=2, text="bad", message_type="text"),
+            writer.write(ride_id=1, sender_id=3, text="ok too", message_type="text"),
+            return_exceptions=True
+        )
+        await writer.stop()
+        return results
+
+    ok, bad, ok_too = asyncio.run(scenario())
+    assert isinstance(bad, ValueError)
+    assert ok["id"] and ok_too["id"]
+    assert db.statements == [3, 1, 1, 1]
+    assert writer.get_stats()["failed"] == 1
+
+
+def test_stop_flushes_pending_and_writer_restarts_on_new_loop():
+    db = FakeDatabase()
+    writer = ChatMessageWriter(session_maker=db)
+
+    async def first():
+        task = asyncio.ensure_future(writer.write(ride_id=1, sender_id=1, text="a", message_type="text"))
+        await asyncio.sleep(0)
+        await writer.stop()
+        return await task
+
+    assert asyncio.run(first())["id"] == 1
+
+    async def second():
+        saved = await writer.write(ride_id=1, sender_id=1, text="b", message_type="text")
+        await writer.stop()
+        return saved
+
+    assert asyncio.run(second())["id"] == 2
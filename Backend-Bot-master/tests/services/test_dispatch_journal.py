@@ -0,0 +1,58 @@
+import asyncio
+
+from app.services.dispatch_journal import DispatchJournal
+
+
+def _open_record(ride_id: int) -> dict:
+    return {
+        "op": "open",
+        "ride_id": ride_id,
+        "request": {"ride_id": ride_id, "client_id": 1, "ride_class": "economy"},
+        "ride_data": {"type": "new_ride", "ride_id": ride_id},
+        "created_at": "2026-01-01T12:00:00",
+        "waves": 1,
+        "notified": [],
+        "all_candidates": [10, 11]
+    }
+
+
+def test_replay_applies_waves_and_close(tmp_path):
+    journal = DispatchJournal(tmp_path / "journal.jsonl")
+    journal.append(_open_record(1))
+    journal.append(_open_record(2))
+    journal.append({"op": "wave", "ride_id": 1, "wave": 2, "notified": [[10, 100]], "all_candidates": [10, 11, 12]})
+    journal.append({"op": "close", "ride_id": 2})
+    asyncio.run(journal.flush())
+
+    state = DispatchJournal(tmp_path / "journal.jsonl").replay()
+    assert list(state) == [1]
+    assert state[1]["waves"] == 2
+    assert state[1]["notified"] == [[10, 100]]
+    assert state[1]["all_candidates"] == [10, 11, 12]
+
+
+def test_replay_skips_truncated_tail(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = DispatchJournal(path)
+    journal.append(_open_record(1))
+    asyncio.run(journal.flush())
+    with path.open("a", encoding="utf-8") as f:
+        f.write('{"op":"close","ride_')
+
+    assert list(DispatchJournal(path).replay()) == [1]
+
+
+def test_compact_rewrites_snapshot(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = DispatchJournal(path)
+    for ride_id in range(5):
+        journal.append(_open_record(ride_id))
+    asyncio.run(journal.flush())
+
+    state = journal.replay()
+    del state[0]
+    journal.compact(state)
+
+    assert len(path.read_text(encoding="utf-8").splitlines()) == 4
+    assert sorted(DispatchJournal(path).replay()) == [1, 2, 3, 4]
+    assert journal.get_stats()["records_since_compact"] == 0
@@ -0,0 +1,112 @@
+import asyncio
+import io
+import zipfile
+from datetime import datetime
+
+from app.services.document_export import DocumentExporter, ExportStatus
+
+PERIOD_START = datetime(2026, 1, 1)
+PERIOD_END = datetime(2026, 1, 31)
+
+
+class FakeRenderer:
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self.calls = 0
+
+    async def __call__(self, driver_name, **kwargs):
+        self.calls += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0.005)
+        finally:
+            self.active -= 1
+        return f"%PDF {driver_name}".encode()
+
+
+async def load_report(driver_id, period_start, period_end):
+    if driver_id < 0:
+        raise LookupError(f"driver {driver_id} not found")
+    return {"driver_name": f"driver-{driver_id}", "period_start": period_start, "period_end": period_end}
+
+
+def test_file_export_writes_all_reports_with_bounded_concurrency(tmp_path):
+    renderer = FakeRenderer()
+    exporter = DocumentExporter(str(tmp_path), render=renderer, concurrency=3)
+
+    async def scenario():
+        job = exporter.create_job(list(range(20)) + [5, 5], PERIOD_START, PERIOD_END, mode="file")
+        exporter.start(job, load_report)
+        await job.task
+        return job
+
+    job = asyncio.run(scenario())
+
+    assert job.status == ExportStatus.COMPLETED
+    assert job.to_dict()["progress"] == 1.0
+    assert job.total == 20
+    assert renderer.max_active <= 3
+    with zipfile.ZipFile(job.path) as archive:
+        names = archive.namelist()
+        assert len(names) == 20
+        assert archive.read("driver_report_7_20260101_20260131.pdf") == b"%PDF driver-7"
+    assert job.bytes_written == job.path.stat().st_size
+    assert not list(tmp_path.glob(".*.tmp"))
+
+
+def test_failed_reports_are_listed_and_do_not_stop_export(tmp_path):
+    exporter = DocumentExporter(str(tmp_path), render=FakeRenderer(), concurrency=2)
+
+    async def scenario():
+        job = exporter.create_job([1, -2, 3], PERIOD_START, PERIOD_END, mode="file")
+        exporter.start(job, load_report)
+        await job.task
+        return job
+
+    job = asyncio.run(scenario())
+
+    assert job.status == ExportStatus.COMPLETED
+    assert (job.completed, job.failed) == (2, 1)
+    assert "not found" in job.errors[-2]
+    with zipfile.ZipFile(job.path) as archive:
+        assert archive.read("errors.txt").decode().startswith("-2\t")
+
+
+def test_stream_produces_valid_zip_incrementally(tmp_path):
+    exporter = DocumentExporter(str(tmp_path), render=FakeRenderer(), concurrency=4)
+
+    async def scenario():
+        job = exporter.create_job(list(range(10)), PERIOD_START, PERIOD_END, mode="stream")
+        chunks = [chunk async for chunk in exporter.stream(job, load_report)]
+        return job, chunks
+
+    job, chunks = asyncio.run(scenario())
+
+    assert job.status == ExportStatus.COMPLETED
+    # По чанку на документ плюс центральный каталог
+    assert len(chunks) == 11
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+        assert archive.testzip() is None
+        assert len(archive.namelist()) == 10
+    assert job.bytes_written == sum(len(chunk) for chunk in chunks)
+
+
+def test_aborted_stream_stops_rendering(tmp_path):
+    renderer = FakeRenderer()
+    exporter = DocumentExporter(str(tmp_path), render=renderer, concurrency=2)
+
+    async def scenario():
+        job = exporter.create_job(list(range(100)), PERIOD_START, PERIOD_END, mode="stream")
+        stream = exporter.stream(job, load_report)
+        await stream.__anext__()
+        await stream.aclose()
+        await asyncio.sleep(0.05)
+        return job
+
+    job = asyncio.run(scenario())
+
+    assert job.status == ExportStatus.CANCELED
+    assert renderer.calls < 10
+    assert renderer.active == 0
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+from app.services.eta_model import ConstantSpeedEstimator, SpeedGridEstimator
+from app.services.eta_training import SpeedGridTrainer
+
+
+MONDAY_9AM = datetime(2026, 1, 5, 9, 0)
+
+
+def _train_two_zones() -> SpeedGridEstimator:
+    trainer = SpeedGridTrainer()
+    for i in range(20):
+        start = MONDAY_9AM + timedelta(minutes=i)
+        # Центр (55.75, 37.61): пробки, ~12 км/ч; окраина (55.95, 37.61): ~60 км/ч
+        trainer.add_track_point_pair(55.7500, 37.6150, start, 55.7503, 37.6150, start + timedelta(seconds=10))
+        trainer.add_track_point_pair(55.9500, 37.6150, start, 55.9515, 37.6150, start + timedelta(seconds=10))
+    return trainer.build()
+
+
+def test_constant_estimator_matches_old_formula():
+    estimator = ConstantSpeedEstimator(30)
+    assert estimator.estimate_minutes(0, 0, 0, 0, distance_km=5) == 10
+
+
+def test_grid_learns_per_cell_speed():
+    grid = _train_two_zones()
+    slow = grid.estimate_minutes(55.7500, 37.6150, 55.7502, 37.6150, distance_km=1.0, when=MONDAY_9AM)
+    fast = grid.estimate_minutes(55.9500, 37.6150, 55.9502, 37.6150, distance_km=1.0, when=MONDAY_9AM)
+    assert slow > fast * 2
+
+    # Вне обученной области — средняя скорость этого часа недели
+    outside = grid.estimate_minutes(10.0, 10.0, 10.001, 10.0, distance_km=1.0, when=MONDAY_9AM)
+    assert fast < outside < slow
+
+
+def test_trainer_rejects_parked_and_gps_jumps():
+    trainer = SpeedGridTrainer()
+    assert not trainer.add_track_point_pair(55.75, 37.61, MONDAY_9AM, 55.75, 37.61, MONDAY_9AM + timedelta(seconds=30))
+    assert not trainer.add_track_point_pair(55.75, 37.61, MONDAY_9AM, 55.85, 37.61, MONDAY_9AM + timedelta(seconds=10))
+    assert trainer.samples == 0
+
+
+def test_save_load_roundtrip(tmp_path):
+    grid = _train_two_zones()
+    path = tmp_path / "grid.bin"
+    grid.save(str(path))
+
+    loaded = SpeedGridEstimator.load(str(path))
+    assert loaded.rows == grid.rows and loaded.cols == grid.cols
+    assert list(loaded.speeds) == list(grid.speeds)
+    assert loaded.speed_at(55.75, 37.615, 9) == grid.speed_at(55.75, 37.615, 9)
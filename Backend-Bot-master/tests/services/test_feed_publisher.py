@@ -0,0 +1,147 @@
+import asyncio
+import importlib
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.backend.routers.websocket import _parse_feed_params, router as websocket_router
+from app.services.driver_tracker import DriverTracker, DriverStatus
+from app.services.feed_publisher import DriverFeedPublisher
+from app.services.ride_index import PendingRideIndex
+
+feed_module = importlib.import_module("app.services.feed_publisher")
+
+
+class FakeManager:
+    def __init__(self):
+        self.sent = []
+
+    async def send_personal_message(self, user_id, message):
+        self.sent.append((user_id, message))
+        return True
+
+
+def make_ride(ride_id, lat, lng, status="requested"):
+    return SimpleNamespace(
+        id=ride_id, client_id=1, status=status,
+        pickup_address=None, pickup_lat=lat, pickup_lng=lng,
+        dropoff_address=None, dropoff_lat=None, dropoff_lng=None,
+        expected_fare=None, created_at=None,
+    )
+
+
+@pytest.fixture
+def fake_manager(monkeypatch):
+    fake = FakeManager()
+    monkeypatch.setattr(feed_module, "manager", fake)
+    return fake
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    # Свой трекер вместо глобального: тестовый водитель не остаётся в driver_tracker
+    tracker = DriverTracker()
+    monkeypatch.setattr(feed_module, "driver_tracker", tracker)
+    monkeypatch.setattr(feed_module.matching_engine, "tracker", tracker)
+    tracker.register_driver(900001, 800001, ["economy"])
+    tracker.set_status(900001, DriverStatus.ONLINE)
+    tracker.update_location(900001, 50.45, 30.52)
+    return tracker
+
+
+@pytest.mark.asyncio
+async def test_feed_subscription_receives_diffs(fake_manager, tracker):
+    index = PendingRideIndex()
+    index.upsert(make_ride(1, 50.451, 30.521))
+    publisher = DriverFeedPublisher(index)
+
+    snapshot = publisher.subscribe(800001, radius_km=5)
+    assert [r["id"] for r in snapshot["rides"]] == [1]
+
+    index.upsert(make_ride(2, 50.452, 30.522))
+    index.upsert(make_ride(3, 52.0, 33.0))
+    index.upsert(make_ride(1, 50.451, 30.521, status="accepted"))
+    await asyncio.sleep(0)
+
+    diffs = [m for _, m in fake_manager.sent]
+    assert [r["id"] for r in diffs[0]["added"]] == [2]
+    assert diffs[1]["removed"] == [1]
+    assert len(diffs) == 2
+
+
+@pytest.mark.asyncio
+async def test_new_rides_respect_feed_limit(fake_manager, tracker):
+    index = PendingRideIndex()
+    index.upsert(make_ride(1, 50.451, 30.521))
+    index.upsert(make_ride(2, 50.46, 30.53))
+    publisher = DriverFeedPublisher(index)
+
+    snapshot = publisher.subscribe(800001, radius_km=5, limit=2)
+    assert [r["id"] for r in snapshot["rides"]] == [1, 2]
+
+    # Дальше всех в ленте — заказ не попадает
+    index.upsert(make_ride(3, 50.48, 30.56))
+    # Ближе самого дальнего — вытесняет его
+    index.upsert(make_ride(4, 50.4505, 30.5205))
+    await asyncio.sleep(0)
+
+    diffs = [m for _, m in fake_manager.sent]
+    assert len(diffs) == 1
+    assert [r["id"] for r in diffs[0]["added"]] == [4]
+    assert diffs[0]["removed"] == [2]
+    assert set(publisher._subscriptions[800001].rides) == {1, 4}
+
+
+@pytest.mark.asyncio
+async def test_ride_events_check_only_nearby_subscriptions(monkeypatch, fake_manager, tracker):
+    tracker.register_driver(900002, 800002, ["economy"])
+    tracker.set_status(900002, DriverStatus.ONLINE)
+    tracker.update_location(900002, 55.75, 37.61)
+    checked = []
+    original = feed_module.matching_engine.get_driver_feed
+
+    def counting_feed(driver_profile_id, rides, limit=20):
+        checked.append(driver_profile_id)
+        return original(driver_profile_id, rides, limit)
+
+    index = PendingRideIndex()
+    publisher = DriverFeedPublisher(index)
+    publisher.subscribe(800001, radius_km=5)
+    publisher.subscribe(800002, radius_km=5)
+    monkeypatch.setattr(feed_module.matching_engine, "get_driver_feed", counting_feed)
+
+    index.upsert(make_ride(1, 50.451, 30.521))
+    await asyncio.sleep(0)
+    assert checked == [900001]
+    assert [m["added"][0]["id"] for _, m in fake_manager.sent] == [1]
+
+    # Водитель уехал: лента перестроена, подписка переехала в ячейку второго водителя
+    tracker.update_location(900001, 55.75, 37.61)
+    await publisher.on_driver_moved(800001)
+    index.remove(1)
+    await asyncio.sleep(0)
+    assert publisher.get_stats()["cells"] == 1
+    assert publisher._ride_holders == {}
+
+    publisher.unsubscribe(800001)
+    publisher.unsubscribe(800002)
+    assert publisher.get_stats()["cells"] == 0
+
+
+def test_subscribe_feed_rejects_bad_params_without_dropping_socket():
+    assert _parse_feed_params({}) == (15.0, 20)
+    assert _parse_feed_params({"radius_km": 1000, "limit": 10 ** 6}) == (50.0, 100)
+    assert _parse_feed_params({"radius_km": 5, "limit": -3}) == (5.0, 1)
+    for bad in ({"radius_km": "abc"}, {"radius_km": None}, {"radius_km": 0}, {"radius_km": "nan"}, {"limit": [1]}):
+        assert _parse_feed_params(bad) is None
+
+    app = FastAPI()
+    app.include_router(websocket_router)
+    with TestClient(app).websocket_connect("/ws/778") as ws:
+        assert ws.receive_json()["type"] == "connected"
+        ws.send_json({"type": "subscribe_feed", "radius_km": "abc"})
+        assert ws.receive_json()["type"] == "error"
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json()["type"] == "pong"
@@ -0,0 +1,22 @@
+import asyncio
+import importlib
+
+from benchmarks.matching_simulator import parse_args, run_synthetic
+
+
+def test_simulator_reports_latencies_and_restores_singletons():
+    dispatcher_module = importlib.import_module("app.services.order_dispatcher")
+    original_manager = dispatcher_module.manager
+
+    args = parse_args([
+        "--drivers", "300", "--updates", "50", "--queries", "5",
+        "--rides", "5", "--bursts", "1", "--memory-sample", "100"
+    ])
+    report = asyncio.run(run_synthetic(args))
+
+    assert report["memory_bytes_per_driver"] > 0
+    assert report["messages_sent"] > 0
+    for name in ("update_location", "get_available_drivers", "find_drivers", "dispatch_new_ride"):
+        assert report["latency"][name]["count"] > 0
+        assert report["latency"][name]["p99_ms"] >= report["latency"][name]["p50_ms"]
+    assert dispatcher_module.manager is original_manager
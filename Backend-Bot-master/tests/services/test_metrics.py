@@ -0,0 +1,62 @@
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.backend.middlewares.metrics import install_metrics_middleware
+from app.services.metrics import MetricsRegistry, metrics
+
+
+def test_timed_records_sync_and_async_calls():
+    registry = MetricsRegistry()
+
+    @registry.timed("sync_op")
+    def sync_op():
+        return 1
+
+    @registry.timed("async_op")
+    async def async_op():
+        await asyncio.sleep(0)
+        return 2
+
+    assert sync_op() == 1
+    assert asyncio.run(async_op()) == 2
+
+    text = registry.render()
+    assert "# TYPE hot_path_duration_seconds histogram" in text
+    assert 'hot_path_duration_seconds_count{op="sync_op"} 1' in text
+    assert 'hot_path_duration_seconds_count{op="async_op"} 1' in text
+    assert 'hot_path_duration_seconds_bucket{op="sync_op",le="+Inf"} 1' in text
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    for value in (0.0004, 0.003, 0.003, 20.0):
+        registry.observe("x_seconds", value)
+    registry.register_gauge("answer", lambda: 42)
+
+    text = registry.render()
+    assert 'x_seconds_bucket{le="0.0005"} 1' in text
+    assert 'x_seconds_bucket{le="0.005"} 3' in text
+    assert 'x_seconds_bucket{le="10.0"} 3' in text
+    assert 'x_seconds_bucket{le="+Inf"} 4' in text
+    assert "answer 42.0" in text
+
+
+def test_middleware_labels_by_route_template():
+    app = FastAPI()
+    install_metrics_middleware(app)
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        return {"id": item_id}
+
+    metrics.reset()
+    client = TestClient(app)
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/missing")
+
+    text = metrics.render()
+    assert 'http_request_duration_seconds_count{method="GET",route="/items/{item_id}",status="200"} 2' in text
+    assert 'route="unmatched",status="404"' in text
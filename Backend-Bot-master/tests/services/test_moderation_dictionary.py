@@ -0,0 +1,77 @@
+import asyncio
+import json
+import os
+
+from app.services.moderation_dictionary import ModerationDictionary, ModerationRules, load_rules
+
+
+def write_words(path, language, words):
+    (path / f"{language}.txt").write_text("# test dictionary\n" + "\n".join(words) + "\n", encoding="utf-8")
+
+
+def test_builtin_rules_used_without_directory(tmp_path):
+    dictionary = ModerationDictionary(str(tmp_path / "missing"))
+    assert asyncio.run(dictionary.reload()) is False
+    assert dictionary.rules.source == "builtin"
+    assert dictionary.rules.matcher.find_first("ну ты сука") == "сука"
+
+
+def test_load_rules_per_language_and_leet(tmp_path):
+    write_words(tmp_path, "ru", ["Редиска", "  жаба  ", ""])
+    write_words(tmp_path, "en", ["Dang", "d.a.r.n"])
+    (tmp_path / "leet.json").write_text(json.dumps({"4": "a", ".": ""}), encoding="utf-8")
+
+    rules = load_rules(tmp_path)
+    assert rules.languages == {"en": 2, "ru": 2}
+    assert rules.matcher.find_first("oh d4rn it".translate(rules.normalize_table)) == "darn"
+    assert rules.matcher.find_first("редиска!") == "редиска"
+
+    only_ru = load_rules(tmp_path, ["ru"])
+    assert only_ru.languages == {"ru": 2}
+    assert only_ru.matcher.find_first("dang") is None
+    assert only_ru.version != rules.version
+
+
+def test_reload_swaps_rules_only_when_files_change(tmp_path):
+    write_words(tmp_path, "ru", ["редиска"])
+    dictionary = ModerationDictionary(str(tmp_path))
+
+    async def scenario():
+        assert await dictionary.reload() is True
+        first = dictionary.rules
+        assert await dictionary.reload() is False
+        assert dictionary.rules is first
+
+        write_words(tmp_path, "ru", ["редиска", "жаба"])
+        stat = os.stat(tmp_path / "ru.txt")
+        os.utime(tmp_path / "ru.txt", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        assert await dictionary.reload() is True
+        assert dictionary.rules is not first
+        assert dictionary.rules.matcher.find_first("ты жаба") == "жаба"
+        return first
+
+    first = asyncio.run(scenario())
+    # Старый снимок остаётся рабочим для тех, кто успел его взять
+    assert first.matcher.find_first("жаба") is None
+    assert dictionary.get_stats()["reload_count"] == 2
+
+
+def test_failed_reload_keeps_previous_rules(tmp_path):
+    write_words(tmp_path, "ru", ["редиска"])
+    dictionary = ModerationDictionary(str(tmp_path))
+    asyncio.run(dictionary.reload())
+    good = dictionary.rules
+
+    (tmp_path / "leet.json").write_text("{broken", encoding="utf-8")
+    assert asyncio.run(dictionary.reload()) is False
+    assert dictionary.rules is good
+    assert dictionary.get_stats()["last_error"]
+
+
+def test_compact_automaton_scales_to_large_dictionary():
+    words = {f"слово{i}" for i in range(20000)}
+    rules = ModerationRules.build({"ru": words}, {}, "test")
+    assert len(rules.matcher) == 20000
+    # Плоские массивы вместо множества строк и словарей переходов
+    assert rules.matcher.nbytes < 40 * rules.matcher.state_count
+    assert rules.matcher.find_first("это слово19999 тут") == "слово1"
@@ -0,0 +1,26 @@
+import json
+
+from app.services.offer_cache import OfferPayloadCache
+
+
+def test_render_appends_personal_fields():
+    cache = OfferPayloadCache()
+    cache.put(1, {"type": "new_ride", "ride_id": 1, "pickup": {"address": "Ленина 1"}})
+
+    message = json.loads(cache.render(1, {"your_distance_km": 1.5, "wave": 2}))
+    assert message["pickup"]["address"] == "Ленина 1"
+    assert message["your_distance_km"] == 1.5
+    assert message["wave"] == 2
+    assert "timestamp" in message
+
+
+def test_evict_drops_payload_and_user_offers():
+    cache = OfferPayloadCache()
+    cache.put(1, {"ride_id": 1})
+    cache.mark_offered(1, 100, {"wave": 1})
+    assert len(cache.offers_for_user(100)) == 1
+
+    assert cache.evict(1) is True
+    assert cache.render(1, {}) is None
+    assert cache.offers_for_user(100) == []
+    assert cache.get_stats()["total_size"] == 0
@@ -0,0 +1,36 @@
+import time
+
+from app.services.driver_tracker import DriverTracker
+
+
+def test_offer_lock_blocks_other_rides_until_released():
+    tracker = DriverTracker()
+    tracker.register_driver(1, 101, ["economy"])
+
+    assert tracker.lock_for_offer(1, ride_id=10) is True
+    assert tracker.lock_for_offer(1, ride_id=11) is False
+    assert tracker.is_offer_locked(1, for_ride_id=11) is True
+    assert tracker.is_offer_locked(1, for_ride_id=10) is False
+
+    assert tracker.release_offer_lock(1, ride_id=11) is False
+    assert tracker.release_offer_lock(1, ride_id=10) is True
+    assert tracker.lock_for_offer(1, ride_id=11) is True
+
+
+def test_offer_lock_expires():
+    tracker = DriverTracker()
+    tracker.register_driver(1, 101, ["economy"])
+
+    tracker.lock_for_offer(1, ride_id=10, ttl_seconds=0.01)
+    time.sleep(0.02)
+    assert tracker.is_offer_locked(1, for_ride_id=11) is False
+    assert tracker.lock_for_offer(1, ride_id=11) is True
+
+
+def test_assign_ride_releases_lock():
+    tracker = DriverTracker()
+    tracker.register_driver(1, 101, ["economy"])
+    tracker.lock_for_offer(1, ride_id=10)
+
+    tracker.assign_ride(1, 10)
+    assert tracker.get_stats()["offer_locks"] == 0
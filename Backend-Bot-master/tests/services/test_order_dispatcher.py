@@ -0,0 +1,94 @@
+import asyncio
+import importlib
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.dispatch_journal import DispatchJournal
+from app.services.driver_tracker import DriverTracker
+from app.services.matching_engine import DriverMatch
+from app.services.offer_cache import OfferPayloadCache
+from app.services.wave_scheduler import WaveScheduler
+
+dispatcher_module = importlib.import_module("app.services.order_dispatcher")
+
+
+class FakeManager:
+    def __init__(self):
+        self.sent = []
+        self.on_send = None
+
+    async def send_personal_text(self, user_id, text):
+        assert text is not None
+        self.sent.append(user_id)
+        if self.on_send is not None:
+            await self.on_send(user_id)
+        return True
+
+    async def send_personal_message(self, user_id, message):
+        return True
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    tracker = DriverTracker()
+    monkeypatch.setattr(dispatcher_module, "driver_tracker", tracker)
+    return tracker
+
+
+@pytest.fixture
+def dispatcher(monkeypatch, tmp_path, tracker):
+    monkeypatch.setattr(dispatcher_module, "dispatch_journal", DispatchJournal(tmp_path / "journal.jsonl"))
+    monkeypatch.setattr(dispatcher_module, "wave_scheduler", WaveScheduler())
+    return dispatcher_module.OrderDispatcher()
+
+
+def test_cleanup_releases_offer_locks(dispatcher, tracker):
+    for ride_id, age_seconds, drivers in ((1, 900, {10, 11}), (2, 10, {12})):
+        for dpid in drivers:
+            assert tracker.lock_for_offer(dpid, ride_id)
+        dispatcher._active_dispatches[ride_id] = {
+            "created_at": datetime.utcnow() - timedelta(seconds=age_seconds),
+            "notified_drivers": drivers,
+        }
+
+    assert dispatcher.cleanup_old_dispatches(max_age_seconds=600) == 1
+    assert dispatcher.get_active_dispatches() == [2]
+    # Водители просроченного заказа снова могут получать офферы, активный заказ держит свою блокировку
+    assert not tracker.is_offer_locked(10) and not tracker.is_offer_locked(11)
+    assert tracker.is_offer_locked(12)
+
+
+def test_cancel_during_wave_stops_sending(monkeypatch, dispatcher, tracker):
+    cache = OfferPayloadCache()
+    fake_manager = FakeManager()
+    monkeypatch.setattr(dispatcher_module, "offer_cache", cache)
+    monkeypatch.setattr(dispatcher_module, "manager", fake_manager)
+
+    ride_id = 7
+    cache.put(ride_id, {"type": "new_ride", "ride_id": ride_id})
+    dispatch = {
+        "request": SimpleNamespace(ride_id=ride_id),
+        "notified_drivers": set(),
+        "notified_users": {},
+        "offers": {},
+        "all_candidates": [10, 11, 12],
+        "created_at": datetime.utcnow(),
+        "waves": 1,
+    }
+    dispatcher._active_dispatches[ride_id] = dispatch
+    drivers = [DriverMatch(dpid, dpid * 10, 1.0, 3.0, 5.0, 1.0) for dpid in (10, 11, 12)]
+
+    async def cancel_on_first_send(user_id):
+        fake_manager.on_send = None
+        await dispatcher.cancel_dispatch(ride_id)
+
+    fake_manager.on_send = cancel_on_first_send
+    notified = asyncio.run(dispatcher._send_offers(dispatch, drivers, wave=1))
+
+    assert notified == []
+    assert fake_manager.sent == [100]
+    assert not any(tracker.is_offer_locked(dpid) for dpid in (10, 11, 12))
+    assert cache.offers_for_user(100) == []
+    assert cache.get_stats()["drivers_with_offers"] == 0
@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from app.services.pdf_cache import PDFCache, etag_matches, pdf_etag
+
+
+def make_renderer(calls):
+    async def render():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return b"%PDF-1.7 receipt"
+    return render
+
+
+def test_key_depends_on_template_and_data_not_order():
+    key = PDFCache.make_key("ride_receipt", "1", {"ride_id": 1, "fare": 500.0})
+    assert key == PDFCache.make_key("ride_receipt", "1", {"fare": 500.0, "ride_id": 1})
+    assert key != PDFCache.make_key("ride_receipt", "2", {"ride_id": 1, "fare": 500.0})
+    assert key != PDFCache.make_key("ride_receipt", "1", {"ride_id": 1, "fare": 501.0})
+    assert key != PDFCache.make_key("driver_report", "1", {"ride_id": 1, "fare": 500.0})
+
+
+def test_concurrent_requests_share_one_render_then_hit_memory(tmp_path):
+    cache = PDFCache(str(tmp_path))
+    calls = []
+    key = PDFCache.make_key("ride_receipt", "1", {"ride_id": 7})
+
+    async def scenario():
+        first = await asyncio.gather(*(cache.get_or_render(key, make_renderer(calls)) for _ in range(5)))
+        again = await cache.get_or_render(key, make_renderer(calls))
+        return first, again
+
+    first, again = asyncio.run(scenario())
+
+    assert len(calls) == 1
+    assert all(item.content == b"%PDF-1.7 receipt" for item in first)
+    assert again.content == b"%PDF-1.7 receipt"
+    assert cache.get_stats()["memory_hits"] == 1
+
+
+def test_disk_tier_serves_file_after_memory_is_lost(tmp_path):
+    cache = PDFCache(str(tmp_path))
+    calls = []
+    key = PDFCache.make_key("ride_receipt", "1", {"ride_id": 7})
+    asyncio.run(cache.get_or_render(key, make_renderer(calls)))
+
+    # Другой воркер (или рестарт): памяти нет, файл на диске общий
+    other = PDFCache(str(tmp_path))
+    cached = asyncio.run(other.get_or_render(key, make_renderer(calls)))
+
+    assert len(calls) == 1
+    assert cached.content is None
+    assert cached.path.read_bytes() == b"%PDF-1.7 receipt"
+    assert cached.stat.st_size == len(b"%PDF-1.7 receipt")
+    assert other.get_stats()["disk_hits"] == 1
+
+
+def test_memory_lru_and_disk_limit(tmp_path):
+    cache = PDFCache(str(tmp_path), memory_bytes=40, disk_bytes=40)
+    keys = [PDFCache.make_key("ride_receipt", "1", {"ride_id": i}) for i in range(4)]
+
+    async def render():
+        return b"x" * 16
+
+    async def scenario():
+        for key in keys:
+            await cache.get_or_render(key, render)
+
+    asyncio.run(scenario())
+
+    stats = cache.get_stats()
+    assert stats["memory_items"] == 2
+    assert stats["memory_bytes"] == 32
+    assert stats["disk_bytes"] <= 36
+    assert len(list(tmp_path.rglob("*.pdf"))) == 2
+
+
+def test_failed_render_is_not_cached(tmp_path):
+    cache = PDFCache(str(tmp_path))
+    key = PDFCache.make_key("ride_receipt", "1", {"ride_id": 7})
+
+    async def broken():
+        raise RuntimeError("renderer crashed")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(cache.get_or_render(key, broken))
+    assert cache.lookup(key) is None
+
+
+def test_etag_matching():
+    etag = pdf_etag("a" * 64)
+    assert etag_matches(etag, etag)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('"other"', etag)
+    assert not etag_matches(None, etag)
@@ -0,0 +1,84 @@
+import asyncio
+import os
+import time
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from app.services.pdf_render_pool import PDFRenderPool, PDFRenderBusyError, PDFRenderTimeoutError
+
+
+# В пул уходят только встроенные функции — дочерним процессам не нужно импортировать тесты
+
+def test_runs_in_worker_process_and_recycles():
+    pool = PDFRenderPool(workers=1, queue_limit=4, timeout_seconds=30, max_tasks_per_child=1)
+
+    async def scenario():
+        return [await pool.run(os.getpid) for _ in range(3)]
+
+    try:
+        pids = asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+
+    assert os.getpid() not in pids
+    # max_tasks_per_child=1 — каждая задача в новом процессе
+    assert len(set(pids)) == 3
+    assert pool.get_stats()["completed"] == 3
+
+
+def test_rejects_when_queue_is_full():
+    pool = PDFRenderPool(workers=1, queue_limit=1, timeout_seconds=30)
+
+    async def scenario():
+        # Первый запуск поднимает процесс, дальше задачи идут в уже прогретый пул
+        await pool.run(abs, -1)
+        return await asyncio.gather(*(pool.run(time.sleep, 0.3) for _ in range(3)), return_exceptions=True)
+
+    try:
+        results = asyncio.run(scenario())
+    finally:
+        pool.shutdown()
+
+    assert results[:2] == [None, None]
+    assert isinstance(results[2], PDFRenderBusyError)
+    assert pool.get_stats()["rejected"] == 1
+
+
+def test_timeout_restarts_pool_and_keeps_serving():
+    pool = PDFRenderPool(workers=1, queue_limit=1, timeout_seconds=0.5)
+
+    async def scenario():
+        await pool.run(abs, -1)
+        with pytest.raises(PDFRenderTimeoutError):
+            await pool.run(time.sleep, 30)
+        return await pool.run(abs, -5)
+
+    started = time.monotonic()
+    try:
+        assert asyncio.run(scenario()) == 5
+    finally:
+        pool.shutdown()
+
+    assert time.monotonic() - started < 20
+    stats = pool.get_stats()
+    assert stats["timeouts"] == 1
+    assert stats["restarts"] == 1
+
+
+def test_crashed_worker_is_retried_once():
+    pool = PDFRenderPool(workers=1, queue_limit=1, timeout_seconds=30)
+
+    async def scenario():
+        with pytest.raises(BrokenProcessPool):
+            await pool.run(os._exit, 1)
+        return await pool.run(abs, -2)
+
+    try:
+        assert asyncio.run(scenario()) == 2
+    finally:
+        pool.shutdown()
+
+    stats = pool.get_stats()
+    assert stats["restarts"] == 2
+    assert stats["failed"] == 1
@@ -0,0 +1,81 @@
+from datetime import datetime
+
+from app.services.pdf_templates import DocumentRenderer, TEMPLATES_DIR, template_version
+
+
+renderer = DocumentRenderer()
+GENERATED_AT = datetime(2026, 1, 2, 3, 4)
+
+
+def receipt_context(**overrides):
+    context = {
+        "ride_id": 42,
+        "client_name": "Иван Иванов",
+        "driver_name": "Пётр Петров",
+        "pickup_address": "Москва, ул. Ленина 1",
+        "dropoff_address": "Москва, ул. Пушкина 10",
+        "fare": 500.0,
+        "distance_km": 12.5,
+        "duration_min": None,
+        "payment_method": "Наличные",
+        "created_at": datetime(2026, 1, 2, 3, 4),
+        "generated_at": GENERATED_AT,
+    }
+    context.update(overrides)
+    return context
+
+
+def test_templates_are_compiled_up_front():
+    assert {"ride_receipt.html", "driver_report.html", "balance_statement.html"} <= set(renderer.templates)
+
+
+def test_receipt_renders_fields_and_optional_rows():
+    html = renderer.render_html("ride_receipt.html", receipt_context())
+
+    assert "<title>Квитанция #42</title>" in html
+    assert "<td>12.5 км</td>" in html
+    assert "Время в пути" not in html
+    assert '<p class="amount">500.00 ₽</p>' in html
+    assert "02.01.2026 03:04" in html
+    assert "Спасибо за использование U-BRO TAXI!" in html
+
+
+def test_user_data_is_autoescaped():
+    html = renderer.render_html("ride_receipt.html", receipt_context(client_name="<script>alert(1)</script>"))
+
+    assert "<script>" not in html
+    assert "&lt;script&gt;alert(1)&lt;/script&gt;" in html
+
+
+def test_report_and_statement_empty_and_filled_lists():
+    report = renderer.render_html("driver_report.html", {
+        "driver_name": "Пётр",
+        "period_start": datetime(2026, 1, 1),
+        "period_end": datetime(2026, 1, 31),
+        "rides": [{"id": 101, "date": "15.01.2026", "route": "Центр → Аэропорт", "fare": 1200}],
+        "total_earnings": 1200.0,
+        "total_commission": 180.0,
+        "generated_at": GENERATED_AT,
+    })
+    assert "<td>1200.00 ₽</td>" in report
+    assert "1020.00 ₽" in report
+    assert "01.01.2026 - 31.01.2026" in report
+
+    statement = renderer.render_html("balance_statement.html", {
+        "user_name": "Иван",
+        "current_balance": 0.0,
+        "transactions": [],
+        "generated_at": GENERATED_AT,
+    })
+    assert "Нет операций" in statement
+    assert "Документ сформирован: 02.01.2026 03:04" in statement
+
+
+def test_template_version_tracks_file_contents(tmp_path):
+    for file in TEMPLATES_DIR.iterdir():
+        (tmp_path / file.name).write_bytes(file.read_bytes())
+    before = template_version(tmp_path)
+    assert before == template_version(tmp_path)
+
+    (tmp_path / "styles.css").write_text("body { color: red; }", encoding="utf-8")
+    assert template_version(tmp_path) != before
@@ -0,0 +1,84 @@
+from app.services.chat_service import ChatService, MessageType
+from app.services.rate_limiter import RateLimiter, RateLimitRule, TokenBucketTable
+
+
+def test_bucket_allows_burst_then_refills():
+    table = TokenBucketTable(RateLimitRule(messages=10, period_seconds=60))
+    results = [table.consume(1, now=0.0)[0] for _ in range(11)]
+    assert results == [True] * 10 + [False]
+
+    allowed, retry_after = table.consume(1, now=1.0)
+    assert not allowed
+    assert abs(retry_after - 5.0) < 1e-6
+
+    assert table.consume(1, now=6.01)[0]
+    assert not table.consume(1, now=6.01)[0]
+    # Другой пользователь не зависит от первого
+    assert table.consume(2, now=6.0)[0]
+
+
+def test_idle_buckets_are_evicted_and_slots_reused():
+    table = TokenBucketTable(RateLimitRule(messages=5, period_seconds=10))
+    for user_id in range(100):
+        table.consume(user_id, now=0.0)
+    table.consume(7, now=5.0)
+
+    assert table.evict_idle(now=10.0) == 99
+    assert len(table) == 1
+    storage = len(table._state)
+
+    for user_id in range(1000, 1099):
+        table.consume(user_id, now=11.0)
+    assert len(table._state) == storage
+    # Вытесненный пользователь получает полное ведро, как и без вытеснения
+    assert all(table.consume(3, now=11.0)[0] for _ in range(5))
+
+
+def test_rules_resolve_from_specific_to_default():
+    limiter = RateLimiter({
+        "default": RateLimitRule(10, 60),
+        "image": RateLimitRule(2, 60),
+        "ws": RateLimitRule(20, 60),
+        "http:image": RateLimitRule(1, 60),
+    })
+    assert limiter.resolve("http", "image") == "http:image"
+    assert limiter.resolve("ws", "image") == "image"
+    assert limiter.resolve("ws", "text") == "ws"
+    assert limiter.resolve("http", "text") == "default"
+
+    assert limiter.check(1, "http", "image", now=0.0)[0]
+    allowed, _, rule = limiter.check(1, "http", "image", now=0.0)
+    assert not allowed and rule.messages == 1
+    # Текст идёт в другое ведро
+    assert limiter.check(1, "http", "text", now=0.0)[0]
+
+
+def test_chat_service_rate_limit_message():
+    service = ChatService()
+    for _ in range(service.rate_limit_messages):
+        assert service.check_rate_limit(42)[0]
+    allowed, error = service.check_rate_limit(42)
+    assert not allowed
+    assert "Rate limit exceeded" in error
+    assert service.check_rate_limit(42, MessageType.IMAGE, endpoint="ws")[0]
+    assert service.get_stats()["active_users_with_rate_limit"] == 2
+
+
+def test_unknown_message_types_use_fallback_rule_without_caching():
+    limiter = RateLimiter({
+        "default": RateLimitRule(10, 60),
+        "image": RateLimitRule(2, 60),
+        "ws": RateLimitRule(20, 60),
+    }, message_types={"text", "image"})
+    assert limiter.resolve("ws", "image") == "image"
+    for i in range(100):
+        assert limiter.resolve("ws", f"spam-{i}") == "ws"
+    assert limiter.resolve("http", "spam") == "default"
+    # Нехешируемое значение из JSON не роняет проверку
+    assert limiter.check(1, "ws", ["image"], now=0.0)[2].messages == 20
+    assert set(limiter._resolved) == {("ws", "image")}
+
+    service = ChatService()
+    assert service.is_valid_message_type(MessageType.IMAGE)
+    assert not service.is_valid_message_type("spam")
+    assert not service.is_valid_message_type(["text"])
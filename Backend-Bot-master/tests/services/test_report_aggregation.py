@@ -0,0 +1,113 @@
+import asyncio
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.services.report_aggregation import ReportAggregator
+
+PERIOD_START = datetime(2026, 1, 1)
+PERIOD_END = datetime(2026, 2, 1)
+
+DriverRow = namedtuple("DriverRow", [
+    "display_name", "first_name", "last_name", "ride_id", "completed_at",
+    "pickup_address", "dropoff_address", "fare", "total_earnings", "total_commission",
+])
+BalanceRow = namedtuple("BalanceRow", [
+    "user_id", "first_name", "username", "balance", "transaction_id", "created_at", "is_withdraw", "amount",
+])
+
+
+class FakeStreamResult:
+    def __init__(self, rows):
+        self._rows = rows
+
+    async def __aiter__(self):
+        for row in self._rows:
+            yield row
+
+
+class FakeSession:
+    def __init__(self, db):
+        self.db = db
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def stream(self, statement):
+        self.db.statements.append(statement)
+        return FakeStreamResult(self.db.rows)
+
+
+class FakeDatabase:
+    def __init__(self, rows):
+        self.rows = rows
+        self.statements = []
+
+    def session_maker(self):
+        return FakeSession(self)
+
+
+def compiled(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect()))
+
+
+def test_driver_report_is_one_query_over_rides_commissions_transactions():
+    sql = compiled(ReportAggregator.driver_report_query(5, PERIOD_START, PERIOD_END))
+
+    assert sql.count("SELECT") == 1
+    for table in ("rides", "transactions", "commissions"):
+        assert f"LEFT OUTER JOIN {table}" in sql
+    assert "sum(" in sql and "OVER ()" in sql
+
+
+def test_driver_report_rows_become_report_arguments():
+    db = FakeDatabase([
+        DriverRow("Пётр П.", "Пётр", "Петров", 101, datetime(2026, 1, 15), "Ленина 1", "Пушкина 10",
+                  Decimal("350.00"), Decimal("870.00"), Decimal("130.50")),
+        DriverRow("Пётр П.", "Пётр", "Петров", 102, datetime(2026, 1, 16), "Гагарина 3", None,
+                  Decimal("520.00"), Decimal("870.00"), Decimal("130.50")),
+    ])
+    aggregator = ReportAggregator(session_maker=db.session_maker)
+
+    report = asyncio.run(aggregator.driver_report(5, PERIOD_START, PERIOD_END))
+
+    assert len(db.statements) == 1
+    assert report["driver_name"] == "Пётр П."
+    assert report["total_earnings"] == 870.0
+    assert report["total_commission"] == 130.5
+    assert report["rides"] == [
+        {"id": 101, "date": "15.01.2026", "route": "Ленина 1 → Пушкина 10", "fare": 350.0},
+        {"id": 102, "date": "16.01.2026", "route": "Гагарина 3 → -", "fare": 520.0},
+    ]
+
+
+def test_driver_without_rides_and_unknown_driver():
+    db = FakeDatabase([DriverRow(None, "Пётр", "Петров", None, None, None, None, 0, 0, 0)])
+    report = asyncio.run(ReportAggregator(session_maker=db.session_maker).driver_report(5, PERIOD_START, PERIOD_END))
+    assert report["driver_name"] == "Пётр Петров"
+    assert report["rides"] == []
+    assert report["total_earnings"] == 0.0
+
+    empty = FakeDatabase([])
+    with pytest.raises(LookupError):
+        asyncio.run(ReportAggregator(session_maker=empty.session_maker).driver_report(6, PERIOD_START, PERIOD_END))
+
+
+def test_balance_statement_rows():
+    db = FakeDatabase([
+        BalanceRow(7, None, "ivan", Decimal("630.00"), 1, datetime(2026, 1, 10), False, 1000.0),
+        BalanceRow(7, None, "ivan", Decimal("630.00"), 2, datetime(2026, 1, 12), True, 370.0),
+    ])
+
+    statement = asyncio.run(ReportAggregator(session_maker=db.session_maker).balance_statement(7, PERIOD_START, PERIOD_END))
+
+    assert statement["user_name"] == "ivan"
+    assert statement["current_balance"] == 630.0
+    assert [tx["is_withdraw"] for tx in statement["transactions"]] == [False, True]
+    assert statement["transactions"][0]["date"] == "10.01.2026"
@@ -0,0 +1,70 @@
+from types import SimpleNamespace
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+
+from app.services.ride_index import PendingRideIndex
+
+
+def make_ride(ride_id, lat, lng, status="requested"):
+    return SimpleNamespace(
+        id=ride_id,
+        client_id=1,
+        status=status,
+        pickup_address="Test Pickup",
+        pickup_lat=lat,
+        pickup_lng=lng,
+        dropoff_address=None,
+        dropoff_lat=None,
+        dropoff_lng=None,
+        expected_fare=100.0,
+        created_at=None,
+    )
+
+
+def test_nearby_returns_rides_sorted_by_distance():
+    index = PendingRideIndex()
+    index.upsert(make_ride(1, 50.46, 30.52))
+    index.upsert(make_ride(2, 50.45, 30.52))
+    index.upsert(make_ride(3, 51.50, 31.50))
+
+    rides = index.nearby(50.45, 30.52, radius_km=5)
+    assert [r["id"] for r in rides] == [2, 1]
+
+
+def test_status_change_removes_ride():
+    index = PendingRideIndex()
+    index.upsert(make_ride(1, 50.45, 30.52))
+    index.upsert(make_ride(1, 50.45, 30.52, status="accepted"))
+    assert index.nearby(50.45, 30.52) == []
+    assert index.get_stats()["cells"] == 0
+
+
+def test_reconcile_repairs_drift():
+    index = PendingRideIndex()
+    index.upsert(make_ride(1, 50.45, 30.52))
+    index.upsert(make_ride(2, 50.45, 30.52))
+
+    drift = index.reconcile([make_ride(2, 50.45, 30.52), make_ride(3, 50.46, 30.53)])
+    assert drift == 2
+    assert {r["id"] for r in index.nearby(50.45, 30.52)} == {2, 3}
+
+
+def test_listeners_with_session_run_after_commit_only():
+    index = PendingRideIndex()
+    events = []
+    index.add_listener(lambda event, ride: events.append((event, ride["id"])))
+
+    with Session(create_engine("sqlite://")) as session:
+        session.execute(text("SELECT 1"))
+        index.upsert(make_ride(1, 50.45, 30.52), session)
+        assert events == []
+        session.commit()
+        assert events == [("add", 1)]
+
+        session.execute(text("SELECT 1"))
+        index.remove(1, session)
+        session.rollback()
+        assert events == [("add", 1)]
+    # Сам индекс обновляется сразу, расхождение после отката исправит сверка с БД
+    assert index.get(1) is None
@@ -0,0 +1,67 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.backend.routers.websocket import router as websocket_router
+from app.services.websocket_manager import ConnectionManager, RideMembership, manager
+
+
+def test_membership_is_bidirectional_and_counted():
+    rides = RideMembership()
+    assert rides.join(1, 10)
+    assert not rides.join(1, 10)
+    rides.join(1, 11)
+    rides.join(2, 10)
+
+    assert rides.participants(1) == {10, 11}
+    assert rides.rides_of(10) == {1, 2}
+    assert rides.ride_count() == 2
+    assert rides.membership_count() == 3
+
+    assert rides.leave(1, 11)
+    assert not rides.leave(1, 11)
+    assert sorted(rides.leave_all(10)) == [1, 2]
+    assert rides.ride_count() == 0
+    assert rides.membership_count() == 0
+    assert rides.rides_of(10) == set()
+    assert rides._ride_users == {} and rides._user_rides == {}
+
+
+class FakeSocket:
+    pass
+
+
+def test_last_disconnect_leaves_all_rides():
+    connections = ConnectionManager()
+    first, second = FakeSocket(), FakeSocket()
+    connections.active_connections[5] = [first, second]
+    connections.join_ride(100, 5)
+    connections.join_ride(200, 5)
+    connections.join_ride(100, 6)
+
+    connections.disconnect(first, 5)
+    assert connections.get_user_rides(5) == {100, 200}
+
+    connections.disconnect(second, 5)
+    assert connections.get_user_rides(5) == set()
+    assert connections.rides.participants(100) == {6}
+    assert connections.rides.ride_count() == 1
+
+
+def test_ws_endpoint_cleans_up_and_stats_are_counts():
+    app = FastAPI()
+    app.include_router(websocket_router)
+    client = TestClient(app)
+
+    with client.websocket_connect("/ws/777") as ws:
+        assert ws.receive_json()["type"] == "connected"
+        ws.send_json({"type": "join_ride", "ride_id": 4242})
+        assert ws.receive_json()["type"] == "joined_ride"
+        assert 4242 in manager.get_user_rides(777)
+        stats = client.get("/ws/stats").json()
+        assert isinstance(stats["active_rides"], int) and stats["active_rides"] >= 1
+        assert stats["ride_memberships"] >= 1
+        assert 777 in stats["online_users"]
+        assert stats["online_users_count"] == len(stats["online_users"])
+
+    assert manager.get_user_rides(777) == set()
+    assert not manager.rides.has_ride(4242)
@@ -0,0 +1,72 @@
+import json
+import threading
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app import config
+from app.backend.routers.profiler import profiler_router
+from app.services.sampling_profiler import SamplingProfiler
+
+
+def busy_scan(stop: threading.Event):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+
+def test_sample_captures_busy_thread_stack():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_scan, args=(stop,), name="busy-worker")
+    worker.start()
+    try:
+        result = SamplingProfiler().sample(0.3, 0.002, thread_id=worker.ident)
+    finally:
+        stop.set()
+        worker.join()
+
+    assert result.samples > 10
+    collapsed = result.to_collapsed()
+    first = collapsed.splitlines()[0]
+    assert first.startswith("thread:busy-worker;")
+    assert "test_sampling_profiler:busy_scan" in collapsed
+    assert int(first.rsplit(" ", 1)[1]) > 0
+
+
+def test_speedscope_export_is_consistent():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_scan, args=(stop,))
+    worker.start()
+    try:
+        result = SamplingProfiler().sample(0.1, 0.002, thread_id=worker.ident)
+    finally:
+        stop.set()
+        worker.join()
+
+    doc = json.loads(result.to_speedscope())
+    profile = doc["profiles"][0]
+    frames = doc["shared"]["frames"]
+    assert profile["type"] == "sampled"
+    assert len(profile["samples"]) == len(profile["weights"])
+    assert all(0 <= i < len(frames) for stack in profile["samples"] for i in stack)
+    assert any(f["name"].endswith(":busy_scan") for f in frames)
+
+
+def test_endpoint_requires_configured_token(monkeypatch):
+    app = FastAPI()
+    app.include_router(profiler_router)
+    client = TestClient(app)
+
+    monkeypatch.setattr(config, "PROFILER_TOKEN", None)
+    assert client.get("/admin/profile", params={"seconds": 0.05}).status_code == 404
+
+    monkeypatch.setattr(config, "PROFILER_TOKEN", "secret")
+    assert client.get("/admin/profile", params={"seconds": 0.05}, headers={"X-Admin-Token": "wrong"}).status_code == 403
+
+    response = client.get(
+        "/admin/profile",
+        params={"seconds": 0.05, "format": "collapsed", "all_threads": True},
+        headers={"X-Admin-Token": "secret"}
+    )
+    assert response.status_code == 200
+    assert "attachment" in response.headers["content-disposition"]
+    assert int(response.headers["x-profile-samples"]) > 0
@@ -0,0 +1,66 @@
+import json
+import os
+import random
+
+from app.services.scoring_training import ScoringWeightsTrainer
+from app.services.scoring_weights import ScoringWeights, write_weights_config
+
+
+DEFAULTS = {"distance": 0.5, "rating": 0.3, "freshness": 0.2}
+
+
+def _synthetic_samples(true_weights, count=300):
+    rng = random.Random(7)
+    samples = []
+    for _ in range(count):
+        rows = [[rng.random(), rng.random(), rng.random()] for _ in range(5)]
+        utilities = [sum(w * x for w, x in zip(true_weights, row)) for row in rows]
+        samples.append((rows, utilities.index(max(utilities))))
+    return samples
+
+
+def test_fit_recovers_dominant_feature():
+    # Водители соглашаются почти только по расстоянию
+    samples = _synthetic_samples([8.0, 1.0, 0.5])
+    trainer = ScoringWeightsTrainer(DEFAULTS)
+
+    raw = trainer.fit(samples)
+    weights = trainer.normalize(raw)
+
+    assert weights["distance"] > weights["rating"] > 0
+    assert abs(sum(weights.values()) - 1) < 1e-3
+    assert trainer.log_likelihood(samples, raw) > trainer.log_likelihood(samples, DEFAULTS)
+
+
+def test_sample_from_meta_requires_accepted_offer():
+    meta = {
+        "accepted_driver_profile_id": 2,
+        "offers": [
+            {"driver_profile_id": 1, "features": {"distance": 0.2, "rating": 1.0, "freshness": 1.0}},
+            {"driver_profile_id": 2, "features": {"distance": 0.9, "rating": 0.8, "freshness": 0.5}},
+        ]
+    }
+    rows, chosen = ScoringWeightsTrainer.sample_from_meta(meta)
+    assert chosen == 1 and rows[1] == [0.9, 0.8, 0.5]
+
+    meta["accepted_driver_profile_id"] = 3
+    assert ScoringWeightsTrainer.sample_from_meta(meta) is None
+
+
+def test_weights_hot_reload_on_new_version(tmp_path):
+    path = tmp_path / "weights.json"
+    weights = ScoringWeights(str(path), DEFAULTS)
+    assert weights.current == DEFAULTS and weights.version is None
+
+    assert write_weights_config(str(path), {"distance": 0.7, "rating": 0.2, "freshness": 0.1}) == 1
+    assert weights.maybe_reload(force=True) is True
+    assert weights.version == 1 and weights.current["distance"] == 0.7
+
+    assert write_weights_config(str(path), {"distance": 0.6, "rating": 0.3, "freshness": 0.1}) == 2
+    os.utime(path, (1, 1))
+    weights.maybe_reload(force=True)
+    assert weights.describe()["version"] == 2
+
+    path.write_text(json.dumps({"version": 3, "weights": {"distance": 1}}))
+    assert weights.maybe_reload(force=True) is False
+    assert weights.version == 2
@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from app.services.wave_scheduler import WaveScheduler
+
+
+@pytest.mark.asyncio
+async def test_waves_fire_in_deadline_order():
+    fired = []
+
+    async def on_due(ride_id):
+        fired.append(ride_id)
+
+    scheduler = WaveScheduler(on_due)
+    scheduler.schedule(1, 0.05)
+    scheduler.schedule(2, 0.01)
+    scheduler.schedule(3, 0.03)
+    await asyncio.sleep(0.1)
+    await scheduler.stop()
+
+    assert fired == [2, 3, 1]
+
+
+@pytest.mark.asyncio
+async def test_cancel_and_reschedule():
+    fired = []
+
+    async def on_due(ride_id):
+        fired.append(ride_id)
+
+    scheduler = WaveScheduler(on_due)
+    scheduler.schedule(1, 0.01)
+    scheduler.schedule(2, 0.01)
+    scheduler.cancel(1)
+    scheduler.schedule(2, 0.05)
+    await asyncio.sleep(0.03)
+    assert fired == []
+    await asyncio.sleep(0.05)
+    await scheduler.stop()
+
+    assert fired == [2]
+    assert scheduler.get_stats()["scheduled"] == 0
@@ -0,0 +1,17 @@
+from benchmarks.ws_load_test import main
+
+
+def test_ws_load_test_smoke():
+    report = main([
+        "--clients", "20", "--duration", "1", "--rate", "5",
+        "--chat-share", "0.5", "--drain-seconds", "0.3", "--json"
+    ])
+
+    assert report["connected_clients"] == 20
+    assert report["connections"] > 20
+    assert not any(key.startswith("connect_") for key in report["errors"])
+    # Чат без БД: сообщения пишутся в хранилище в памяти и доходят до комнаты
+    assert "save_failed" not in report["errors"]
+    for name in ("pong_rtt", "location_ack_rtt", "joined_ride_rtt", "new_message_delivery"):
+        assert report["latency"][name]["count"] > 0
+    assert report["server_loop_lag"]["samples"] > 0